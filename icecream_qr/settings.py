@@ -11,7 +11,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import hashlib
 import os
+import sys
 
 # Load environment variables from .env file
 try:
@@ -58,6 +60,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so session and auth queries count against the view's budget
+    'qr_ordering.query_budget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -98,6 +102,40 @@ DATABASES = {
 }
 
 
+# Cache
+# Shared across worker processes so cached data (e.g. the menu) is invalidated everywhere.
+# Set CACHE_REDIS_URL (e.g. redis://127.0.0.1:6379/1) to use Redis instead of the file cache.
+# Keys are prefixed with the database they were computed from, and `manage.py test` gets a
+# private in-process cache, so the test database never overwrites the dev server's entries.
+
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+CACHE_KEY_PREFIX = hashlib.sha256(str(DATABASES['default']['NAME']).encode()).hexdigest()[:12]
+
+if TESTING:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'tests',
+        }
+    }
+elif os.environ.get('CACHE_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['CACHE_REDIS_URL'],
+            'KEY_PREFIX': CACHE_KEY_PREFIX,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / '.cache',
+            'KEY_PREFIX': CACHE_KEY_PREFIX,
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -152,10 +190,23 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# `collectstatic` writes content-hashed files with .gz/.br copies (brotli optional)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'qr_ordering.assets.CompressedManifestStaticFilesStorage'},
+}
+# Serve /static/ and /media/ from Django (precompressed, immutable cache headers when hashed);
+# set to 0 when a front-end server serves STATIC_ROOT and MEDIA_ROOT itself
+SERVE_ASSETS = os.environ.get('SERVE_ASSETS', '1') == '1'
+
+# Table QR code image format: 'png' or 'svg' (smaller at print sizes, no raster scaling)
+QR_CODE_FORMAT = os.environ.get('QR_CODE_FORMAT', 'png')
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -163,7 +214,11 @@ MEDIA_ROOT = BASE_DIR / 'media'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Email Configuration
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Emails are queued and sent by `python manage.py mail_worker`
+# For testing use 'django.core.mail.backends.locmem.EmailBackend' or
+# 'django.core.mail.backends.filebased.EmailBackend' (writes to EMAIL_FILE_PATH)
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH', str(BASE_DIR / 'sent_emails'))
 EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
 EMAIL_PORT = int(os.environ.get('EMAIL_PORT', '587'))
 EMAIL_USE_TLS = True
@@ -175,6 +230,29 @@ DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER)
 RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID', '')
 RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET', '')
 
+# Firebase sync outbox, drained by `python manage.py sync_worker`
+# Backends: FirebaseBackend, MemoryBackend (offline: tests, benchmarks, local development), NullBackend
+SYNC_BACKEND = os.environ.get('SYNC_BACKEND', 'qr_ordering.sync_backends.FirebaseBackend')
+# Bucket factory for `migrate_to_firebase --media`; 'qr_ordering.local_bucket.get_bucket' uploads to
+# a local directory (LOCAL_BUCKET_ROOT) instead of Firebase Storage
+MEDIA_BUCKET = os.environ.get('MEDIA_BUCKET', 'qr_ordering.firebase_utils.get_bucket')
+# Upload checkpoint of the media migration; the Firebase payloads take the Storage URLs from it
+MEDIA_CHECKPOINT = os.environ.get('MEDIA_CHECKPOINT', str(BASE_DIR / '.firebase_media_checkpoint.json'))
+
+# Pub/sub used to push live order updates over Server-Sent Events.
+# The in-process broker only reaches clients connected to the same process.
+EVENT_BROKER = os.environ.get('EVENT_BROKER', 'qr_ordering.events.InProcessBroker')
+
+# Seconds the admin dashboard/analytics figures are shared between staff screens (0 disables)
+DASHBOARD_CACHE_TTL = float(os.environ.get('DASHBOARD_CACHE_TTL', 3))
+
+# Per-view SQL query budgets (see qr_ordering.query_budget): 'warn', 'raise' (tests) or 'off'
+QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE', 'raise' if TESTING else 'warn')
+# A query shape repeated this often in one request is reported as an N+1
+QUERY_REPEAT_THRESHOLD = int(os.environ.get('QUERY_REPEAT_THRESHOLD', 5))
+# Seconds of request samples kept for the staff query stats page
+QUERY_STATS_WINDOW = int(os.environ.get('QUERY_STATS_WINDOW', 300))
+
 import firebase_admin
 from firebase_admin import credentials, db
 
@@ -1,15 +1,24 @@
 # icecream_qr/urls.py
 
 
+import re
+
 from django.conf import settings
 from django.conf.urls.static import static
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.views.generic import RedirectView
+from qr_ordering import assets
 
 urlpatterns = [
     path('', RedirectView.as_view(url='/panel/login/', permanent=False)),
     path('', include('qr_ordering.urls')),
 ]
 
-if settings.DEBUG:
+if getattr(settings, 'SERVE_ASSETS', False):
+    # Precompressed, cache-friendly serving (runserver still serves /static/ from the apps in DEBUG)
+    urlpatterns += [
+        re_path(rf"^{re.escape(settings.STATIC_URL.lstrip('/'))}(?P<path>.*)$", assets.serve, {'document_root': settings.STATIC_ROOT}),
+        re_path(rf"^{re.escape(settings.MEDIA_URL.lstrip('/'))}(?P<path>.*)$", assets.serve, {'document_root': settings.MEDIA_ROOT}),
+    ]
+elif settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
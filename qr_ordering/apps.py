@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class QrOrderingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'qr_ordering'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,176 @@
+"""
+Precompressed, far-future cached static and media files.
+
+``collectstatic`` with ``CompressedManifestStaticFilesStorage`` writes
+content-hashed copies of the static files plus ``.gz`` (and ``.br`` when
+the optional ``brotli`` package is installed) siblings. Generated media is
+compressed as it is written (``precompress``) or by the ``compress_assets``
+command. ``serve`` picks the smallest encoding the client accepts and marks
+hashed or content-addressed names as immutable, so repeat visits revalidate
+nothing.
+"""
+import gzip
+import mimetypes
+import os
+import re
+from email.utils import formatdate
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip copies are written
+    brotli = None
+
+# Formats that are already compressed (PNG, JPEG, WebP, fonts) gain nothing
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.mjs', '.map', '.svg', '.json', '.html', '.txt', '.xml', '.ico')
+MIN_SIZE = 256
+# Preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Django's manifest hash (``app.3f2a1b4c5d6e.js``) or a content-addressed QR image
+HASHED_NAME = re.compile(r'(\.[0-9a-f]{12}\.[A-Za-z0-9]+|(^|/)qr-[0-9a-f]{20}\.[A-Za-z0-9]+)$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, max-age=0, must-revalidate'
+
+mimetypes.add_type('image/svg+xml', '.svg')
+mimetypes.add_type('image/webp', '.webp')
+mimetypes.add_type('text/javascript', '.js')
+
+
+def is_compressible(path):
+    return path.lower().endswith(COMPRESSIBLE_EXTENSIONS)
+
+
+def is_immutable(path):
+    return bool(HASHED_NAME.search(path.replace('\\', '/')))
+
+
+def compress_file(path, force=False):
+    """Write ``.gz``/``.br`` siblings of ``path`` that are smaller than it; returns their paths"""
+    if not is_compressible(path):
+        return []
+    mtime = os.path.getmtime(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < MIN_SIZE:
+        return []
+
+    written = []
+    encoders = [('.gz', lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    if brotli:
+        encoders.append(('.br', lambda d: brotli.compress(d, quality=11)))
+    for suffix, encode in encoders:
+        target = path + suffix
+        if not force and os.path.exists(target) and os.path.getmtime(target) >= mtime:
+            continue
+        compressed = encode(data)
+        # Not worth a second request header when it barely shrinks
+        if len(compressed) >= len(data) * 0.95:
+            continue
+        with open(target, 'wb') as f:
+            f.write(compressed)
+        written.append(target)
+    return written
+
+
+def precompress(storage, name):
+    """Compress a file just saved to ``storage``; a no-op for storages without local paths"""
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        return []
+    try:
+        return compress_file(path)
+    except OSError as e:
+        print(f"Error precompressing {name}: {e}")
+        return []
+
+
+def delete(storage, name):
+    """Delete a stored file and its precompressed siblings"""
+    for suffix in ('',) + tuple(suffix for _, suffix in ENCODINGS):
+        try:
+            storage.delete(name + suffix)
+        except Exception:
+            pass
+
+
+def compress_tree(root, force=False):
+    """Precompress every compressible file under ``root``; returns the number written"""
+    written = 0
+    for directory, _, files in os.walk(root):
+        for file_name in files:
+            written += len(compress_file(os.path.join(directory, file_name), force=force))
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also writes precompressed copies of the hashed files"""
+
+    # Fall back to the plain name when collectstatic has not been run (development, tests)
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for hashed_name in set(self.hashed_files.values()):
+            compress_file(self.path(hashed_name))
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+
+def _accepted_encodings(request):
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        token, _, params = part.strip().partition(';')
+        if token and not re.search(r'q\s*=\s*0(\.0*)?\s*$', params):
+            accepted.add(token.strip().lower())
+    return accepted
+
+
+def serve(request, path, document_root):
+    """Serve a file under ``document_root``, precompressed when the client accepts it"""
+    try:
+        full_path = safe_join(document_root, path)
+    except (SuspiciousFileOperation, ValueError):
+        raise Http404('File not found')
+    if not os.path.isfile(full_path):
+        raise Http404('File not found')
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    encoding, served_path = None, full_path
+    if is_compressible(full_path):
+        accepted = _accepted_encodings(request)
+        for name, suffix in ENCODINGS:
+            if name in accepted and os.path.isfile(full_path + suffix):
+                encoding, served_path = name, full_path + suffix
+                break
+
+    stat = os.stat(served_path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(
+            open(served_path, 'rb'),
+            content_type=content_type or 'application/octet-stream',
+            filename=os.path.basename(full_path),
+        )
+        response['Content-Length'] = stat.st_size
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = formatdate(stat.st_mtime, usegmt=True)
+    response['Cache-Control'] = IMMUTABLE if is_immutable(path) else REVALIDATE
+    if is_compressible(full_path):
+        response['Vary'] = 'Accept-Encoding'
+    return response
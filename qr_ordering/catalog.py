@@ -0,0 +1,85 @@
+"""
+Cached ice cream menu for the customer order page.
+
+The serialized menu and its rendered HTML fragment are stored in Django's
+cache under a versioned key. ``bump_menu_version`` is called from the
+IceCream save/delete signals (and when image variants are ready), so every
+process sharing the cache picks up the new menu on its next request.
+"""
+import time
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import images
+from .models import IceCream
+
+MENU_VERSION_KEY = 'catalog:menu:version'
+MENU_TIMEOUT = 60 * 60 * 24
+
+
+def _initial_version():
+    # Time based so a version key lost to eviction never reuses an old menu key
+    return int(time.time() * 1000)
+
+
+def get_menu_version():
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        cache.add(MENU_VERSION_KEY, _initial_version(), timeout=None)
+        version = cache.get(MENU_VERSION_KEY)
+    return version
+
+
+def bump_menu_version():
+    """Invalidate the cached menu in every process"""
+    try:
+        return cache.incr(MENU_VERSION_KEY)
+    except ValueError:
+        version = _initial_version()
+        cache.set(MENU_VERSION_KEY, version, timeout=None)
+        return version
+
+
+def serialize_ice_cream(ice_cream):
+    image = {'image_url': '', 'image_srcset': '', 'image_webp_srcset': '', 'image_width': None, 'image_height': None}
+    try:
+        if ice_cream.image:
+            image['image_url'] = images.variant_url(ice_cream, 'card')
+            if images.is_current(ice_cream):
+                variants = ice_cream.image_variants['variants']
+                card = next((entry for entry in variants if entry['label'] == 'card'), variants[-1])
+                image.update(
+                    image_srcset=images.srcset(ice_cream, 'jpeg'),
+                    image_webp_srcset=images.srcset(ice_cream, 'webp'),
+                    image_width=card['width'],
+                    image_height=card['height'],
+                )
+    except (ValueError, AttributeError, KeyError, IndexError):
+        # Image field exists but file is missing - template shows a placeholder
+        image['image_url'] = ''
+    return {
+        'id': ice_cream.id,
+        'name': ice_cream.name,
+        'price': str(ice_cream.price),
+        **image,
+    }
+
+
+def build_menu():
+    items = [serialize_ice_cream(ice_cream) for ice_cream in IceCream.objects.order_by('id')]
+    return {
+        'items': items,
+        'html': render_to_string('menu_items.html', {'ice_creams': items}),
+    }
+
+
+def get_menu():
+    """Return ``{'items': [...], 'html': ...}`` from cache, building it on a miss"""
+    key = f'catalog:menu:{get_menu_version()}'
+    menu = cache.get(key)
+    if menu is None:
+        menu = build_menu()
+        cache.set(key, menu, timeout=MENU_TIMEOUT)
+    return {'items': menu['items'], 'html': mark_safe(menu['html'])}
@@ -0,0 +1,50 @@
+"""
+Half-open datetime ranges for filtering by calendar day.
+
+``created_at__date=day`` converts every row's timestamp before comparing,
+so the database cannot use an index on ``created_at``. Filtering with
+``created_at__gte=start, created_at__lt=end`` on aware datetimes can, e.g.
+``Order.objects.filter(status='paid', **within('created_at', today_range()))``.
+"""
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.utils import timezone
+
+
+def shop_timezone():
+    """The time zone configured in ShopSettings, falling back to TIME_ZONE"""
+    from .shop import get_shop_settings
+    try:
+        return ZoneInfo(get_shop_settings().timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.get_current_timezone()
+
+
+def date_range(first_day, last_day, tz=None):
+    """``(start, end)`` covering ``first_day`` through ``last_day`` inclusive, end exclusive"""
+    tz = tz or shop_timezone()
+    start = datetime.combine(first_day, time.min, tzinfo=tz)
+    end = datetime.combine(last_day + timedelta(days=1), time.min, tzinfo=tz)
+    return start, end
+
+
+def day_range(day, tz=None):
+    return date_range(day, day, tz)
+
+
+def today(tz=None):
+    """Today's date in the shop's time zone"""
+    return timezone.localdate(timezone=tz or shop_timezone())
+
+
+def today_range(tz=None):
+    """Today in the shop's time zone as a half-open ``(start, end)`` range"""
+    tz = tz or shop_timezone()
+    return day_range(today(tz), tz)
+
+
+def within(field, bounds):
+    """Filter kwargs selecting ``start <= field < end``"""
+    start, end = bounds
+    return {f'{field}__gte': start, f'{field}__lt': end}
@@ -0,0 +1,199 @@
+"""
+Publish/subscribe for live order updates (Server-Sent Events).
+
+Views publish after their transaction commits; streaming views subscribe
+to ``order:<id>`` (customer payment status) or ``dashboard`` (staff). The default ``InProcessBroker`` only
+fans out within one process. A cross-process broker (e.g. Redis pub/sub)
+can be plugged in through the ``EVENT_BROKER`` setting by providing the
+same ``publish(channel, message)`` and async ``subscribe(*channels)``
+interface.
+
+The streams need an ASGI server (``uvicorn icecream_qr.asgi:application``).
+Under WSGI (``runserver``, gunicorn) the streaming views answer 204 and the
+pages poll instead.
+"""
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+
+DASHBOARD_CHANNEL = 'dashboard'
+STREAM_KEEPALIVE_SECONDS = 15
+STREAM_MAX_SECONDS = 300
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        """Deliver a message to every subscriber of a channel; safe from any thread"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, message)
+            except RuntimeError:
+                # Subscriber's event loop already closed
+                pass
+
+    def subscribe(self, *channels):
+        """Async context manager yielding an asyncio.Queue for the channels"""
+        return _Subscription(self, channels)
+
+    def _add(self, channels, entry):
+        with self._lock:
+            for channel in channels:
+                self._subscribers.setdefault(channel, set()).add(entry)
+
+    def _remove(self, channels, entry):
+        with self._lock:
+            for channel in channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers:
+                    subscribers.discard(entry)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+
+class _Subscription:
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = channels
+        self.entry = None
+
+    async def __aenter__(self):
+        self.entry = (asyncio.get_running_loop(), asyncio.Queue())
+        self.broker._add(self.channels, self.entry)
+        return self.entry[1]
+
+    async def __aexit__(self, *exc_info):
+        self.broker._remove(self.channels, self.entry)
+        return False
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, 'EVENT_BROKER', 'qr_ordering.events.InProcessBroker'))()
+    return _broker
+
+
+def order_status_payload(order):
+    """Same shape as the check_payment_status JSON response"""
+    return {
+        'status': 'success',
+        'order_id': order.id,
+        'payment_status': order.payment_status,
+        'order_status': order.status,
+        'paid_at': order.paid_at.isoformat() if order.paid_at else None,
+    }
+
+
+def dashboard_payload(order, event):
+    """Dashboard event with the rendered order row for client-side patching"""
+    from django.template.loader import render_to_string
+    return {
+        'event': event,
+        'order_id': order.id,
+        'status': order.status,
+        'html': render_to_string('order_row.html', {'order': order}),
+    }
+
+
+def publish_order_status(order, event='order.updated'):
+    """Publish the order's status to its customer and to staff dashboards once the transaction commits"""
+    def publish():
+        broker = get_broker()
+        broker.publish(f'order:{order.id}', order_status_payload(order))
+        broker.publish(DASHBOARD_CHANNEL, dashboard_payload(order, event))
+    transaction.on_commit(publish)
+
+
+def publish_dashboard_event(event, order_id=None):
+    """Publish a deletion (or clear-all when ``order_id`` is None) to staff dashboards"""
+    payload = {'event': event, 'order_id': order_id}
+    transaction.on_commit(lambda: get_broker().publish(DASHBOARD_CHANNEL, payload))
+
+
+def sse_message(event, data, event_id=None):
+    message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return f"id: {event_id}\n{message}" if event_id else message
+
+
+async def sse_stream(channels, event, snapshot=None, until=None,
+                     keepalive=STREAM_KEEPALIVE_SECONDS, max_seconds=STREAM_MAX_SECONDS,
+                     replay=None, event_id=None):
+    """
+    Async generator of Server-Sent Events for messages published to ``channels``.
+
+    ``snapshot`` is an optional coroutine function returning the current
+    state, sent first (after subscribing, so no change is missed). The stream
+    ends once ``until(message)`` is true or after ``max_seconds``; browsers
+    reconnect on their own and receive a fresh snapshot.
+
+    ``replay`` is an optional coroutine function returning the messages the
+    client missed, also sent after subscribing. ``event_id`` optionally
+    returns the id attached to every message and keepalive; browsers send
+    the last one back as ``Last-Event-ID`` when they reconnect.
+    """
+    def current_id():
+        return event_id() if event_id else None
+
+    async with get_broker().subscribe(*channels) as queue:
+        yield "retry: 3000\n"
+        if replay is not None:
+            for message in await replay():
+                yield sse_message(event, message, current_id())
+        if snapshot is not None:
+            initial = await snapshot()
+            if initial is None:
+                return
+            yield sse_message(event, initial, current_id())
+            if until and until(initial):
+                return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_seconds
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=min(keepalive, remaining))
+            except asyncio.TimeoutError:
+                # An id-only block moves the client's Last-Event-ID forward
+                yield f"id: {event_id()}\n: keepalive\n\n" if event_id else ": keepalive\n\n"
+                continue
+            yield sse_message(event, message, current_id())
+            if until and until(message):
+                return
+
+
+def streaming_supported(request):
+    """Whether the request came in over ASGI; WSGI servers buffer an async stream until it ends"""
+    from django.core.handlers.asgi import ASGIRequest
+    return isinstance(request, ASGIRequest)
+
+
+def sse_unavailable():
+    """204 tells EventSource not to reconnect, so the page falls back to polling"""
+    return HttpResponse(status=204)
+
+
+def sse_response(stream):
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,12 +1,30 @@
 import os
+import threading
+
 from google.cloud import storage
-from firebase_admin import credentials
 
 # Set up Firebase Storage client using the same credentials as firebase_admin
 FIREBASE_BUCKET = os.environ.get('FIREBASE_STORAGE_BUCKET', 'ice-cream-shop-69592.appspot.com')
 
 # This assumes your GOOGLE_APPLICATION_CREDENTIALS env var is set, or you use the same key as firebase_admin
 
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """One shared Storage client (and its HTTP connection pool) per process"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = storage.Client()
+        return _client
+
+
+def get_bucket(name=None):
+    return get_client().bucket(name or FIREBASE_BUCKET)
+
+
 def upload_file_to_firebase_storage(local_file_path, destination_blob_name):
     """
     Uploads a file to Firebase Storage and returns the public URL.
@@ -14,10 +32,7 @@ def upload_file_to_firebase_storage(local_file_path, destination_blob_name):
     :param destination_blob_name: Path in the storage bucket (e.g. 'ice_cream_images/filename.png')
     :return: Public URL of the uploaded file
     """
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(FIREBASE_BUCKET)
-    blob = bucket.blob(destination_blob_name)
-    blob.upload_from_filename(local_file_path)
-    # Make the file publicly accessible
-    blob.make_public()
+    blob = get_bucket().blob(destination_blob_name)
+    # Public in the same request instead of a separate make_public() call
+    blob.upload_from_filename(local_file_path, predefined_acl='publicRead')
     return blob.public_url
@@ -0,0 +1,219 @@
+"""
+Resized variants of ice cream photos for the order page.
+
+Uploads are often multi-megabyte phone photos. After an ``IceCream`` image
+changes, ``schedule`` renders WebP and JPEG copies at each width in
+``VARIANTS`` on a background thread and records them in
+``IceCream.image_variants``; ``catalog`` then serves them as a ``srcset``.
+Variants are tagged with the source file name, so stale ones are ignored
+until the new image has been processed. ``render_variants`` only works on
+bytes, so the ``build_image_variants`` backfill can run it in worker
+processes.
+"""
+import hashlib
+import os
+import threading
+from functools import partial
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+# (label, max width in pixels); never upscaled past the original
+VARIANTS = (('thumb', 200), ('card', 640), ('full', 1280))
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+VARIANT_DIR = 'ice_cream_images/variants'
+
+
+def render_variants(data):
+    """
+    Resize image bytes to every variant width.
+
+    Returns ``{'width', 'height', 'variants': [{'label', 'width', 'height', 'webp', 'jpeg'}]}``
+    with encoded bytes for each format.
+    """
+    image = Image.open(BytesIO(data))
+    largest = max(width for _, width in VARIANTS)
+    # Let the JPEG decoder scale down huge photos while decoding
+    image.draft('RGB', (largest, largest))
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    else:
+        image = image.convert('RGB')
+
+    width, height = image.size
+    variants, seen = [], set()
+    for label, target in VARIANTS:
+        size = (min(target, width), max(1, round(height * min(target, width) / width)))
+        if size in seen:
+            continue
+        seen.add(size)
+        resized = image.resize(size, Image.LANCZOS, reducing_gap=3.0) if size != image.size else image
+        variant = {'label': label, 'width': size[0], 'height': size[1]}
+        for fmt, (pil_format, options) in FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, pil_format, **options)
+            variant[fmt] = buffer.getvalue()
+        variants.append(variant)
+    return {'width': width, 'height': height, 'variants': variants}
+
+
+def variant_name(source_name, label, width, fmt, data):
+    """Content-hashed name, so variant URLs can be cached as immutable (see ``assets``)"""
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    return f'{VARIANT_DIR}/{stem}-{label}-{width}.{digest}.{"jpg" if fmt == "jpeg" else fmt}'
+
+
+def is_current(ice_cream):
+    """Whether ``image_variants`` were built from the current image"""
+    return bool(ice_cream.image) and (ice_cream.image_variants or {}).get('source') == ice_cream.image.name
+
+
+def read_source(ice_cream):
+    with ice_cream.image.storage.open(ice_cream.image.name, 'rb') as f:
+        return f.read()
+
+
+def store(ice_cream, rendered, source=None):
+    """
+    Save rendered variants and point the row at them.
+
+    Skipped (and the new files removed) if the image changed while rendering.
+    Returns the recorded ``image_variants`` or None.
+    """
+    from .catalog import bump_menu_version
+    from .models import IceCream
+
+    source = source or ice_cream.image.name
+    storage = ice_cream.image.storage
+    previous = ice_cream.image_variants or {}
+    saved, variants = [], []
+    for variant in rendered['variants']:
+        entry = {'label': variant['label'], 'width': variant['width'], 'height': variant['height']}
+        for fmt in FORMATS:
+            name = storage.save(variant_name(source, variant['label'], variant['width'], fmt, variant[fmt]), ContentFile(variant[fmt]))
+            saved.append(name)
+            entry[fmt] = name
+        variants.append(entry)
+
+    recorded = {'source': source, 'width': rendered['width'], 'height': rendered['height'], 'variants': variants}
+    with transaction.atomic():
+        if not IceCream.objects.filter(pk=ice_cream.pk, image=source).update(image_variants=recorded):
+            stale, recorded = saved, None
+        else:
+            ice_cream.image_variants = recorded
+            # A queryset update sends no post_save, so invalidate the menu here, after commit
+            transaction.on_commit(bump_menu_version)
+            stale = [entry[fmt] for entry in previous.get('variants', []) for fmt in FORMATS]
+        # The replaced files go once the row points at the new ones
+        transaction.on_commit(partial(_delete_files, storage, stale))
+    return recorded
+
+
+def _delete_files(storage, names):
+    for name in names:
+        try:
+            storage.delete(name)
+        except Exception:
+            pass
+
+
+def build(ice_cream):
+    """Render and store the variants of one ice cream's current image"""
+    if not ice_cream.image:
+        return None
+    source = ice_cream.image.name
+    return store(ice_cream, render_variants(read_source(ice_cream)), source=source)
+
+
+def backfill(workers=None, force=False, progress=None):
+    """
+    Build missing (or with ``force``, all) variants, rendering in worker processes.
+
+    At most ``workers * 2`` source images are in memory at once.
+    ``progress(done, total)`` is called after each image. Returns ``(built, failed)``.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    from .models import IceCream
+
+    pending = [ice_cream for ice_cream in IceCream.objects.exclude(image='').order_by('id')
+               if force or not is_current(ice_cream)]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(pending)))
+    built = failed = 0
+    # spawn: workers only import this module and Pillow
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) if workers > 1 else None
+    try:
+        window = workers * 2
+        for start in range(0, len(pending), window):
+            batch, sources = [], []
+            for ice_cream in pending[start:start + window]:
+                try:
+                    sources.append(read_source(ice_cream))
+                    batch.append(ice_cream)
+                except Exception as e:
+                    failed += 1
+                    print(f"Error reading image of ice cream {ice_cream.pk}: {e}")
+            futures = [executor.submit(render_variants, data) if executor else None for data in sources]
+            for ice_cream, data, future in zip(batch, sources, futures):
+                try:
+                    rendered = future.result() if future else render_variants(data)
+                    store(ice_cream, rendered, source=ice_cream.image.name)
+                    built += 1
+                except Exception as e:
+                    failed += 1
+                    print(f"Error building image variants for ice cream {ice_cream.pk}: {e}")
+                if progress:
+                    progress(built + failed, len(pending))
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+    return built, failed
+
+
+def schedule(pk):
+    """Build variants for ``IceCream`` ``pk`` on a background thread"""
+    from django.db import connection
+    from .models import IceCream
+
+    def run():
+        try:
+            ice_cream = IceCream.objects.filter(pk=pk).first()
+            if ice_cream and not is_current(ice_cream):
+                build(ice_cream)
+        except Exception as e:
+            print(f"Error building image variants for ice cream {pk}: {e}")
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def srcset(ice_cream, fmt):
+    """``srcset`` value for one format, '' if the variants are not ready"""
+    if not is_current(ice_cream):
+        return ''
+    storage = ice_cream.image.storage
+    return ', '.join(f"{storage.url(entry[fmt])} {entry['width']}w" for entry in ice_cream.image_variants['variants'])
+
+
+def variant_url(ice_cream, label='card', fmt='jpeg'):
+    """URL of the named variant (or the closest smaller one), falling back to the original"""
+    if not is_current(ice_cream):
+        return ice_cream.image.url if ice_cream.image else ''
+    variants = ice_cream.image_variants['variants']
+    order = [name for name, _ in VARIANTS]
+    wanted = order.index(label) if label in order else len(order) - 1
+    candidates = [entry for entry in variants if order.index(entry['label']) <= wanted] or variants
+    return ice_cream.image.storage.url(candidates[-1][fmt])
@@ -0,0 +1,284 @@
+"""
+Load test of a service rush against a throwaway database.
+
+``run`` seeds ``tables`` tables and ``flavors`` ice creams. It then drives
+``customers`` customer sessions, ``concurrency`` at a time, through the
+ordering flow:
+
+    order_page -> submit_order -> check_payment_status -> verify_payment -> check_payment_status
+
+At the same time, ``staff`` sessions load ``admin_dashboard`` and move the
+paid orders through ``update_order_status`` (in progress, then completed).
+Requests go through Django's test client, so the whole stack runs
+(middleware, sessions, templates, the outbox) without a network.
+Firebase is replaced by ``NullBackend``, mail by the locmem backend, and
+the cache by a local memory cache, so nothing leaves the process.
+
+The results record latency percentiles, throughput and SQL queries per
+endpoint. ``save`` writes them as JSON and ``compare`` diffs two runs,
+for example from two commits.
+"""
+import json
+import math
+import os
+import queue
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .query_budget import QueryCounter
+
+ENDPOINTS = (
+    'order_page', 'submit_order', 'check_payment_status', 'verify_payment',
+    'admin_dashboard', 'update_order_status',
+)
+
+# Everything that would leave the process is stubbed or kept in memory
+STUBBED_SETTINGS = {
+    'SYNC_BACKEND': 'qr_ordering.sync_backends.NullBackend',
+    'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+    'EVENT_BROKER': 'qr_ordering.events.InProcessBroker',
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'loadtest'}},
+}
+
+
+class Recorder:
+    """Per-endpoint samples, shared by all session threads"""
+
+    def __init__(self):
+        self.samples = {name: [] for name in ENDPOINTS}
+        self._lock = threading.Lock()
+
+    def request(self, client, name, method, path, **kwargs):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        # The client runs the view in this thread, on this thread's connection
+        with connection.execute_wrapper(counter):
+            response = getattr(client, method)(path, **kwargs)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.samples[name].append((elapsed, counter.queries, counter.seconds, response.status_code))
+        return response
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted ``values``"""
+    if not values:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def summarize(samples, seconds):
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+    queries = [sample[1] for sample in samples]
+    count = len(samples)
+    if not count:
+        return {'requests': 0}
+    return {
+        'requests': count,
+        'errors': sum(1 for sample in samples if sample[3] >= 400),
+        'throughput_rps': round(count / seconds, 2) if seconds else None,
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'mean_ms': round(sum(latencies) / count, 2),
+        'max_ms': round(latencies[-1], 2),
+        'queries_mean': round(sum(queries) / count, 2),
+        'queries_max': max(queries),
+        'db_ms_mean': round(sum(sample[2] for sample in samples) * 1000 / count, 2),
+    }
+
+
+def seed(tables, flavors):
+    """Tables, ice creams, shop settings and a staff user; ``bulk_create`` skips QR and image work"""
+    from django.contrib.auth.models import User
+    from .models import IceCream, ShopSettings, Table
+
+    # A running shop has saved its settings; the first request should not create them
+    ShopSettings.get_settings()
+
+    IceCream.objects.bulk_create([
+        IceCream(name=f'Flavor {number}', price=Decimal(40 + number % 8 * 10),
+                 image=f'ice_cream_images/flavor_{number}.jpg')
+        for number in range(1, flavors + 1)
+    ])
+    Table.objects.bulk_create([
+        Table(number=number, qr_code=f'qr_codes/table_{number}.png')
+        for number in range(1, tables + 1)
+    ])
+    staff = User.objects.create_user('loadtest-staff', password=None, is_staff=True)
+    return (
+        list(Table.objects.values_list('id', 'token')),
+        list(IceCream.objects.values_list('id', flat=True)),
+        staff,
+    )
+
+
+def customer_session(recorder, number, tables, flavors, paid_orders, rng):
+    client = Client(raise_request_exception=False)
+    session = client.session
+    # What customer_google_login/verify_email leave behind
+    session.update({
+        'customer_email': f'customer{number}@example.com',
+        'customer_name': f'Customer {number}',
+        'email_verified': True,
+    })
+    session.save()
+    try:
+        table_id, token = rng.choice(tables)
+        recorder.request(client, 'order_page', 'get', reverse('order_page', args=[str(token)]))
+        items = [{'id': pk, 'quantity': rng.randint(1, 3)} for pk in rng.sample(flavors, min(len(flavors), rng.randint(1, 3)))]
+        response = recorder.request(client, 'submit_order', 'post', reverse('submit_order'),
+                                    data={'table_id': table_id, 'items': items}, content_type='application/json')
+        if response.status_code != 200:
+            return
+        order_id = response.json()['order_id']
+        status_url = reverse('check_payment_status', args=[order_id])
+        recorder.request(client, 'check_payment_status', 'get', status_url)
+        response = recorder.request(client, 'verify_payment', 'post', reverse('verify_payment'), data={
+            'order_id': order_id, 'payment_reference': f'LOADTEST{order_id}', 'payment_method': 'UPI',
+        }, content_type='application/json')
+        recorder.request(client, 'check_payment_status', 'get', status_url)
+        if response.status_code == 200:
+            paid_orders.put(order_id)
+    finally:
+        connection.close()
+
+
+def staff_session(recorder, staff, paid_orders, customers_done, dashboard_every):
+    client = Client(raise_request_exception=False)
+    client.force_login(staff)
+    actions = 0
+    try:
+        while not (customers_done.is_set() and paid_orders.empty()):
+            if actions % dashboard_every == 0:
+                recorder.request(client, 'admin_dashboard', 'get', reverse('admin_dashboard'))
+            actions += 1
+            try:
+                order_id = paid_orders.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            url = reverse('update_order_status', args=[order_id])
+            for status in ('in_progress', 'completed'):
+                recorder.request(client, 'update_order_status', 'post', url, data={'status': status})
+    finally:
+        connection.close()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(tables=20, flavors=12, customers=200, concurrency=8, staff=2, dashboard_every=5, seed_value=None):
+    """
+    Seed and drive one rush in a temporary SQLite database (file based,
+    so sessions on different threads share it). Returns the results dict.
+    """
+    config = {
+        'tables': tables, 'flavors': flavors, 'customers': customers,
+        'concurrency': concurrency, 'staff': staff, 'dashboard_every': dashboard_every,
+    }
+    rng = random.Random(seed_value)
+    directory = tempfile.mkdtemp(prefix='loadtest-')
+    creation = connection.creation
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    previous_test_name = test_settings.get('NAME')
+    test_settings['NAME'] = os.path.join(directory, 'loadtest.sqlite3')
+    old_name = creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    overrides = override_settings(
+        MEDIA_ROOT=os.path.join(directory, 'media'),
+        ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver'],
+        **STUBBED_SETTINGS,
+    )
+    overrides.enable()
+    try:
+        table_rows, flavor_ids, staff_user = seed(tables, flavors)
+        recorder = Recorder()
+        paid_orders = queue.Queue()
+        customers_done = threading.Event()
+        staff_threads = [
+            threading.Thread(target=staff_session, args=(recorder, staff_user, paid_orders, customers_done, dashboard_every))
+            for _ in range(staff)
+        ]
+
+        started = time.perf_counter()
+        for thread in staff_threads:
+            thread.start()
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            sessions = [
+                executor.submit(customer_session, recorder, number, table_rows, flavor_ids, paid_orders,
+                                random.Random(rng.random()))
+                for number in range(1, customers + 1)
+            ]
+            for future in sessions:
+                future.result()
+        customers_done.set()
+        for thread in staff_threads:
+            thread.join()
+        seconds = time.perf_counter() - started
+    finally:
+        overrides.disable()
+        for alias in connections:
+            connections[alias].close()
+        creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = previous_test_name
+        shutil.rmtree(directory, ignore_errors=True)
+
+    all_samples = [sample for samples in recorder.samples.values() for sample in samples]
+    return {
+        'commit': git_commit(),
+        'created_at': timezone.now().isoformat(),
+        'config': config,
+        'seconds': round(seconds, 3),
+        'total': summarize(all_samples, seconds),
+        'endpoints': {name: summarize(samples, seconds) for name, samples in recorder.samples.items()},
+    }
+
+
+def save(results, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+COMPARED = ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'queries_mean')
+
+
+def compare(baseline, results):
+    """``{endpoint: {metric: (before, after, change %)}}`` for the endpoints both runs have"""
+    changes = {}
+    for name in ['total'] + sorted(results['endpoints']):
+        before = baseline['total'] if name == 'total' else baseline['endpoints'].get(name)
+        after = results['total'] if name == 'total' else results['endpoints'][name]
+        if not before or not before.get('requests') or not after.get('requests'):
+            continue
+        changes[name] = {}
+        for metric in COMPARED:
+            old, new = before.get(metric), after.get(metric)
+            if old is None or new is None:
+                continue
+            change = round((new - old) * 100 / old, 1) if old else None
+            changes[name][metric] = (old, new, change)
+    return changes
@@ -0,0 +1,84 @@
+"""
+Directory-backed stand-in for a Firebase (Google Cloud) Storage bucket.
+
+Implements the part of the ``google.cloud.storage`` Bucket/Blob API used by
+``media_migration``: ``blob``, ``get_blob``, ``list_blobs``, and on blobs
+``upload_from_filename``, ``md5_hash`` and ``public_url``. It is enough to
+run the media migration offline and in tests:
+
+    MEDIA_BUCKET=qr_ordering.local_bucket.get_bucket python manage.py migrate_to_firebase --media
+"""
+import base64
+import hashlib
+import os
+import shutil
+import threading
+
+
+def md5_base64(path):
+    """MD5 of a file in the base64 form Cloud Storage reports as ``md5_hash``"""
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return base64.b64encode(digest.digest()).decode('ascii')
+
+
+class LocalBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+
+    @property
+    def path(self):
+        return os.path.join(self.bucket.root, *self.name.split('/'))
+
+    @property
+    def md5_hash(self):
+        return md5_base64(self.path) if os.path.exists(self.path) else None
+
+    @property
+    def public_url(self):
+        return f'https://storage.googleapis.com/{self.bucket.name}/{self.name}'
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def upload_from_filename(self, filename, content_type=None, predefined_acl=None, **kwargs):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary = f'{self.path}.{threading.get_ident()}.part'
+        shutil.copyfile(filename, temporary)
+        os.replace(temporary, self.path)
+        with self.bucket._lock:
+            self.bucket.upload_count += 1
+
+
+class LocalBucket:
+    def __init__(self, root, name='local-bucket'):
+        self.root = str(root)
+        self.name = name
+        self.upload_count = 0
+        self._lock = threading.Lock()
+
+    def blob(self, name):
+        return LocalBlob(self, name)
+
+    def get_blob(self, name):
+        blob = self.blob(name)
+        return blob if blob.exists() else None
+
+    def list_blobs(self, prefix=None):
+        for directory, _, files in os.walk(self.root):
+            for file_name in sorted(files):
+                if file_name.endswith('.part'):
+                    continue
+                name = os.path.relpath(os.path.join(directory, file_name), self.root).replace(os.sep, '/')
+                if not prefix or name.startswith(prefix):
+                    yield self.blob(name)
+
+
+def get_bucket():
+    """Bucket rooted at ``LOCAL_BUCKET_ROOT`` (default ``<BASE_DIR>/local_bucket``)"""
+    from django.conf import settings
+    root = getattr(settings, 'LOCAL_BUCKET_ROOT', None) or os.path.join(settings.BASE_DIR, 'local_bucket')
+    return LocalBucket(root)
@@ -0,0 +1,151 @@
+"""
+Queued customer emails.
+
+Request handlers only call the ``queue_*`` helpers, which persist a
+``MailJob`` row. The ``mail_worker`` management command renders the
+templates and sends due jobs over one long-lived connection from
+``get_connection()`` with ``send_pending``.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import MailJob, Order, Refund
+
+MAX_ATTEMPTS = 5
+MAX_BACKOFF_SECONDS = 600
+
+
+def queue_verification_email(email, name, code):
+    """Queue email verification code"""
+    return MailJob.objects.create(kind='verification', recipient=email, context={'name': name, 'code': code})
+
+
+def queue_payment_confirmation_email(order):
+    """Queue payment confirmation email to customer"""
+    return MailJob.objects.create(kind='payment_confirmation', recipient=order.customer_email, context={'order_id': order.id})
+
+
+def queue_refund_email(refund):
+    """Queue refund notification email to customer"""
+    return MailJob.objects.create(kind='refund', recipient=refund.customer_email, context={'refund_id': refund.id})
+
+
+def _verification_message(job):
+    name = job.context.get('name')
+    code = job.context.get('code')
+    html_message = render_to_string('emails/email_verification.html', {
+        'name': name,
+        'code': code,
+    })
+    plain_message = f"""
+    Hi {name},
+
+    Your verification code is: {code}
+
+    This code will expire in 10 minutes.
+
+    Thank you,
+    Ice Cream Shop
+    """
+    return 'Verify Your Email - Ice Cream Shop', plain_message, html_message
+
+
+def _payment_confirmation_message(job):
+    order = Order.objects.select_related('table').get(id=job.context['order_id'])
+    html_message = render_to_string('emails/payment_confirmation.html', {
+        'order': order,
+        'items': order.items.select_related('ice_cream'),
+        'total': order.total_amount,
+    })
+    return f'Payment Confirmed - Order #{order.id}', strip_tags(html_message), html_message
+
+
+def _refund_message(job):
+    refund = Refund.objects.select_related('order').get(id=job.context['refund_id'])
+    html_message = render_to_string('emails/refund_notification.html', {
+        'refund': refund,
+        'order': refund.order,
+    })
+    return f'Refund Processed - Order #{refund.order.id}', strip_tags(html_message), html_message
+
+
+BUILDERS = {
+    'verification': _verification_message,
+    'payment_confirmation': _payment_confirmation_message,
+    'refund': _refund_message,
+}
+
+
+def build_message(job, connection=None):
+    """Render a job into an email message"""
+    subject, plain_message, html_message = BUILDERS[job.kind](job)
+    message = EmailMultiAlternatives(
+        subject=subject,
+        body=plain_message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[job.recipient],
+        connection=connection,
+    )
+    message.attach_alternative(html_message, 'text/html')
+    return message
+
+
+def due_jobs():
+    return MailJob.objects.filter(status='pending').filter(
+        Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=timezone.now())
+    )
+
+
+def send_pending(batch_size=50, connection=None):
+    """
+    Send one batch of due mail jobs over a single connection.
+
+    A caller-supplied connection is left open so it can be reused for the
+    next batch. Failed jobs are retried with exponential backoff and marked
+    failed after ``MAX_ATTEMPTS``. Returns ``(sent, failed)`` counts.
+    """
+    jobs = list(due_jobs().order_by('id')[:batch_size])
+    if not jobs:
+        return 0, 0
+
+    owns_connection = connection is None
+    if owns_connection:
+        connection = get_connection(fail_silently=False)
+    sent = failed = 0
+    try:
+        for job in jobs:
+            try:
+                # Opening explicitly keeps the session alive across messages
+                connection.open()
+                connection.send_messages([build_message(job, connection)])
+            except Exception as e:
+                failed += 1
+                job.attempts += 1
+                job.last_error = str(e)[:1000]
+                if job.attempts >= MAX_ATTEMPTS:
+                    job.status = 'failed'
+                else:
+                    job.next_attempt_at = timezone.now() + timedelta(
+                        seconds=min(30 * 2 ** (job.attempts - 1), MAX_BACKOFF_SECONDS)
+                    )
+                job.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+                # Drop a possibly broken session, the next message reconnects
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+            else:
+                sent += 1
+                job.status = 'sent'
+                job.sent_at = timezone.now()
+                job.save(update_fields=['status', 'sent_at'])
+    finally:
+        if owns_connection:
+            connection.close()
+    return sent, failed
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum, F
+from django.utils import timezone
+from qr_ordering.models import Order, OrderItem
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored total_amount and item_count for existing orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', dest='batch_size', type=int, default=500, help='Orders written per bulk_update')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # One grouped query over all order items instead of one per order
+        totals = {
+            row['order_id']: row
+            for row in OrderItem.objects.values('order_id').annotate(
+                total=Sum(F('quantity') * F('unit_price')),
+                count=Sum('quantity'),
+            )
+        }
+
+        now = timezone.now()
+        orders = []
+        for order in Order.objects.only('id', 'total_amount', 'item_count').iterator():
+            row = totals.get(order.id, {})
+            total_amount = row.get('total') or 0
+            item_count = row.get('count') or 0
+            if order.total_amount != total_amount or order.item_count != item_count:
+                order.total_amount = total_amount
+                order.item_count = item_count
+                order.updated_at = now
+                orders.append(order)
+
+        with transaction.atomic():
+            Order.objects.bulk_update(orders, ['total_amount', 'item_count', 'updated_at'], batch_size=batch_size)
+
+        self.stdout.write(self.style.SUCCESS(f"Order totals backfilled. Updated: {len(orders)}"))
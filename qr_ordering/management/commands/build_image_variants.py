@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from qr_ordering import images
+
+
+class Command(BaseCommand):
+    help = 'Build resized WebP/JPEG variants for ice cream images that do not have them yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Resizing processes (default: CPU count)')
+        parser.add_argument('--force', action='store_true', help='Rebuild variants for every image')
+
+    def handle(self, *args, **options):
+        def progress(done, total):
+            self.stdout.write(f"Processed {done}/{total} images")
+
+        built, failed = images.backfill(workers=options['workers'], force=options['force'], progress=progress)
+        style = self.style.SUCCESS if not failed else self.style.WARNING
+        self.stdout.write(style(f"Image variants built: {built}, failed: {failed}"))
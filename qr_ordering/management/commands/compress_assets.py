@@ -0,0 +1,21 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from qr_ordering import assets
+
+
+class Command(BaseCommand):
+    help = 'Write gzip (and brotli, if installed) copies of compressible media and collected static files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rewrite copies that are already up to date')
+
+    def handle(self, *args, **options):
+        if not assets.brotli:
+            self.stdout.write(self.style.WARNING('brotli is not installed; writing gzip copies only'))
+        for root in (settings.MEDIA_ROOT, settings.STATIC_ROOT):
+            if root and os.path.isdir(root):
+                written = assets.compress_tree(root, force=options['force'])
+                self.stdout.write(f"{root}: {written} compressed file(s) written")
+        self.stdout.write(self.style.SUCCESS('Assets compressed.'))
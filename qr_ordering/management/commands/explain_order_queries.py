@@ -0,0 +1,83 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from qr_ordering.dates import day_range, within
+from qr_ordering.models import EmailVerification, Order, Refund
+
+# Indexes added for the admin order queries (migration 0014)
+QUERY_INDEXES = [
+    'order_status_created_idx',
+    'order_table_created_idx',
+    'order_email_created_idx',
+    'emailverif_email_verified_idx',
+    'refund_status_created_idx',
+]
+
+ACTIVE_STATUSES = ['paid', 'in_progress', 'completed', 'cancelled']
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Print the query plans (and timings) of the common admin order queries before and after the indexes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Times each query is run for the timing')
+        parser.add_argument('--email', default='customer@example.com', help='Customer email used in the lookups')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        table_id = Order.objects.values_list('table_id', flat=True).first() or 1
+        email = options['email']
+
+        # Old form: no composite indexes and __date filters
+        before = [
+            ("Today's orders", Order.objects.filter(created_at__date=today, status__in=ACTIVE_STATUSES)),
+            ("Table's orders today", Order.objects.filter(table_id=table_id, created_at__date=today)),
+            ("Customer's orders", Order.objects.filter(customer_email=email).order_by('-created_at')),
+            ("Pending verification", EmailVerification.objects.filter(email=email, is_verified=False)),
+            ("Pending refunds this week", Refund.objects.filter(
+                status='pending', created_at__date__gte=today - timedelta(days=6))),
+        ]
+        # New form: composite indexes and half-open ranges
+        today_bounds = day_range(today, timezone.get_current_timezone())
+        week_start = today_bounds[0] - timedelta(days=6)
+        after = [
+            ("Today's orders", Order.objects.filter(status__in=ACTIVE_STATUSES, **within('created_at', today_bounds))),
+            ("Table's orders today", Order.objects.filter(table_id=table_id, **within('created_at', today_bounds))),
+            ("Customer's orders", Order.objects.filter(customer_email=email).order_by('-created_at')),
+            ("Pending verification", EmailVerification.objects.filter(email=email, is_verified=False)),
+            ("Pending refunds this week", Refund.objects.filter(status='pending', created_at__gte=week_start)),
+        ]
+
+        self.stdout.write(f"Orders: {Order.objects.count()}, refunds: {Refund.objects.count()}, "
+                          f"verifications: {EmailVerification.objects.count()}")
+
+        # Drop the indexes inside a transaction that is always rolled back
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    for name in QUERY_INDEXES:
+                        cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+                self.report('BEFORE (no composite indexes, __date filters)', before, options['repeat'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        self.report('AFTER (composite indexes, half-open ranges)', after, options['repeat'])
+
+    def report(self, heading, queries, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n{heading}"))
+        for label, queryset in queries:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset.all())
+            elapsed = (time.perf_counter() - started) / repeat * 1000
+            self.stdout.write(self.style.SUCCESS(f"\n{label} ({elapsed:.2f} ms)"))
+            self.stdout.write(queryset.explain())
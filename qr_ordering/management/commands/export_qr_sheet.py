@@ -0,0 +1,27 @@
+import sys
+
+from django.core.management.base import BaseCommand
+from qr_ordering.models import Table
+from qr_ordering.qr_sheet import iter_pdf
+
+
+class Command(BaseCommand):
+    help = 'Write a printable PDF sheet of every table QR code, streamed page by page.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-o', '--output', default='table-qr-codes.pdf', help="Output file, or '-' for stdout")
+
+    def handle(self, *args, **options):
+        tables = Table.objects.order_by('number').only('number', 'description', 'token', 'qr_code', 'qr_base_url')
+        output = options['output']
+        out = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        size = 0
+        try:
+            for chunk in iter_pdf(tables.iterator(chunk_size=100)):
+                out.write(chunk)
+                size += len(chunk)
+        finally:
+            if output != '-':
+                out.close()
+        if output != '-':
+            self.stdout.write(self.style.SUCCESS(f"Wrote {output} ({size} bytes)"))
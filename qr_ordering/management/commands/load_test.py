@@ -0,0 +1,61 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from qr_ordering import loadtest
+
+
+class Command(BaseCommand):
+    help = 'Simulate a service rush (customers ordering and paying, staff working the dashboard) and report latency per endpoint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tables', type=int, default=20, help='Tables to seed')
+        parser.add_argument('--flavors', type=int, default=12, help='Ice creams to seed')
+        parser.add_argument('--customers', type=int, default=200, help='Customer sessions (one order each)')
+        parser.add_argument('--concurrency', type=int, default=8, help='Customer sessions running at once')
+        parser.add_argument('--staff', type=int, default=2, help='Concurrent staff sessions')
+        parser.add_argument('--dashboard-every', dest='dashboard_every', type=int, default=5,
+                            help='Staff reload the dashboard every N actions')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for a repeatable mix of orders')
+        parser.add_argument('-o', '--output', help='JSON results file (default: loadtest_results/<time>-<commit>.json)')
+        parser.add_argument('--compare', help='Earlier JSON results to compare against')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Seeding a temporary database and running the rush...')
+        results = loadtest.run(
+            tables=options['tables'],
+            flavors=options['flavors'],
+            customers=options['customers'],
+            concurrency=options['concurrency'],
+            staff=options['staff'],
+            dashboard_every=max(1, options['dashboard_every']),
+            seed_value=options['seed'],
+        )
+
+        self.stdout.write(f"{'endpoint':<22}{'reqs':>7}{'err':>5}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}")
+        for name, row in list(results['endpoints'].items()) + [('total', results['total'])]:
+            if not row['requests']:
+                continue
+            self.stdout.write(
+                f"{name:<22}{row['requests']:>7}{row['errors']:>5}{row['throughput_rps']:>9}"
+                f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{row['queries_mean']:>9}"
+            )
+        self.stdout.write(f"Latency in ms, queries per request (mean); {results['seconds']}s wall time.")
+
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'loadtest_results',
+            f"{timezone.now():%Y%m%d-%H%M%S}-{results['commit'] or 'nocommit'}.json",
+        )
+        loadtest.save(results, output)
+        self.stdout.write(self.style.SUCCESS(f'Results saved to {output}'))
+
+        if options['compare']:
+            self.stdout.write(f"Compared with {options['compare']}:")
+            for name, metrics in loadtest.compare(loadtest.load(options['compare']), results).items():
+                changes = ', '.join(
+                    f"{metric} {old} -> {new}" + (f" ({change:+}%)" if change is not None else '')
+                    for metric, (old, new, change) in metrics.items()
+                )
+                self.stdout.write(f"  {name}: {changes}")
@@ -0,0 +1,31 @@
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from qr_ordering import mail
+import time
+
+
+class Command(BaseCommand):
+    help = 'Render and send queued emails over one reused SMTP connection.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Send what is due and exit')
+        parser.add_argument('--batch-size', dest='batch_size', type=int, default=50, help='Jobs sent per batch')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        connection = get_connection(fail_silently=False)
+        try:
+            while True:
+                sent, failed = mail.send_pending(batch_size=options['batch_size'], connection=connection)
+                if sent or failed:
+                    self.stdout.write(f"Sent {sent} email(s), {failed} failed")
+                    continue
+
+                # Queue is idle: release the SMTP session instead of letting it time out
+                connection.close()
+                if options['once']:
+                    self.stdout.write(self.style.SUCCESS('Mail queue drained.'))
+                    return
+                time.sleep(options['interval'])
+        finally:
+            connection.close()
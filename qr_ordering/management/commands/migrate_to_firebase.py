@@ -1,35 +1,51 @@
 from django.core.management.base import BaseCommand
 from qr_ordering.models import IceCream, Table
-from qr_ordering.firebase_utils import upload_file_to_firebase_storage
-from firebase_admin import db
-import os
+from qr_ordering import media_migration
+from qr_ordering.sync import product_payload, table_payload
+from qr_ordering.sync_backends import get_backend
 
 class Command(BaseCommand):
     help = 'Migrate existing IceCream and Table images/data to Firebase Storage and Database.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--media', action='store_true', help='Upload images and QR codes to Firebase Storage (resumable)')
+        parser.add_argument('--workers', type=int, default=media_migration.DEFAULT_WORKERS, help='Parallel uploads')
+        parser.add_argument('--checkpoint', default=None, help='Checkpoint file (default: the MEDIA_CHECKPOINT setting, which the sync payloads read URLs from)')
+
     def handle(self, *args, **options):
-        self.migrate_icecreams_to_firebase()
-        self.migrate_tables_to_firebase()
+        if options['media']:
+            self.migrate_media(options)
+            return
+        # Everything goes out as one multi-path update
+        updates = {}
+        self.migrate_icecreams_to_firebase(updates)
+        self.migrate_tables_to_firebase(updates)
+        get_backend().update(updates)
         self.stdout.write(self.style.SUCCESS('Migration complete.'))
 
-    def migrate_icecreams_to_firebase(self):
+    def migrate_icecreams_to_firebase(self, updates):
         for icecream in IceCream.objects.all():
             if icecream.image:
-                image_url = icecream.image.url  # Local media URL
-                db.reference(f'products/{icecream.id}').set({
-                    'name': icecream.name,
-                    'price': float(icecream.price),
-                    'image_url': image_url
-                })
+                updates[f'products/{icecream.id}'] = product_payload(icecream)
                 self.stdout.write(f"IceCream {icecream.name} migrated.")
 
-    def migrate_tables_to_firebase(self):
+    def migrate_tables_to_firebase(self, updates):
         for table in Table.objects.all():
             if table.qr_code:
-                qr_code_url = table.qr_code.url  # Local media URL
-                db.reference(f'tables/{table.id}').set({
-                    'number': table.number,
-                    'token': str(table.token),
-                    'qr_code_url': qr_code_url
-                })
+                updates[f'tables/{table.id}'] = table_payload(table)
                 self.stdout.write(f"Table {table.number} migrated.")
+
+    def migrate_media(self, options):
+        def progress(done, total):
+            self.stdout.write(f"Migrated {done}/{total} files")
+
+        summary = media_migration.migrate(
+            workers=options['workers'],
+            checkpoint_path=options['checkpoint'],
+            progress=progress,
+        )
+        message = f"Uploaded: {summary['uploaded']}, unchanged: {summary['skipped']}, failed: {summary['failed']}"
+        if summary['failed']:
+            self.stdout.write(self.style.WARNING(f"{message}. Run again to retry the failed files."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{message}. Storage URLs queued for the sync worker."))
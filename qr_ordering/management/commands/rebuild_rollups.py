@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from qr_ordering import rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales rollups from all paid orders.'
+
+    def handle(self, *args, **options):
+        daily, products = rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Daily sales rollups rebuilt. Day/table rows: {daily}, day/product/table rows: {products}"
+        ))
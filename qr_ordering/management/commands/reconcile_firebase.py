@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from qr_ordering import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Push only the orders/products/tables nodes that differ between the database and Firebase.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', dest='dry_run', action='store_true', help='Report the drift without writing')
+        parser.add_argument('--batch-size', dest='batch_size', type=int, default=reconcile.DEFAULT_BATCH_SIZE, help='Paths per multi-path update')
+        parser.add_argument('--root', dest='roots', action='append', choices=reconcile.ROOTS, help='Limit to a root (repeatable)')
+
+    def handle(self, *args, **options):
+        report = reconcile.reconcile(
+            roots=options['roots'] or reconcile.ROOTS,
+            dry_run=options['dry_run'],
+            batch_size=options['batch_size'],
+        )
+
+        if report['pending_events']:
+            self.stdout.write(self.style.WARNING(
+                f"{report['pending_events']} outbox event(s) not yet delivered; their nodes count as drift"
+            ))
+        for root, counts in report['roots'].items():
+            self.stdout.write(
+                f"{root}: local={counts['local']} remote={counts['remote']} "
+                f"added={counts['added']} changed={counts['changed']} deleted={counts['deleted']}"
+            )
+        timings = report['timings']
+        self.stdout.write(
+            f"fetch={timings['fetch']}s hash={timings['hash']}s push={timings['push']}s"
+        )
+        if not report['paths']:
+            self.stdout.write(self.style.SUCCESS('Firebase is in sync.'))
+        elif report['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f"Dry run: {report['paths']} node(s), {report['bytes']} bytes would be written."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Wrote {report['paths']} node(s), {report['bytes']} bytes in {report['writes']} update(s)."
+            ))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from qr_ordering import sync
+import time
+
+
+class Command(BaseCommand):
+    help = 'Drain the Firebase sync outbox, pushing coalesced multi-path updates.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain what is pending and exit')
+        parser.add_argument('--batch-size', dest='batch_size', type=int, default=100, help='Events coalesced into one update')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--retry-failed', dest='retry_failed', action='store_true', help='Queue events that were given up on again before draining')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        interval = options['interval']
+
+        if options['retry_failed']:
+            self.stdout.write(f"Requeued {sync.retry_failed()} failed event(s)")
+
+        while True:
+            try:
+                sent = sync.drain(batch_size=batch_size)
+            except Exception as e:
+                sent = 0
+                self.stdout.write(self.style.WARNING(f'Firebase sync failed, will retry: {e}'))
+
+            if sent:
+                stats = sync.outbox_stats()
+                self.stdout.write(
+                    f"Synced {sent} event(s); pending={stats['pending']} failed={stats['failed']} lag={stats['lag_seconds']}s"
+                )
+                continue
+
+            if options['once']:
+                stats = sync.outbox_stats()
+                self.stdout.write(self.style.SUCCESS(
+                    f"Outbox drained. pending={stats['pending']} failed={stats['failed']} lag={stats['lag_seconds']}s"
+                ))
+                return
+
+            time.sleep(interval)
@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from qr_ordering.models import Table
+from qr_ordering import qr_jobs
 import os
 import json
 from urllib.request import urlopen
@@ -13,6 +13,8 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('--base-url', dest='base_url', default=None, help='Base URL e.g., https://abc.ngrok-free.app')
         parser.add_argument('--auto-ngrok', action='store_true', help='Auto-detect ngrok HTTPS URL from local API (http://127.0.0.1:4040)')
+        parser.add_argument('--workers', type=int, default=None, help='QR rendering processes (default: CPU count)')
+        parser.add_argument('--batch-size', dest='batch_size', type=int, default=qr_jobs.BATCH_SIZE, help='Tables written per bulk_update')
 
     def handle(self, *args, **options):
         base_url = options.get('base_url') or os.environ.get('SITE_BASE_URL') or getattr(settings, 'SITE_BASE_URL', 'http://127.0.0.1:8000')
@@ -35,12 +37,14 @@ class Command(BaseCommand):
             except Exception as e:
                 self.stdout.write(self.style.WARNING(f'Unexpected error reading ngrok API: {e}. Falling back to provided/base URL'))
         base_url = base_url.rstrip('/') + '/'
-        updated = 0
-        for table in Table.objects.all():
-            table.qr_base_url = base_url
-            # Trigger regeneration by clearing and saving
-            table.qr_code = None
-            table.save()
-            updated += 1
-            self.stdout.write(self.style.SUCCESS(f"Updated Table {table.number} QR code -> {base_url}"))
-        self.stdout.write(self.style.SUCCESS(f"All tables updated. Total: {updated}"))
+
+        def progress(done, total):
+            self.stdout.write(f"Regenerated {done}/{total} QR codes -> {base_url}")
+
+        job = qr_jobs.regenerate_all(
+            base_url=base_url,
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(f"All tables updated. Total: {job.total}"))
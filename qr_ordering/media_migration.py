@@ -0,0 +1,203 @@
+"""
+Resumable upload of local media (ice cream photos, table QR codes) to
+Firebase Storage.
+
+``migrate`` uses one bucket client for every file and uploads from a
+bounded thread pool. A file is skipped when its MD5 matches the remote
+object, either from the checkpoint or from one listing of the bucket.
+Each finished file is recorded in a JSON checkpoint, so a rerun after a
+failure only uploads what is left. The public URLs are queued for the
+Firebase database through the sync outbox. Afterwards the sync payloads
+read them back with ``migrated_url``, so later writes keep the Storage URL
+instead of the local media URL. ``MEDIA_BUCKET`` names the bucket factory;
+``qr_ordering.local_bucket.get_bucket`` runs it offline.
+"""
+import json
+import mimetypes
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .local_bucket import md5_base64
+from .models import IceCream, Table
+
+DEFAULT_WORKERS = 8
+# Checkpoint writes are batched; a crash loses at most this many records
+SAVE_EVERY = 20
+PREFIXES = ('ice_cream_images/', 'qr_codes/')
+
+
+def get_bucket():
+    return import_string(getattr(settings, 'MEDIA_BUCKET', 'qr_ordering.firebase_utils.get_bucket'))()
+
+
+def default_checkpoint_path():
+    return getattr(settings, 'MEDIA_CHECKPOINT', None) or os.path.join(settings.BASE_DIR, '.firebase_media_checkpoint.json')
+
+
+def blob_name(prefix, field_file):
+    """Bucket object name of a local media file"""
+    return f'{prefix}{os.path.basename(field_file.name)}'
+
+
+def collect():
+    """``(firebase path, local path, blob name)`` for every local media file to migrate"""
+    tasks = []
+    for ice_cream in IceCream.objects.exclude(image='').order_by('id'):
+        tasks.append((f'products/{ice_cream.id}/image_url', ice_cream.image.path,
+                      blob_name('ice_cream_images/', ice_cream.image)))
+    for table in Table.objects.exclude(qr_code='').order_by('number'):
+        tasks.append((f'tables/{table.id}/qr_code_url', table.qr_code.path,
+                      blob_name('qr_codes/', table.qr_code)))
+    return [task for task in tasks if os.path.exists(task[1])]
+
+
+_migrated = {'key': None, 'urls': {}}
+_migrated_lock = threading.Lock()
+
+
+def migrated_url(name):
+    """Storage URL the checkpoint records for blob ``name``, or None if it was never migrated"""
+    path = default_checkpoint_path()
+    try:
+        key = (path, os.stat(path).st_mtime_ns)
+    except OSError:
+        return None
+    with _migrated_lock:
+        # Reread only when the checkpoint has been rewritten
+        if _migrated['key'] != key:
+            try:
+                with open(path) as f:
+                    files = json.load(f).get('files', {})
+            except (OSError, ValueError):
+                files = {}
+            _migrated['key'] = key
+            _migrated['urls'] = {name: entry.get('url') for name, entry in files.items()}
+        return _migrated['urls'].get(name)
+
+
+class Checkpoint:
+    """``{blob name: {'md5', 'url'}}`` of finished uploads, saved as JSON"""
+
+    def __init__(self, path, bucket_name):
+        self.path = path
+        self.bucket_name = bucket_name
+        self.files = {}
+        self.unsaved = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            # A checkpoint for another bucket says nothing about this one
+            if data.get('bucket') == bucket_name:
+                self.files = data.get('files', {})
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def url(self, name, md5):
+        with self._lock:
+            entry = self.files.get(name)
+        return entry['url'] if entry and entry.get('md5') == md5 else None
+
+    def record(self, name, md5, url):
+        with self._lock:
+            self.files[name] = {'md5': md5, 'url': url}
+            self.unsaved += 1
+            due = self.unsaved >= SAVE_EVERY
+        if due:
+            self.save()
+
+    def save(self):
+        with self._save_lock:
+            with self._lock:
+                data = {'bucket': self.bucket_name, 'files': dict(self.files)}
+                self.unsaved = 0
+            temporary = f'{self.path}.tmp'
+            with open(temporary, 'w') as f:
+                json.dump(data, f, indent=1, sort_keys=True)
+            # Atomic: an interrupted save never leaves a truncated checkpoint
+            os.replace(temporary, self.path)
+
+
+def _upload(bucket, checkpoint, remote, local_path, name):
+    """Returns ``(outcome, url)`` with outcome 'checkpoint', 'remote' or 'uploaded'"""
+    md5 = md5_base64(local_path)
+    url = checkpoint.url(name, md5)
+    if url:
+        return 'checkpoint', url
+    blob = bucket.blob(name)
+    if remote.get(name) == md5:
+        outcome = 'remote'
+    else:
+        content_type, _ = mimetypes.guess_type(local_path)
+        # Public in the same request instead of a separate make_public() call
+        blob.upload_from_filename(local_path, content_type=content_type, predefined_acl='publicRead')
+        outcome = 'uploaded'
+    checkpoint.record(name, md5, blob.public_url)
+    return outcome, blob.public_url
+
+
+def migrate(tasks=None, bucket=None, workers=DEFAULT_WORKERS, checkpoint_path=None, update_database=True, progress=None):
+    """
+    Upload ``tasks`` (default: ``collect()``) and queue their URLs for Firebase.
+
+    Failed files are reported and left out of the checkpoint, so the next
+    run retries only them. ``progress(done, total)`` is called per file.
+    Returns ``{'uploaded', 'skipped', 'failed', 'errors'}``.
+    """
+    tasks = collect() if tasks is None else tasks
+    bucket = bucket or get_bucket()
+    checkpoint = Checkpoint(checkpoint_path or default_checkpoint_path(), bucket.name)
+    summary = {'uploaded': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+
+    # One listing instead of a metadata request per file, only if the checkpoint cannot answer
+    remote = {}
+    if any(name not in checkpoint.files for _, _, name in tasks):
+        for prefix in PREFIXES:
+            remote.update((blob.name, blob.md5_hash) for blob in bucket.list_blobs(prefix=prefix))
+
+    urls = {}
+    pending = iter(tasks)
+    in_flight = {}
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        try:
+            while True:
+                # Keep the queue bounded instead of submitting every file at once
+                while len(in_flight) < max(1, workers) * 2:
+                    task = next(pending, None)
+                    if task is None:
+                        break
+                    firebase_path, local_path, name = task
+                    in_flight[executor.submit(_upload, bucket, checkpoint, remote, local_path, name)] = task
+                if not in_flight:
+                    break
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    firebase_path, local_path, name = in_flight.pop(future)
+                    try:
+                        outcome, url = future.result()
+                    except Exception as e:
+                        summary['failed'] += 1
+                        summary['errors'].append(f'{name}: {e}')
+                        print(f"Error uploading {local_path} to {name}: {e}")
+                    else:
+                        summary['uploaded' if outcome == 'uploaded' else 'skipped'] += 1
+                        urls[firebase_path] = url
+                    done += 1
+                    if progress:
+                        progress(done, len(tasks))
+        finally:
+            checkpoint.save()
+
+    if update_database and urls:
+        from . import sync
+        # One multi-path outbox event instead of a set per record
+        with sync.batch():
+            for firebase_path, url in urls.items():
+                sync.enqueue(firebase_path, url, op='set')
+    return summary
@@ -0,0 +1,116 @@
+"""
+In-memory stand-in for ``firebase_admin.db``.
+
+Only the small part of the Reference API used by this app is implemented
+(``reference(path)`` with ``get``, ``set``, ``update`` and ``delete``), which
+is enough to run the sync worker and tests without network access:
+
+    SYNC_BACKEND=qr_ordering.sync_backends.MemoryBackend python manage.py sync_worker --once
+"""
+import copy
+import threading
+
+# Characters Firebase rejects in keys
+INVALID_KEY_CHARACTERS = set('.#$[]')
+
+
+def _split(path):
+    return [part for part in str(path).split('/') if part]
+
+
+def _check_keys(parts, value):
+    for part in parts:
+        if INVALID_KEY_CHARACTERS.intersection(part):
+            raise ValueError(f'Invalid key: {part!r}')
+    if isinstance(value, dict):
+        for key, child in value.items():
+            _check_keys([str(key)], child)
+
+
+class InMemoryDatabase:
+    def __init__(self):
+        self.data = {}
+        self.write_count = 0
+        self._lock = threading.Lock()
+
+    def reference(self, path='/'):
+        return InMemoryReference(self, path)
+
+    def reset(self):
+        with self._lock:
+            self.data = {}
+            self.write_count = 0
+
+    def _get(self, parts):
+        node = self.data
+        for part in parts:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return copy.deepcopy(node)
+
+    def _set(self, parts, value):
+        if not parts:
+            self.data = copy.deepcopy(value) if isinstance(value, dict) else {}
+            return
+        node = self.data
+        for part in parts[:-1]:
+            child = node.get(part)
+            if not isinstance(child, dict):
+                if value is None:
+                    return
+                child = node[part] = {}
+            node = child
+        if value is None:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = copy.deepcopy(value)
+        self._prune(parts[:-1])
+
+    def _prune(self, parts):
+        # Firebase drops empty parents, mirror that so get() results match
+        while parts:
+            node = self.data
+            for part in parts[:-1]:
+                node = node.get(part, {})
+            if node.get(parts[-1]) == {}:
+                node.pop(parts[-1], None)
+            parts = parts[:-1]
+
+
+class InMemoryReference:
+    def __init__(self, database, path):
+        self._database = database
+        self.path = '/' + '/'.join(_split(path))
+
+    def get(self):
+        with self._database._lock:
+            return self._database._get(_split(self.path))
+
+    def set(self, value):
+        if value is None:
+            raise ValueError('Value must not be None.')
+        _check_keys(_split(self.path), value)
+        with self._database._lock:
+            self._database._set(_split(self.path), value)
+            self._database.write_count += 1
+
+    def update(self, value):
+        if not value or not isinstance(value, dict):
+            raise ValueError('Value argument must be a non-empty dictionary.')
+        base = _split(self.path)
+        for key, child in value.items():
+            # Firebase rejects the whole update, nothing is written
+            _check_keys(base + _split(key), child)
+        with self._database._lock:
+            for key, child in value.items():
+                self._database._set(base + _split(key), child)
+            self._database.write_count += 1
+
+    def delete(self):
+        with self._database._lock:
+            self._database._set(_split(self.path), None)
+            self._database.write_count += 1
+
+
+db = InMemoryDatabase()
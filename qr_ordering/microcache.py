@@ -0,0 +1,121 @@
+"""
+Short-lived shared cache for the admin dashboard and analytics figures.
+
+Several staff screens poll the same aggregates at once. ``get_or_compute``
+keeps each result in Django's cache for ``DASHBOARD_CACHE_TTL`` seconds and
+coalesces concurrent misses: one caller computes while the others (threads
+in this process, or other processes sharing the cache) wait for its result.
+Order changes call ``invalidate`` after commit, so staff still see a status
+change immediately. Hit/miss counters are shared through the cache and
+reported by ``counters``.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'microcache:version'
+COUNTER_NAMES = ('hits', 'misses', 'coalesced')
+LOCK_TIMEOUT = 10
+WAIT_INTERVAL = 0.05
+# Names (e.g. analytics date ranges) are unbounded, so they share a fixed set of locks
+LOCK_STRIPES = 64
+
+_MISSING = object()
+# Reentrant: a compute that looks up another name on the same stripe does not deadlock
+_local_locks = [threading.RLock() for _ in range(LOCK_STRIPES)]
+
+
+def get_ttl():
+    return getattr(settings, 'DASHBOARD_CACHE_TTL', 3)
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate():
+    """Drop every cached figure in every process"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, int(time.time() * 1000), timeout=None)
+
+
+def _count(name):
+    key = f'microcache:counter:{name}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def counters():
+    """Hit/miss counters since the last reset"""
+    values = cache.get_many([f'microcache:counter:{name}' for name in COUNTER_NAMES])
+    result = {name: values.get(f'microcache:counter:{name}', 0) for name in COUNTER_NAMES}
+    lookups = sum(result.values())
+    result['hit_rate'] = round((result['hits'] + result['coalesced']) / lookups * 100, 1) if lookups else 0
+    result['ttl'] = get_ttl()
+    return result
+
+
+def reset_counters():
+    cache.delete_many([f'microcache:counter:{name}' for name in COUNTER_NAMES])
+
+
+def _local_lock(name):
+    return _local_locks[hash(name) % LOCK_STRIPES]
+
+
+def get_or_compute(name, compute, ttl=None):
+    """Return the cached value for ``name``, computing it once on a miss"""
+    ttl = get_ttl() if ttl is None else ttl
+    if ttl <= 0:
+        return compute()
+
+    key = f'microcache:{_version()}:{name}'
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        _count('hits')
+        return value
+
+    # Only one thread per process goes on to compute or wait
+    with _local_lock(name):
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            _count('coalesced')
+            return value
+
+        lock_key = f'{key}:lock'
+        if cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+            try:
+                _count('misses')
+                value = compute()
+                cache.set(key, value, timeout=ttl)
+            finally:
+                cache.delete(lock_key)
+            return value
+
+        # Another process is computing it: wait for the result
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline and cache.get(lock_key) is not None:
+            time.sleep(WAIT_INTERVAL)
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                _count('coalesced')
+                return value
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            _count('coalesced')
+            return value
+
+        # The other process failed or timed out; compute without caching over it
+        _count('misses')
+        return compute()
@@ -1,33 +1,13 @@
-from qr_ordering.models import IceCream, Table
-from qr_ordering.firebase_utils import upload_file_to_firebase_storage
-from firebase_admin import db
-import os
+from qr_ordering.media_migration import migrate
 
-def migrate_icecreams_to_firebase():
-    for icecream in IceCream.objects.all():
-        if icecream.image and os.path.exists(icecream.image.path):
-            firebase_path = f"ice_cream_images/{os.path.basename(icecream.image.name)}"
-            image_url = upload_file_to_firebase_storage(icecream.image.path, firebase_path)
-            db.reference(f'products/{icecream.id}').set({
-                'name': icecream.name,
-                'price': float(icecream.price),
-                'image_url': image_url
-            })
-            print(f"IceCream {icecream.name} migrated.")
 
-def migrate_tables_to_firebase():
-    for table in Table.objects.all():
-        if table.qr_code and os.path.exists(table.qr_code.path):
-            firebase_path = f"qr_codes/{os.path.basename(table.qr_code.name)}"
-            qr_url = upload_file_to_firebase_storage(table.qr_code.path, firebase_path)
-            db.reference(f'tables/{table.id}').set({
-                'number': table.number,
-                'token': str(table.token),
-                'qr_code_url': qr_url
-            })
-            print(f"Table {table.number} migrated.")
+def migrate_media_to_firebase(workers=8):
+    """Upload ice cream images and QR codes; resumes from the checkpoint of an earlier run"""
+    summary = migrate(workers=workers, progress=lambda done, total: print(f"Migrated {done}/{total} files."))
+    print(f"Uploaded: {summary['uploaded']}, unchanged: {summary['skipped']}, failed: {summary['failed']}")
+    return summary
+
 
 if __name__ == "__main__":
-    migrate_icecreams_to_firebase()
-    migrate_tables_to_firebase()
+    migrate_media_to_firebase()
     print("Migration complete.")
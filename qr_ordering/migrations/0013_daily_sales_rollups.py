@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qr_ordering', '0012_order_updated_at_ordertombstone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('order_count', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('ice_cream', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='qr_ordering.icecream')),
+                ('table', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_product_sales', to='qr_ordering.table')),
+            ],
+            options={
+                'ordering': ['-day'],
+                'unique_together': {('day', 'ice_cream', 'table')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('order_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('table', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='qr_ordering.table')),
+            ],
+            options={
+                'ordering': ['-day'],
+                'unique_together': {('day', 'table')},
+            },
+        ),
+    ]
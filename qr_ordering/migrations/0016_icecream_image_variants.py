@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qr_ordering', '0015_qrregenerationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='icecream',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qr_ordering', '0016_icecream_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncevent',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:25
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_current_prices(apps, schema_editor):
+    # The price charged was not recorded before; the current price is the best available
+    IceCream = apps.get_model('qr_ordering', 'IceCream')
+    OrderItem = apps.get_model('qr_ordering', 'OrderItem')
+    OrderItem.objects.update(
+        unit_price=Subquery(IceCream.objects.filter(pk=OuterRef('ice_cream_id')).values('price')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qr_ordering', '0017_syncevent_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, max_digits=5, null=True),
+        ),
+        migrations.RunPython(copy_current_prices, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, max_digits=5),
+        ),
+    ]
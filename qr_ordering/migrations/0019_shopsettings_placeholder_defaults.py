@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    ShopSettings defaults were changed to placeholders without a migration.
+    Only the defaults change (Django keeps them in Python), so no rows or
+    columns are touched.
+    """
+
+    dependencies = [
+        ('qr_ordering', '0018_orderitem_unit_price'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shopsettings',
+            name='from_email',
+            field=models.EmailField(default='your-email@gmail.com', max_length=254),
+        ),
+        migrations.AlterField(
+            model_name='shopsettings',
+            name='from_name',
+            field=models.CharField(default='Your Shop Name', max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='shopsettings',
+            name='upi_id',
+            field=models.CharField(blank=True, default='your-upi-id@bank', max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='shopsettings',
+            name='upi_merchant_name',
+            field=models.CharField(blank=True, default='Your Shop Name', max_length=100),
+        ),
+    ]
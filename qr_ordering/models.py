@@ -1,36 +1,80 @@
-import qrcode
-from io import BytesIO
-from django.core.files import File
-from django.db import models
+from django.core.files.base import ContentFile
+from django.db import models, transaction
+import copy
 import uuid
-import time
 
 
+class ChangeTrackingMixin:
+    """
+    Remembers field values as loaded from the database, so ``save`` can tell
+    what changed without querying for the stored row.
+    """
 
-class IceCream(models.Model):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = instance._tracked_values()
+        return instance
+
+    def _tracked_values(self):
+        deferred = self.get_deferred_fields()
+        # Copied, so in-place changes to mutable values (JSONField dicts) show up as changes
+        return {
+            field.name: copy.deepcopy(field.get_prep_value(field.value_from_object(self)))
+            for field in self._meta.concrete_fields
+            if field.attname not in deferred
+        }
+
+    def changed_fields(self):
+        """Names of fields changed since load or the last save; None if not loaded from the database"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or self._state.adding:
+            return None
+        current = self._tracked_values()
+        return {name for name, value in current.items() if name not in loaded or loaded[name] != value}
+
+    def has_changed(self, *names):
+        changed = self.changed_fields()
+        return changed is None or bool(changed.intersection(names) if names else changed)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = self._tracked_values()
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._loaded_values = self._tracked_values()
+
+
+class IceCream(ChangeTrackingMixin, models.Model):
     name = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=5, decimal_places=2)
     image = models.ImageField(upload_to='ice_cream_images/')
+    # Resized WebP/JPEG copies of ``image``, written by images.store
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    SYNCED_FIELDS = ('name', 'price', 'image')
 
     def __str__(self):
         return self.name
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Push product data to Firebase Database with local image URL
-        try:
-            from firebase_admin import db
-            if self.image:
-                image_url = self.image.url  # Local media URL
-                db.reference(f'products/{self.id}').set({
-                    'name': self.name,
-                    'price': float(self.price),
-                    'image_url': image_url
-                })
-        except Exception as e:
-            print(f"Error pushing IceCream data to Firebase: {e}")
-
-class Table(models.Model):
+        from .sync import enqueue, product_payload
+        if not self.has_changed():
+            return
+        push = self.has_changed(*self.SYNCED_FIELDS)
+        image_changed = self.has_changed('image')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Queue product data for Firebase (local or migrated Storage image URL)
+            if push and self.image:
+                enqueue(f'products/{self.id}', product_payload(self), op='set')
+            if image_changed and self.image:
+                from .images import schedule
+                pk = self.pk
+                transaction.on_commit(lambda: schedule(pk))
+
+class Table(ChangeTrackingMixin, models.Model):
 
     number = models.PositiveIntegerField(unique=True)
     token = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
@@ -44,66 +88,52 @@ class Table(models.Model):
         help_text="Base URL for QR code (e.g. https://yourdomain.com)"
     )
 
+    # Fields in the Firebase payload (see sync.table_payload)
+    SYNCED_FIELDS = ('number', 'token', 'qr_code')
+
     def __str__(self):
         return f"Table {self.number}"
 
+    def qr_code_name(self):
+        """Storage path of the QR code for the current URL and format"""
+        from .qr import file_name, get_format, table_url
+        return self._meta.get_field('qr_code').generate_filename(self, file_name(table_url(self), get_format()))
+
+    @classmethod
+    def delete_unused_qr_codes(cls, storage, names):
+        """Delete the QR images no table points at; call once the change is committed"""
+        from . import assets
+        in_use = set(cls.objects.filter(qr_code__in=names).values_list('qr_code', flat=True))
+        for name in set(names) - in_use:
+            assets.delete(storage, name)
+
     def save(self, *args, **kwargs):
-        # Determine if QR must be regenerated
-        need_regenerate = False
+        # QR images are content addressed: only a new URL or format needs a new file
+        name = self.qr_code_name()
+        storage = self.qr_code.storage
         previous = None
-        if self.pk:
-            try:
-                previous = Table.objects.only('qr_base_url', 'token', 'number', 'qr_code').get(pk=self.pk)
-            except Table.DoesNotExist:
-                previous = None
-
-        if not self.qr_code:
-            need_regenerate = True
-        elif previous and (
-            previous.qr_base_url != self.qr_base_url or
-            previous.token != self.token or
-            previous.number != self.number
-        ):
-            need_regenerate = True
-
-        if need_regenerate:
-            # Prefer model-specific base URL, then project-wide SITE_BASE_URL
-            try:
-                from django.conf import settings
-                default_base = getattr(settings, 'SITE_BASE_URL', 'http://127.0.0.1:8000')
-            except Exception:
-                default_base = 'http://127.0.0.1:8000'
-            base_url = (self.qr_base_url or default_base).rstrip('/')
-            qr_url = f"{base_url}/table/{str(self.token)}/"
-
-            # Remove old file to avoid stale caches
-            if self.qr_code:
-                try:
-                    self.qr_code.delete(save=False)
-                except Exception:
-                    pass
-
-            qr_image = qrcode.make(qr_url)
-            buffer = BytesIO()
-            qr_image.save(buffer, 'PNG')
-            # Use timestamped filename to bust caches
-            file_name = f'table-{self.number}-qr-{int(time.time())}.png'
-            self.qr_code.save(file_name, File(buffer), save=False)
+        if self.qr_code.name != name:
+            from . import assets
+            from .qr import get_format, render, table_url
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(render(table_url(self), get_format())))
+                assets.precompress(storage, name)
+            previous = self.qr_code.name
+            self.qr_code.name = name
 
-        super().save(*args, **kwargs)
-
-        # Push table data to Firebase Database with local QR code image URL
-        try:
-            from firebase_admin import db
-            if self.qr_code:
-                qr_code_url = self.qr_code.url  # Local media URL
-                db.reference(f'tables/{self.id}').set({
-                    'number': self.number,
-                    'token': str(self.token),
-                    'qr_code_url': qr_code_url
-                })
-        except Exception as e:
-            print(f"Error pushing Table data to Firebase: {e}")
+        if not self.has_changed():
+            return
+        push = self.has_changed(*self.SYNCED_FIELDS)
+        from .sync import enqueue, table_payload
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Queue table data for Firebase (local or migrated Storage QR code URL)
+            if push and self.qr_code:
+                enqueue(f'tables/{self.id}', table_payload(self), op='set')
+            # The old image encoded this table's old URL; it goes once the row
+            # points at the new one, and stays if the transaction rolls back
+            if previous:
+                transaction.on_commit(lambda: Table.delete_unused_qr_codes(storage, [previous]))
 
 class EmailVerification(models.Model):
     email = models.EmailField()
@@ -113,6 +143,11 @@ class EmailVerification(models.Model):
     verified_at = models.DateTimeField(null=True, blank=True)
     expires_at = models.DateTimeField()
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['email', 'is_verified'], name='emailverif_email_verified_idx'),
+        ]
+    
     def __str__(self):
         return f"Verification for {self.email}"
     
@@ -120,7 +155,7 @@ class EmailVerification(models.Model):
         from django.utils import timezone
         return timezone.now() > self.expires_at
 
-class Order(models.Model):
+class Order(ChangeTrackingMixin, models.Model):
     STATUS_CHOICES = [
         ('draft', 'Draft'),  # Order created but payment not initiated
         ('pending_payment', 'Pending Payment'),
@@ -145,26 +180,101 @@ class Order(models.Model):
     payment_method = models.CharField(max_length=50, blank=True)
     payment_reference = models.CharField(max_length=100, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     paid_at = models.DateTimeField(null=True, blank=True)
+    # Denormalized totals, kept in sync whenever order items are written
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Admin views filter by status/table/customer within a created_at range
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            models.Index(fields=['table', 'created_at'], name='order_table_created_idx'),
+            models.Index(fields=['customer_email', 'created_at'], name='order_email_created_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.id} for Table {self.table.number}"
+
+    def save(self, *args, **kwargs):
+        from .rollups import record_status_change
+
+        update_fields = kwargs.get('update_fields')
+        if self._state.adding:
+            old_status = None
+        elif update_fields is not None and 'status' not in update_fields:
+            old_status = self.status
+        elif 'status' in getattr(self, '_loaded_values', {}):
+            old_status = self._loaded_values['status']
+        else:
+            old_status = Order.objects.filter(pk=self.pk).values_list('status', flat=True).first()
+        # The sales rollups follow status changes in the same transaction
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            record_status_change(self, old_status)
     
     def get_total_amount(self):
-        """Calculate the total amount for this order"""
-        total = 0
-        for item in self.items.all():
-            total += item.quantity * item.ice_cream.price
-        return total
+        """Return the stored total amount for this order"""
+        return self.total_amount
+
+    def update_totals(self, save=True):
+        """Recompute total_amount and item_count from the order items in one query"""
+        totals = self.items.aggregate(
+            total=models.Sum(models.F('quantity') * models.F('unit_price')),
+            count=models.Sum('quantity'),
+        )
+        self.total_amount = totals['total'] or 0
+        self.item_count = totals['count'] or 0
+        if save and self.pk:
+            from django.utils import timezone
+            self.updated_at = timezone.now()
+            Order.objects.filter(pk=self.pk).update(
+                total_amount=self.total_amount,
+                item_count=self.item_count,
+                updated_at=self.updated_at,
+            )
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     ice_cream = models.ForeignKey(IceCream, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+    # Price charged, taken from the ice cream when the item is created
+    unit_price = models.DecimalField(max_digits=5, decimal_places=2)
 
     def __str__(self):
         return f"{self.quantity} x {self.ice_cream.name}"
 
+    @property
+    def line_total(self):
+        return self.quantity * self.unit_price
+
+    def save(self, *args, **kwargs):
+        from .rollups import order_change
+
+        if self.unit_price is None:
+            self.unit_price = self.ice_cream.price
+        with order_change(self.order):
+            super().save(*args, **kwargs)
+            self.order.update_totals()
+
+    def delete(self, *args, **kwargs):
+        from .rollups import order_change
+
+        order = self.order
+        with order_change(order):
+            result = super().delete(*args, **kwargs)
+            order.update_totals()
+        return result
+
+class OrderTombstone(models.Model):
+    """Marks a deleted order so incremental order syncs can drop it"""
+    order_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Deleted Order {self.order_id}"
+
 class Refund(models.Model):
     REFUND_STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -191,6 +301,11 @@ class Refund(models.Model):
     processed_at = models.DateTimeField(null=True, blank=True)
     admin_notes = models.TextField(blank=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='refund_status_created_idx'),
+        ]
+    
     def __str__(self):
         return f"Refund for Order #{self.order.id} - ₹{self.refund_amount}"
 
@@ -270,3 +385,121 @@ class ShopSettings(models.Model):
         """Get or create settings instance"""
         settings, created = cls.objects.get_or_create(pk=1)
         return settings
+
+
+class SyncEvent(models.Model):
+    """Outbox row for a pending Firebase Realtime Database write"""
+    OP_CHOICES = [
+        ('set', 'Set'),
+        ('update', 'Update'),
+        ('delete', 'Delete'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('failed', 'Failed'),
+    ]
+
+    path = models.CharField(max_length=255)
+    op = models.CharField(max_length=10, choices=OP_CHOICES, default='update')
+    payload = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Delivered events are deleted; 'failed' ones were given up on and wait for --retry-failed
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.op} {self.path}"
+
+
+class MailJob(models.Model):
+    """Queued outgoing email, rendered and sent by the mail worker"""
+    KIND_CHOICES = [
+        ('verification', 'Email Verification'),
+        ('payment_confirmation', 'Payment Confirmation'),
+        ('refund', 'Refund Notification'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    recipient = models.EmailField()
+    context = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} to {self.recipient}"
+
+
+class DailySales(models.Model):
+    """Per day and table: paid orders and their revenue (maintained by qr_ordering.rollups)"""
+    day = models.DateField()
+    table = models.ForeignKey(Table, on_delete=models.CASCADE, related_name='daily_sales')
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('day', 'table')
+        ordering = ['-day']
+
+    def __str__(self):
+        return f"{self.day} {self.table}: {self.order_count} orders"
+
+
+class DailyProductSales(models.Model):
+    """Per day, ice cream and table: paid orders containing it, units and revenue"""
+    day = models.DateField()
+    ice_cream = models.ForeignKey(IceCream, on_delete=models.CASCADE, related_name='daily_sales')
+    table = models.ForeignKey(Table, on_delete=models.CASCADE, related_name='daily_product_sales')
+    order_count = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('day', 'ice_cream', 'table')
+        ordering = ['-day']
+
+    def __str__(self):
+        return f"{self.day} {self.ice_cream} @ {self.table}: {self.units} units"
+
+
+class QRRegenerationJob(models.Model):
+    """Progress of a bulk QR code regeneration run (see qr_ordering.qr_jobs)"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    base_url = models.URLField(max_length=200, blank=True)
+    total = models.PositiveIntegerField(default=0)
+    done = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-id']
+
+    def __str__(self):
+        return f"QR regeneration {self.id}: {self.done}/{self.total} ({self.status})"
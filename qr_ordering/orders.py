@@ -0,0 +1,173 @@
+import threading
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.http import Http404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import microcache, rollups
+from .events import publish_order_status
+from .models import IceCream, Order, OrderItem, OrderTombstone
+from .sync import enqueue, order_payload
+
+
+def create_order(table, customer_email, customer_name, items):
+    """
+    Create a draft order and its items in a single transaction.
+
+    All requested ice creams are fetched with one ``id__in`` query and the
+    items are written with ``bulk_create``; the Firebase sync event is queued
+    in the same transaction. Returns ``(order, order_data)`` where
+    ``order_data`` is the Firebase payload built from memory.
+    """
+    quantities = {}
+    for item in items:
+        ice_cream_id = int(item['id'])
+        quantities[ice_cream_id] = quantities.get(ice_cream_id, 0) + int(item['quantity'])
+
+    ice_creams = IceCream.objects.in_bulk(list(quantities))
+    missing = [pk for pk in quantities if pk not in ice_creams]
+    if missing:
+        raise Http404(f"Ice cream(s) not found: {', '.join(str(pk) for pk in missing)}")
+
+    total_amount = sum(ice_creams[pk].price * quantity for pk, quantity in quantities.items())
+    item_count = sum(quantities.values())
+
+    with transaction.atomic():
+        # bulk_create skips OrderItem.save, so the totals are written up front
+        order = Order.objects.create(
+            table=table,
+            customer_email=customer_email,
+            customer_name=customer_name,
+            status='draft',  # Draft status until payment is confirmed
+            total_amount=total_amount,
+            item_count=item_count,
+        )
+        order_items = OrderItem.objects.bulk_create([
+            OrderItem(order=order, ice_cream=ice_creams[pk], quantity=quantity, unit_price=ice_creams[pk].price)
+            for pk, quantity in quantities.items()
+        ])
+        order_data = order_payload(order, items=order_items)
+        enqueue(f'orders/{order.id}', order_data, op='set')
+        publish_order_status(order, event='order.created')
+
+    return order, order_data
+
+
+# Deleted-order markers older than this are pruned; older cursors get a full snapshot
+TOMBSTONE_RETENTION = timedelta(days=1)
+# updated_at is stamped at save time, not at commit: a transaction can become
+# visible after a poll whose cursor is already past its stamp. Cursors stay
+# this far behind the present so such late commits are still picked up.
+SAFETY_LAG = timedelta(seconds=5)
+# Tombstone order id recorded when every order is deleted at once
+ALL_ORDERS = 0
+
+_local = threading.local()
+
+
+def bulk_deleting():
+    """Whether the per-order delete bookkeeping is suspended by ``clear_all``"""
+    return getattr(_local, 'bulk_delete', False)
+
+
+def clear_all():
+    """
+    Delete every order.
+
+    The delete signal handlers skip their per-order work: one ``ALL_ORDERS``
+    tombstone replaces a tombstone per order and sends clients of
+    ``order_changes`` a full snapshot, and the rollups are emptied in one go.
+    """
+    with transaction.atomic():
+        _local.bulk_delete = True
+        try:
+            Order.objects.all().delete()
+        finally:
+            _local.bulk_delete = False
+        # No orders left to count
+        rollups.clear()
+        # Every earlier deletion is covered by the marker
+        OrderTombstone.objects.all().delete()
+        OrderTombstone.objects.create(order_id=ALL_ORDERS)
+        transaction.on_commit(microcache.invalidate)
+
+
+def format_cursor(cursor):
+    """``(updated_at, id)`` as the ``?since=`` value"""
+    updated_at, order_id = cursor
+    return f'{updated_at.isoformat()},{order_id}'
+
+
+def current_cursor():
+    """Cursor covering every change committed so far, as a ``?since=`` value"""
+    return format_cursor((timezone.now() - SAFETY_LAG, 0))
+
+
+def parse_cursor(value):
+    """``?since=`` value as ``(updated_at, id)``; a bare timestamp means id 0"""
+    # A '+' in the UTC offset arrives as a space when not URL-encoded
+    stamp, _, order_id = value.replace(' ', '+').rpartition(',')
+    if not stamp:
+        stamp, order_id = order_id, ''
+    updated_at = parse_datetime(stamp)
+    if updated_at is None or not (order_id or '0').isdigit():
+        raise ValueError(f'Invalid cursor: {value}')
+    return updated_at, int(order_id or 0)
+
+
+def order_changes(since=None, limit=20):
+    """
+    Orders created or changed after the ``since`` cursor, plus deleted ids.
+
+    The cursor is an ``(updated_at, id)`` pair, so orders sharing a
+    timestamp across a page boundary are not skipped. It never moves past
+    ``now - SAFETY_LAG``: orders changed within the lag may be sent again
+    on the next call, and clients apply them idempotently.
+
+    Without a cursor (or with one older than the tombstone retention, or
+    from before ``clear_all``) the latest ``limit`` orders are returned as a
+    full snapshot with ``reset=True``. Returns a dict with ``orders``, ``deleted``, ``cursor``,
+    ``reset`` and ``has_more``.
+    """
+    queryset = Order.objects.select_related('table').prefetch_related('items__ice_cream')
+    now = timezone.now()
+    horizon = (now - SAFETY_LAG, 0)
+    reset = since is None or since[0] < now - TOMBSTONE_RETENTION
+    if not reset:
+        # Deletions since the previous cursor; repeats across pages are harmless
+        deleted = set(OrderTombstone.objects.filter(deleted_at__gt=since[0]).values_list('order_id', flat=True))
+        reset = ALL_ORDERS in deleted
+
+    if reset:
+        return {
+            'orders': list(queryset.order_by('-created_at')[:limit]),
+            'deleted': [],
+            'cursor': horizon,
+            'reset': True,
+            'has_more': False,
+        }
+
+    updated_at, order_id = since
+    after = Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=order_id)
+    orders = list(queryset.filter(after).order_by('updated_at', 'id')[:limit + 1])
+    has_more = len(orders) > limit
+    orders = orders[:limit]
+    if has_more and orders[-1].updated_at <= horizon[0]:
+        # Resume right after the last order returned
+        cursor = (orders[-1].updated_at, orders[-1].id)
+    else:
+        # Everything up to the horizon has been seen; a full page still inside
+        # the lag is sent again once it ages past the horizon
+        has_more = False
+        cursor = max(since, horizon)
+
+    return {
+        'orders': orders,
+        'deleted': sorted(deleted),
+        'cursor': cursor,
+        'reset': False,
+        'has_more': has_more,
+    }
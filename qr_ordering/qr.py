@@ -0,0 +1,106 @@
+"""
+QR code rendering for table order links.
+
+Images are content addressed: the file name is a hash of the encoded URL
+and the rendering options, so an unchanged URL maps to the same file and
+is never rendered again, and a changed one gets a new URL that clients
+can cache forever. ``QR_CODE_FORMAT`` selects PNG (default) or SVG.
+
+Kept free of model imports so ``render`` can run in worker processes
+(see ``qr_jobs``) without setting up Django.
+"""
+import hashlib
+import re
+from io import BytesIO
+
+import qrcode
+
+DEFAULT_BASE_URL = 'http://127.0.0.1:8000'
+FORMATS = ('png', 'svg')
+# Same look as qrcode.make(); part of the file hash
+BOX_SIZE = 10
+BORDER = 4
+ERROR_CORRECTION = 'M'
+
+
+def table_url(table):
+    """The order page URL encoded in a table's QR code"""
+    from django.conf import settings
+    base_url = (table.qr_base_url or getattr(settings, 'SITE_BASE_URL', DEFAULT_BASE_URL)).rstrip('/')
+    return f"{base_url}/table/{str(table.token)}/"
+
+
+def get_format():
+    from django.conf import settings
+    fmt = getattr(settings, 'QR_CODE_FORMAT', 'png').lower()
+    return fmt if fmt in FORMATS else 'png'
+
+
+def file_name(url, fmt='png'):
+    """Content-addressed file name for the QR code of ``url``"""
+    key = f'{url}|{fmt}|{BOX_SIZE}|{BORDER}|{ERROR_CORRECTION}'
+    return f"qr-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:20]}.{fmt}"
+
+
+def _make(url):
+    code = qrcode.QRCode(
+        box_size=BOX_SIZE,
+        border=BORDER,
+        error_correction=getattr(qrcode.constants, f'ERROR_CORRECT_{ERROR_CORRECTION}'),
+    )
+    code.add_data(url)
+    code.make(fit=True)
+    return code
+
+
+def render_png(url):
+    """PNG bytes of the QR code for ``url``"""
+    buffer = BytesIO()
+    _make(url).make_image().save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def render_svg(url):
+    """SVG bytes of the QR code for ``url``, one path with a segment per run of dark modules"""
+    matrix = _make(url).get_matrix()  # includes the border
+    size = len(matrix)
+    segments = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < size:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < size and row[x]:
+                x += 1
+            segments.append(f'M{start} {y}h{x - start}v1h-{x - start}z')
+    pixels = size * BOX_SIZE
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{pixels}" height="{pixels}" '
+        f'viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path d="{"".join(segments)}"/></svg>'
+    ).encode('utf-8')
+
+
+SVG_VIEWBOX = re.compile(rb'viewBox="0 0 (\d+) (\d+)"')
+SVG_RUN = re.compile(rb'M(\d+) (\d+)h(\d+)')
+
+
+def svg_runs(svg):
+    """``(size, [(x, y, width), ...])`` of dark module runs from ``render_svg`` output"""
+    match = SVG_VIEWBOX.search(svg)
+    if not match:
+        raise ValueError('Not a QR code SVG written by render_svg')
+    runs = [(int(x), int(y), int(width)) for x, y, width in SVG_RUN.findall(svg)]
+    return int(match.group(1)), runs
+
+
+def render(url, fmt='png'):
+    return render_svg(url) if fmt == 'svg' else render_png(url)
+
+
+def render_job(job):
+    """``render`` taking a ``(url, fmt)`` tuple, for ``Executor.map``"""
+    return render(*job)
@@ -0,0 +1,145 @@
+"""
+Bulk QR code regeneration.
+
+``regenerate_all`` points every table at the content-addressed QR image for
+its current URL, rendering only images that do not exist yet (in a process
+pool when there are many), writes the ``Table`` rows in batches (one
+``bulk_update`` per batch instead of a ``Table.save`` per table) and queues
+a single Firebase update for all tables. Progress is recorded on a ``QRRegenerationJob`` row.
+``start`` runs it on a background thread for the admin endpoint; the
+``update_all_tables_qr_url`` command runs it in the foreground.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from functools import partial
+
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import assets
+from .models import QRRegenerationJob, Table
+from .qr import get_format, render_job, table_url
+from .sync import enqueue, table_payload
+
+BATCH_SIZE = 50
+# Below this many tables, starting worker processes costs more than it saves
+PARALLEL_MIN_TABLES = 50
+ACTIVE_STATUSES = ('queued', 'running')
+# A job still "running" after this long is assumed to have died with its process
+STALE_AFTER = timedelta(hours=1)
+
+
+def job_status(job):
+    return {
+        'id': job.id,
+        'status': job.status,
+        'total': job.total,
+        'done': job.done,
+        'percent': round(job.done / job.total * 100) if job.total else (100 if job.status == 'completed' else 0),
+        'error': job.error,
+    }
+
+
+def _update_job(job, **fields):
+    QRRegenerationJob.objects.filter(pk=job.pk).update(**fields)
+    for name, value in fields.items():
+        setattr(job, name, value)
+
+
+def regenerate_all(job=None, base_url=None, workers=None, batch_size=BATCH_SIZE, progress=None):
+    """
+    Regenerate the QR code of every table, optionally moving them to ``base_url``.
+
+    ``progress(done, total)`` is called after each batch is saved.
+    """
+    if job is None:
+        job = QRRegenerationJob.objects.create(base_url=base_url or '')
+
+    tables = list(Table.objects.order_by('number'))
+    if base_url is not None:
+        for table in tables:
+            table.qr_base_url = base_url
+    _update_job(job, status='running', total=len(tables), done=0, started_at=timezone.now())
+
+    storage = Table._meta.get_field('qr_code').storage
+    fmt = get_format()
+    names = [table.qr_code_name() for table in tables]
+    # Unchanged URLs already have their image: only render missing ones
+    missing = {i for i, name in enumerate(names) if not storage.exists(name)}
+    jobs = [(table_url(tables[i]), fmt) for i in sorted(missing)]
+    workers = workers or os.cpu_count() or 1
+    executor = None
+    try:
+        if workers > 1 and len(jobs) >= PARALLEL_MIN_TABLES:
+            # spawn: safe to start from a request thread, workers only import qr_ordering.qr
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            images = executor.map(render_job, jobs, chunksize=max(1, len(jobs) // (workers * 4)))
+        else:
+            images = map(render_job, jobs)
+
+        done = 0
+        for start in range(0, len(tables), batch_size):
+            batch = tables[start:start + batch_size]
+            stale = []
+            for i, table in enumerate(batch, start=start):
+                if i in missing:
+                    # Results arrive in table order, as they are rendered
+                    names[i] = storage.save(names[i], ContentFile(next(images)))
+                    assets.precompress(storage, names[i])
+                if table.qr_code.name and table.qr_code.name != names[i]:
+                    stale.append(table.qr_code.name)
+                table.qr_code.name = names[i]
+
+            with transaction.atomic():
+                Table.objects.bulk_update(batch, ['qr_code', 'qr_base_url'])
+                done += len(batch)
+                _update_job(job, done=done)
+                # Old images are only removed once the rows pointing at the new ones are committed
+                if stale:
+                    transaction.on_commit(partial(Table.delete_unused_qr_codes, storage, stale))
+            if progress:
+                progress(done, len(tables))
+
+        with transaction.atomic():
+            if tables:
+                # One multi-path write for every table instead of one set per table
+                enqueue('tables', {str(table.id): table_payload(table) for table in tables})
+            _update_job(job, status='completed', finished_at=timezone.now())
+    except Exception as e:
+        _update_job(job, status='failed', error=str(e), finished_at=timezone.now())
+        raise
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+    return job
+
+
+def active_job():
+    return QRRegenerationJob.objects.filter(
+        status__in=ACTIVE_STATUSES,
+        created_at__gte=timezone.now() - STALE_AFTER,
+    ).first()
+
+
+def start(base_url=None, workers=None):
+    """Run ``regenerate_all`` on a background thread; returns ``(job, started)``"""
+    with transaction.atomic():
+        job = active_job()
+        if job:
+            return job, False
+        job = QRRegenerationJob.objects.create(base_url=base_url or '')
+
+    def run():
+        try:
+            regenerate_all(job, base_url=base_url, workers=workers)
+        except Exception as e:
+            print(f"QR regeneration job {job.id} failed: {e}")
+        finally:
+            connection.close()
+
+    transaction.on_commit(lambda: threading.Thread(target=run, daemon=True).start())
+    return job, True
@@ -0,0 +1,195 @@
+"""
+Printable PDF sheet of every table's QR code.
+
+``iter_pdf`` yields the document in chunks while iterating the tables, so
+memory stays constant however many tables there are: each page is written
+as soon as it is full and only object offsets are kept for the trailer.
+The QR images already stored in ``Table.qr_code`` are embedded as they are:
+PNG image data is copied into the PDF without decoding, SVG codes written
+by ``qr.render_svg`` become vector rectangles. Only a table whose image
+file is missing is rendered again. ``aiter_pdf`` streams the same chunks
+to async servers (ASGI).
+"""
+import struct
+import zlib
+
+from .qr import render_png, svg_runs, table_url
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+MARGIN = 36
+COLUMNS, ROWS = 2, 3
+QR_SIZE = 180
+PER_PAGE = COLUMNS * ROWS
+
+CATALOG, PAGES, TITLE_FONT, TEXT_FONT = 1, 2, 3, 4
+
+
+def _text(value, limit=60):
+    """PDF string literal (WinAnsi subset) for the standard fonts"""
+    value = ' '.join(str(value).split())
+    if len(value) > limit:
+        value = value[:limit - 1] + '...'
+    value = value.encode('latin-1', 'replace').decode('latin-1')
+    return '(' + value.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') + ')'
+
+
+def _png_image(data):
+    """Image XObject dictionary entries and stream for PNG bytes"""
+    if data[:8] != b'\x89PNG\r\n\x1a\n':
+        raise ValueError('Not a PNG file')
+    position, header, idat = 8, None, []
+    while position < len(data):
+        length, kind = struct.unpack('>I4s', data[position:position + 8])
+        chunk = data[position + 8:position + 8 + length]
+        if kind == b'IHDR':
+            header = struct.unpack('>IIBBBBB', chunk)
+        elif kind == b'IDAT':
+            idat.append(chunk)
+        elif kind == b'IEND':
+            break
+        position += length + 12
+
+    width, height, depth, color_type, _, _, interlace = header
+    colors = {0: 1, 2: 3}.get(color_type)
+    if colors and not interlace and depth <= 8:
+        # Grayscale/RGB PNG data is a zlib stream with PNG predictors, which PDF reads directly
+        return (
+            f'/Width {width} /Height {height} /ColorSpace /{"DeviceGray" if colors == 1 else "DeviceRGB"} '
+            f'/BitsPerComponent {depth} /Filter /FlateDecode '
+            f'/DecodeParms << /Predictor 15 /Colors {colors} /BitsPerComponent {depth} /Columns {width} >>'
+        ), b''.join(idat)
+
+    # Palette, alpha or interlaced PNG: decode once to grayscale
+    from io import BytesIO
+    from PIL import Image
+    image = Image.open(BytesIO(data)).convert('L')
+    return (
+        f'/Width {image.width} /Height {image.height} /ColorSpace /DeviceGray '
+        f'/BitsPerComponent 8 /Filter /FlateDecode'
+    ), zlib.compress(image.tobytes())
+
+
+def _read_qr(table):
+    """Stored QR image bytes and whether they are SVG; renders only if the file is missing"""
+    name = table.qr_code.name if table.qr_code else ''
+    if name:
+        storage = table.qr_code.storage
+        try:
+            with storage.open(name, 'rb') as f:
+                return f.read(), name.lower().endswith('.svg')
+        except (FileNotFoundError, OSError):
+            pass
+    return render_png(table_url(table)), False
+
+
+class _Writer:
+    def __init__(self):
+        self.offset = 0
+        self.offsets = {}
+        self.next_id = TEXT_FONT + 1
+
+    def allocate(self):
+        object_id = self.next_id
+        self.next_id += 1
+        return object_id
+
+    def write(self, data):
+        self.offset += len(data)
+        return data
+
+    def object(self, object_id, body, stream=None):
+        self.offsets[object_id] = self.offset
+        if stream is None:
+            return self.write(f'{object_id} 0 obj\n{body}\nendobj\n'.encode('latin-1'))
+        return self.write(
+            f'{object_id} 0 obj\n<< {body} /Length {len(stream)} >>\nstream\n'.encode('latin-1')
+            + stream + b'\nendstream\nendobj\n'
+        )
+
+
+def _cell_origin(index):
+    cell_width = (PAGE_WIDTH - 2 * MARGIN) / COLUMNS
+    cell_height = (PAGE_HEIGHT - 2 * MARGIN) / ROWS
+    column, row = index % COLUMNS, index // COLUMNS
+    x = MARGIN + column * cell_width + (cell_width - QR_SIZE) / 2
+    top = PAGE_HEIGHT - MARGIN - row * cell_height
+    return x, top - QR_SIZE - 10
+
+
+def _write_page(writer, cells):
+    """PDF bytes for one page of ``(table, image bytes, is_svg)`` cells; returns (page id, bytes)"""
+    chunks, content, xobjects = [], [], []
+    for index, (table, data, is_svg) in enumerate(cells):
+        x, y = _cell_origin(index)
+        if is_svg:
+            size, runs = svg_runs(data)
+            scale = QR_SIZE / size
+            # SVG y grows downwards: flip around the top of the square
+            content.append(f'q {scale:.4f} 0 0 {-scale:.4f} {x:.2f} {y + QR_SIZE:.2f} cm 0 g')
+            content.extend(f'{rx} {ry} {width} 1 re' for rx, ry, width in runs)
+            content.append('f Q')
+        else:
+            image_id = writer.allocate()
+            entries, stream = _png_image(data)
+            chunks.append(writer.object(image_id, f'/Type /XObject /Subtype /Image {entries}', stream))
+            xobjects.append(f'/Im{image_id} {image_id} 0 R')
+            content.append(f'q {QR_SIZE} 0 0 {QR_SIZE} {x:.2f} {y:.2f} cm /Im{image_id} Do Q')
+
+        content.append(f'BT /F1 16 Tf {x:.2f} {y - 20:.2f} Td {_text(f"Table {table.number}")} Tj ET')
+        if table.description:
+            content.append(f'BT /F2 9 Tf {x:.2f} {y - 34:.2f} Td {_text(table.description)} Tj ET')
+
+    content_id, page_id = writer.allocate(), writer.allocate()
+    chunks.append(writer.object(content_id, '/Filter /FlateDecode', zlib.compress('\n'.join(content).encode('latin-1'))))
+    chunks.append(writer.object(page_id, (
+        f'<< /Type /Page /Parent {PAGES} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+        f'/Resources << /Font << /F1 {TITLE_FONT} 0 R /F2 {TEXT_FONT} 0 R >> '
+        f'/XObject << {" ".join(xobjects)} >> >> /Contents {content_id} 0 R >>'
+    )))
+    return page_id, b''.join(chunks)
+
+
+def iter_pdf(tables):
+    """Yield a PDF with one labelled QR code per table, six per A4 page"""
+    writer = _Writer()
+    yield writer.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    yield writer.object(CATALOG, f'<< /Type /Catalog /Pages {PAGES} 0 R >>')
+    yield writer.object(TITLE_FONT, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>')
+    yield writer.object(TEXT_FONT, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+
+    page_ids, cells = [], []
+    for table in tables:
+        data, is_svg = _read_qr(table)
+        cells.append((table, data, is_svg))
+        if len(cells) == PER_PAGE:
+            page_id, chunk = _write_page(writer, cells)
+            page_ids.append(page_id)
+            cells = []
+            yield chunk
+    if cells or not page_ids:
+        page_id, chunk = _write_page(writer, cells)
+        page_ids.append(page_id)
+        yield chunk
+
+    kids = ' '.join(f'{page_id} 0 R' for page_id in page_ids)
+    yield writer.object(PAGES, f'<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>')
+
+    xref_offset = writer.offset
+    size = writer.next_id
+    lines = ['xref', f'0 {size}', '0000000000 65535 f ']
+    lines.extend(f'{writer.offsets.get(i, 0):010d} 00000 n ' for i in range(1, size))
+    lines.append(f'trailer\n<< /Size {size} /Root {CATALOG} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n')
+    yield writer.write('\n'.join(lines).encode('latin-1'))
+
+
+async def aiter_pdf(tables):
+    """``iter_pdf`` as an async iterator; each chunk is built in a sync thread, so memory stays constant under ASGI"""
+    from asgiref.sync import sync_to_async
+
+    chunks = iter_pdf(tables)
+    end = object()
+    while True:
+        chunk = await sync_to_async(next)(chunks, end)
+        if chunk is end:
+            return
+        yield chunk
@@ -0,0 +1,197 @@
+"""
+Per-request SQL query budgets and N+1 detection.
+
+``QueryBudgetMiddleware`` counts each request's queries and their total
+time. It also counts how often each query shape repeats; a shape is the
+SQL with literals and ``IN`` lists collapsed. A shape repeated
+``QUERY_REPEAT_THRESHOLD`` times in one request is the signature of an
+N+1 loop, such as a template calling ``Order.__str__`` (which reads
+``order.table``) once per row.
+
+A view declares its ceiling with ``@query_budget(queries)``. The
+``QUERY_BUDGETS`` setting (``{url name: queries}``) overrides the
+decorator. Going over the budget warns with ``QueryBudgetWarning``.
+With ``QUERY_BUDGET_MODE = 'raise'`` (tests) it raises
+``QueryBudgetExceeded`` instead, and ``'off'`` disables the middleware.
+
+Samples stay in the process for ``QUERY_STATS_WINDOW`` seconds;
+``summary`` ranks the endpoints for the staff page.
+"""
+import re
+import threading
+import time
+import warnings
+from collections import Counter, deque
+
+from django.conf import settings
+from django.db import connection
+
+DEFAULT_REPEAT_THRESHOLD = 5
+DEFAULT_WINDOW = 300
+MAX_SAMPLES = 10000
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN \((?:\?|%s)(?:, ?(?:\?|%s))*\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+
+class QueryBudgetWarning(RuntimeWarning):
+    pass
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(queries, repeats=None):
+    """
+    Declare the most queries a view may run per request (session and user
+    lookups included), and optionally how often one shape may repeat
+    (default ``QUERY_REPEAT_THRESHOLD - 1``).
+    """
+    def decorator(view_func):
+        view_func.query_budget = (queries, repeats)
+        return view_func
+    return decorator
+
+
+def get_mode():
+    return getattr(settings, 'QUERY_BUDGET_MODE', 'warn')
+
+
+def get_repeat_threshold():
+    return getattr(settings, 'QUERY_REPEAT_THRESHOLD', DEFAULT_REPEAT_THRESHOLD)
+
+
+def shape(sql):
+    """SQL with parameters, literals and ``IN`` lists collapsed, so N+1 lookups compare equal"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql.replace('%s', '?')).strip()
+
+
+class QueryCounter:
+    """``connection.execute_wrapper`` counting queries, their time and their shapes"""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.queries += 1
+            self.shapes[sql] += 1
+
+    def repeated(self):
+        """``(shape, count)`` of the most repeated query, or ``(None, 0)``"""
+        # Count raw SQL first and normalize only the distinct statements
+        shapes = Counter()
+        for sql, count in self.shapes.items():
+            shapes[shape(sql)] += count
+        return shapes.most_common(1)[0] if shapes else (None, 0)
+
+
+_samples = deque(maxlen=MAX_SAMPLES)
+_lock = threading.Lock()
+
+
+def _prune(now):
+    cutoff = now - getattr(settings, 'QUERY_STATS_WINDOW', DEFAULT_WINDOW)
+    while _samples and _samples[0][0] < cutoff:
+        _samples.popleft()
+
+
+def record(endpoint, counter, seconds, budget=None):
+    """Store a request's figures; returns the budget violation message, if any"""
+    worst_shape, repeats = counter.repeated()
+    max_queries, max_repeats = budget or (None, None)
+    if max_repeats is None:
+        max_repeats = get_repeat_threshold() - 1
+    problems = []
+    if max_queries is not None and counter.queries > max_queries:
+        problems.append(f'{counter.queries} queries (budget {max_queries})')
+    if repeats > max_repeats:
+        problems.append(f'query repeated {repeats} times (likely N+1): {worst_shape[:300]}')
+
+    now = time.time()
+    with _lock:
+        _prune(now)
+        _samples.append((now, endpoint, counter.queries, counter.seconds, seconds,
+                         worst_shape, repeats, max_queries, bool(problems)))
+    return f"{endpoint}: {'; '.join(problems)}" if problems else None
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+
+
+def summary(limit=20):
+    """Endpoints in the window, most queries per request first"""
+    with _lock:
+        _prune(time.time())
+        samples = list(_samples)
+    endpoints = {}
+    for _, endpoint, queries, db_seconds, seconds, worst_shape, repeats, budget, over in samples:
+        row = endpoints.setdefault(endpoint, {
+            'endpoint': endpoint, 'requests': 0, 'queries': 0, 'queries_max': 0, 'db_seconds': 0.0,
+            'seconds': 0.0, 'budget': budget, 'over_budget': 0, 'repeats': 0, 'repeated_query': None,
+        })
+        row['requests'] += 1
+        row['queries'] += queries
+        row['queries_max'] = max(row['queries_max'], queries)
+        row['db_seconds'] += db_seconds
+        row['seconds'] += seconds
+        row['over_budget'] += over
+        if repeats > row['repeats']:
+            row['repeats'], row['repeated_query'] = repeats, worst_shape
+    rows = []
+    for row in endpoints.values():
+        requests = row.pop('requests')
+        rows.append({
+            **row,
+            'requests': requests,
+            'queries_mean': round(row.pop('queries') / requests, 1),
+            'db_ms_mean': round(row.pop('db_seconds') * 1000 / requests, 2),
+            'ms_mean': round(row.pop('seconds') * 1000 / requests, 2),
+        })
+    rows.sort(key=lambda row: (row['queries_mean'], row['db_ms_mean']), reverse=True)
+    return rows[:limit]
+
+
+class QueryBudgetMiddleware:
+    """Instruments every request; place it first so session and auth queries are counted"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = get_mode()
+        if mode == 'off':
+            return self.get_response(request)
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        match = request.resolver_match
+        if match is None:
+            # Unrouted requests (404s, probes) are not an endpoint worth ranking
+            return response
+
+        budget = getattr(match.func, 'query_budget', None)
+        budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        if match.view_name in budgets:
+            budget = (budgets[match.view_name], budget[1] if budget else None)
+        problem = record(match.view_name, counter, time.perf_counter() - started, budget)
+        if problem:
+            if mode == 'raise':
+                raise QueryBudgetExceeded(problem)
+            warnings.warn(problem, QueryBudgetWarning, stacklevel=2)
+        return response
@@ -0,0 +1,137 @@
+"""
+Repair drift between the database and the Firebase Realtime Database.
+
+The outbox (``sync``) keeps Firebase current as long as every write goes
+through it; a lost event, a manual edit in the console or a restore leaves
+nodes behind. ``reconcile`` reads each synced root (``orders``,
+``products``, ``tables``) once, hashes every node on both sides in a
+canonical form and pushes only the nodes that differ, as multi-path
+updates of ``batch_size`` paths. Nodes that only exist remotely are
+deleted. With ``dry_run`` nothing is written and the report says how big
+the drift is.
+"""
+import hashlib
+import json
+import time
+
+from .models import IceCream, Order, SyncEvent, Table
+from .sync import order_payload, product_payload, table_payload
+from .sync_backends import get_backend
+
+ROOTS = ('orders', 'products', 'tables')
+DEFAULT_BATCH_SIZE = 500
+
+
+def canonical(value):
+    """
+    ``value`` as Firebase stores it: no null or empty children, and whole
+    floats read back as integers. Returns None for a value Firebase drops.
+    """
+    if isinstance(value, dict):
+        value = {str(key): canonical(child) for key, child in value.items()}
+        value = {key: child for key, child in value.items() if child is not None}
+        return value or None
+    if isinstance(value, (list, tuple)):
+        value = [canonical(child) for child in value]
+        return value if any(child is not None for child in value) else None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def node_hash(value):
+    """Content hash of a node, equal on both sides when the data matches"""
+    data = json.dumps(canonical(value), sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def _children(value):
+    # Firebase returns integer-keyed nodes as a list when the keys are dense
+    if isinstance(value, list):
+        return {str(key): child for key, child in enumerate(value) if child is not None}
+    return value if isinstance(value, dict) else {}
+
+
+def local_nodes(root):
+    """``(key, payload)`` for every node the database says ``root`` should hold"""
+    if root == 'orders':
+        orders = Order.objects.select_related('table').prefetch_related('items__ice_cream').order_by('id')
+        for order in orders.iterator(chunk_size=500):
+            yield str(order.id), order_payload(order, items=order.items.all())
+    elif root == 'products':
+        # Only ice creams with a photo are synced (see IceCream.save)
+        for ice_cream in IceCream.objects.exclude(image='').order_by('id').iterator(chunk_size=500):
+            yield str(ice_cream.id), product_payload(ice_cream)
+    elif root == 'tables':
+        for table in Table.objects.exclude(qr_code='').order_by('id').iterator(chunk_size=500):
+            yield str(table.id), table_payload(table)
+    else:
+        raise ValueError(f'Unknown root: {root}')
+
+
+def diff(root, remote):
+    """
+    ``({path: value}, counts)`` of writes that make ``remote`` (the node
+    read from Firebase) match the database, with counts of added, changed
+    and deleted nodes.
+    """
+    # Only hashes are kept for the remote side; local payloads only when they differ
+    remote_hashes = {key: node_hash(child) for key, child in _children(remote).items()}
+    updates = {}
+    counts = {'local': 0, 'remote': len(remote_hashes), 'added': 0, 'changed': 0, 'deleted': 0}
+    for key, payload in local_nodes(root):
+        counts['local'] += 1
+        remote_hash = remote_hashes.pop(key, None)
+        if remote_hash == node_hash(payload):
+            continue
+        counts['added' if remote_hash is None else 'changed'] += 1
+        updates[f'{root}/{key}'] = payload
+    for key in remote_hashes:
+        counts['deleted'] += 1
+        updates[f'{root}/{key}'] = None
+    return updates, counts
+
+
+def reconcile(roots=ROOTS, dry_run=False, batch_size=DEFAULT_BATCH_SIZE, backend=None):
+    """
+    Compare ``roots`` and push the differing nodes unless ``dry_run``.
+
+    Returns a report with per-root counts, the number of paths and bytes
+    that were (or would be) written, the number of update calls, the
+    outbox backlog at the start and the seconds spent fetching, hashing
+    and pushing.
+    """
+    backend = backend or get_backend()
+    batch_size = max(1, batch_size)
+    report = {
+        'dry_run': dry_run,
+        'roots': {},
+        'paths': 0,
+        'bytes': 0,
+        'writes': 0,
+        # Pending outbox events show up as drift until the worker delivers them
+        'pending_events': SyncEvent.objects.filter(status='pending').count(),
+        'timings': {'fetch': 0.0, 'hash': 0.0, 'push': 0.0},
+    }
+    updates = {}
+    for root in roots:
+        started = time.perf_counter()
+        remote = backend.get(root)
+        fetched = time.perf_counter()
+        root_updates, counts = diff(root, remote)
+        report['timings']['fetch'] += fetched - started
+        report['timings']['hash'] += time.perf_counter() - fetched
+        report['roots'][root] = counts
+        updates.update(root_updates)
+
+    report['paths'] = len(updates)
+    report['bytes'] = len(json.dumps(updates, separators=(',', ':')).encode('utf-8')) if updates else 0
+    if not dry_run and updates:
+        started = time.perf_counter()
+        paths = list(updates)
+        for start in range(0, len(paths), batch_size):
+            backend.update({path: updates[path] for path in paths[start:start + batch_size]})
+            report['writes'] += 1
+        report['timings']['push'] = time.perf_counter() - started
+    report['timings'] = {name: round(seconds, 3) for name, seconds in report['timings'].items()}
+    return report
@@ -0,0 +1,85 @@
+"""
+Grouped sales reports for the analytics page.
+
+Each report is a single grouped query over the date range, so the number of
+queries does not grow with the number of tables, flavors or days. Table and
+weekday figures read the daily rollups; the hour-of-day report groups the
+raw orders because the rollups only go down to the day.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce, ExtractHour, ExtractIsoWeekDay
+
+from .dates import date_range, shop_timezone, within
+from .models import DailySales, Order, Table
+from .rollups import COUNTED_STATUSES
+
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+
+def _share(value, total):
+    return round(value / total * 100, 1) if total else 0
+
+
+def table_performance(start, end):
+    """Orders, revenue, average order and revenue share for every table, best first"""
+    in_range = Q(daily_sales__day__range=(start, end))
+    rows = list(Table.objects.annotate(
+        orders_count=Coalesce(Sum('daily_sales__order_count', filter=in_range), 0),
+        revenue=Coalesce(
+            Sum('daily_sales__revenue', filter=in_range),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    ).values('id', 'number', 'orders_count', 'revenue').order_by('-revenue', 'number'))
+
+    total_revenue = sum(row['revenue'] for row in rows)
+    for row in rows:
+        row['avg_order'] = row['revenue'] / row['orders_count'] if row['orders_count'] else 0
+        row['percentage'] = _share(row['revenue'], total_revenue)
+    return rows
+
+
+def hourly_breakdown(start, end):
+    """Orders and revenue for each hour of the day (0-23, shop time)"""
+    tz = shop_timezone()
+    totals = {
+        row['hour']: row
+        for row in Order.objects.filter(
+            status__in=COUNTED_STATUSES,
+            **within('created_at', date_range(start, end, tz)),
+        ).annotate(hour=ExtractHour('created_at', tzinfo=tz)).values('hour').annotate(
+            orders_count=Count('id'),
+            revenue=Sum('total_amount'),
+        ).order_by()
+    }
+    return [
+        {
+            'hour': hour,
+            'orders_count': totals.get(hour, {}).get('orders_count', 0),
+            'revenue': totals.get(hour, {}).get('revenue') or 0,
+        }
+        for hour in range(24)
+    ]
+
+
+def weekday_breakdown(start, end):
+    """Orders and revenue for each day of the week, Monday first"""
+    totals = {
+        row['weekday']: row
+        for row in DailySales.objects.filter(day__range=(start, end)).annotate(
+            weekday=ExtractIsoWeekDay('day')
+        ).values('weekday').annotate(
+            orders_count=Sum('order_count'),
+            revenue=Sum('revenue'),
+        ).order_by()
+    }
+    return [
+        {
+            'weekday': name,
+            'orders_count': totals.get(number, {}).get('orders_count') or 0,
+            'revenue': totals.get(number, {}).get('revenue') or 0,
+        }
+        for number, name in enumerate(WEEKDAYS, start=1)
+    ]
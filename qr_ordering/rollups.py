@@ -0,0 +1,199 @@
+"""
+Pre-aggregated daily sales.
+
+``DailySales`` (day x table) and ``DailyProductSales`` (day x ice cream x
+table) hold the paid-order figures the admin analytics pages report, so
+their cost depends on the date range rather than the size of the order
+history. They are maintained from the model layer, in the transaction of
+the write: ``Order.save`` calls ``record_status_change`` as orders move
+into or out of the counted statuses, ``OrderItem`` writes on a counted
+order go through ``order_change``, and deleting an order removes it (see
+``signals``; ``orders.clear_all`` empties them at once). Queryset ``update()``/``delete()`` bypass all of these; run
+``rebuild`` (``manage.py rebuild_rollups``) after such bulk changes.
+
+Days are the order's ``created_at`` date in the shop's time zone
+(``dates.shop_timezone``), the same days ``dates.today_range`` selects;
+rebuild after changing the shop's time zone. Revenue is the items'
+``unit_price`` times quantity, so the product figures add up to the
+orders' ``total_amount``.
+"""
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .dates import shop_timezone
+from .models import DailyProductSales, DailySales, Order, OrderItem
+
+# Orders that count as sales; cancelled and draft orders do not
+COUNTED_STATUSES = ('paid', 'in_progress', 'completed')
+
+
+def _add(model, keys, sign, **amounts):
+    updated = model.objects.filter(**keys).update(
+        **{field: F(field) + sign * value for field, value in amounts.items()}
+    )
+    if sign > 0:
+        if not updated:
+            model.objects.create(**keys, **amounts)
+    else:
+        # Never create rows when subtracting, and drop rows with no orders left
+        model.objects.filter(**keys, order_count__lte=0).delete()
+
+
+def _add_products(day, table_id, lines, sign):
+    """``_add`` for every ``{ice_cream_id: (units, revenue)}`` line at once, in at most three queries"""
+    if not lines:
+        return
+    rows = DailyProductSales.objects.filter(day=day, table_id=table_id, ice_cream_id__in=list(lines))
+    existing = set(rows.values_list('ice_cream_id', flat=True)) if sign > 0 else set(lines)
+
+    def per_product(index, output_field):
+        return Case(*[When(ice_cream_id=pk, then=Value(sign * line[index])) for pk, line in lines.items()],
+                    output_field=output_field)
+
+    if existing:
+        rows.update(
+            order_count=F('order_count') + sign,
+            units=F('units') + per_product(0, IntegerField()),
+            revenue=F('revenue') + per_product(1, DecimalField(max_digits=12, decimal_places=2)),
+        )
+    if sign > 0:
+        DailyProductSales.objects.bulk_create([
+            DailyProductSales(day=day, ice_cream_id=pk, table_id=table_id, order_count=1, units=units, revenue=revenue)
+            for pk, (units, revenue) in lines.items() if pk not in existing
+        ])
+    else:
+        rows.filter(order_count__lte=0).delete()
+
+
+def apply_order(order, sign=1):
+    """Add (``sign=1``) or remove (``sign=-1``) one order's figures from the rollups"""
+    day = timezone.localdate(order.created_at, timezone=shop_timezone())
+    _add(DailySales, {'day': day, 'table_id': order.table_id}, sign,
+         order_count=1, revenue=order.total_amount)
+
+    lines = {}
+    for item in order.items.all():
+        units, revenue = lines.get(item.ice_cream_id, (0, Decimal('0')))
+        lines[item.ice_cream_id] = (units + item.quantity, revenue + item.line_total)
+    # A fixed number of queries however many products the order has
+    _add_products(day, order.table_id, lines, sign)
+
+
+def record_status_change(order, old_status):
+    """Update the rollups if the order moved into or out of the counted statuses"""
+    was_counted = old_status in COUNTED_STATUSES
+    is_counted = order.status in COUNTED_STATUSES
+    if was_counted != is_counted:
+        apply_order(order, 1 if is_counted else -1)
+
+
+@contextmanager
+def order_change(order):
+    """
+    Atomic block that changes a counted order's items or total: its old
+    figures are taken out of the rollups first and the new ones added after.
+    """
+    counted = order.status in COUNTED_STATUSES
+    with transaction.atomic(savepoint=False):
+        if counted:
+            apply_order(order, -1)
+        yield
+        if counted:
+            apply_order(order, 1)
+
+
+def clear():
+    """Empty the rollups, e.g. once every order is deleted"""
+    DailySales.objects.all().delete()
+    DailyProductSales.objects.all().delete()
+
+
+def rebuild():
+    """Recompute all rollups from raw orders; returns (day/table rows, day/product/table rows)"""
+    tzinfo = shop_timezone()
+    orders = Order.objects.filter(status__in=COUNTED_STATUSES).annotate(
+        day=TruncDate('created_at', tzinfo=tzinfo)
+    ).values('day', 'table_id').annotate(
+        order_count=Count('id'),
+        revenue=Sum('total_amount'),
+    ).order_by()
+    items = OrderItem.objects.filter(order__status__in=COUNTED_STATUSES).annotate(
+        day=TruncDate('order__created_at', tzinfo=tzinfo)
+    ).values('day', 'order__table_id', 'ice_cream_id').annotate(
+        order_count=Count('order_id', distinct=True),
+        units=Sum('quantity'),
+        revenue=Sum(F('quantity') * F('unit_price')),
+    ).order_by()
+
+    with transaction.atomic():
+        clear()
+        daily = DailySales.objects.bulk_create([
+            DailySales(day=row['day'], table_id=row['table_id'],
+                       order_count=row['order_count'], revenue=row['revenue'] or 0)
+            for row in orders
+        ], batch_size=500)
+        products = DailyProductSales.objects.bulk_create([
+            DailyProductSales(day=row['day'], ice_cream_id=row['ice_cream_id'], table_id=row['order__table_id'],
+                              order_count=row['order_count'], units=row['units'] or 0, revenue=row['revenue'] or 0)
+            for row in items
+        ], batch_size=500)
+    return len(daily), len(products)
+
+
+# Query layer used by the analytics views. ``start``/``end`` are inclusive
+# dates; None leaves that side of the range open.
+
+def _in_range(queryset, start=None, end=None):
+    if start is not None:
+        queryset = queryset.filter(day__gte=start)
+    if end is not None:
+        queryset = queryset.filter(day__lte=end)
+    return queryset
+
+
+def sales_summary(start=None, end=None):
+    """Total revenue, order count and average order value for the range"""
+    totals = _in_range(DailySales.objects.all(), start, end).aggregate(
+        revenue=Sum('revenue'), orders=Sum('order_count')
+    )
+    revenue = totals['revenue'] or 0
+    orders = totals['orders'] or 0
+    return {
+        'total_revenue': revenue,
+        'total_orders': orders,
+        'avg_order_value': revenue / orders if orders else 0,
+    }
+
+
+def table_sales(start=None, end=None):
+    """Per-table orders and revenue, highest revenue first"""
+    return _in_range(DailySales.objects.all(), start, end).values(
+        'table_id', number=F('table__number')
+    ).annotate(
+        orders_count=Sum('order_count'),
+        revenue=Sum('revenue'),
+    ).order_by('-revenue')
+
+
+def product_sales(start=None, end=None):
+    """Per-ice-cream orders, units and revenue, highest revenue first"""
+    return _in_range(DailyProductSales.objects.all(), start, end).values(
+        'ice_cream_id', name=F('ice_cream__name')
+    ).annotate(
+        orders_count=Sum('order_count'),
+        units=Sum('units'),
+        revenue=Sum('revenue'),
+    ).order_by('-revenue')
+
+
+def daily_totals(start=None, end=None):
+    """Orders and revenue per day, oldest first"""
+    return _in_range(DailySales.objects.all(), start, end).values('day').annotate(
+        orders_count=Sum('order_count'),
+        revenue=Sum('revenue'),
+    ).order_by('day')
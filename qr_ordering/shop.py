@@ -0,0 +1,75 @@
+"""
+Cached read access to the ShopSettings singleton.
+
+``get_shop_settings`` keeps the instance in this process under a version
+number held in Django's shared cache. A warm process only reads the version
+from the cache (no database query) and reuses its copy while the version is
+unchanged. Saving ShopSettings bumps the version after commit, so every
+worker reloads from its own database on its next call. The instance itself
+is never put in the shared cache, where another database (the test
+database, another checkout) could overwrite it. The returned instance is
+shared: treat it as read-only and edit through ``ShopSettings.get_settings()``.
+"""
+import os
+import threading
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = 'shop_settings:version'
+# Model defaults, shown until the shop fills the fields in
+UPI_ID_PLACEHOLDER = 'your-upi-id@bank'
+MERCHANT_NAME_PLACEHOLDER = 'Your Shop Name'
+
+_local = {'version': None, 'settings': None}
+_local_lock = threading.Lock()
+
+
+def _get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def get_shop_settings():
+    """Current ShopSettings, from process memory when still up to date"""
+    from .models import ShopSettings
+
+    version = _get_version()
+    with _local_lock:
+        if _local['version'] == version and _local['settings'] is not None:
+            return _local['settings']
+
+    settings = ShopSettings.get_settings()
+    with _local_lock:
+        _local['version'] = version
+        _local['settings'] = settings
+    return settings
+
+
+def invalidate_shop_settings():
+    """Make every process reload the settings on its next read"""
+    with _local_lock:
+        _local['version'] = None
+        _local['settings'] = None
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, int(time.time() * 1000), timeout=None)
+
+
+def upi_merchant(shop=None):
+    """
+    ``(UPI ID, merchant name)`` for payments. Blank fields and untouched
+    placeholders fall back to the ``UPI_MERCHANT_ID``/``UPI_MERCHANT_NAME``
+    environment variables.
+    """
+    shop = shop or get_shop_settings()
+    upi_id = shop.upi_id if shop.upi_id and shop.upi_id != UPI_ID_PLACEHOLDER else None
+    name = shop.upi_merchant_name if shop.upi_merchant_name and shop.upi_merchant_name != MERCHANT_NAME_PLACEHOLDER else None
+    return (
+        upi_id or os.environ.get('UPI_MERCHANT_ID', UPI_ID_PLACEHOLDER),
+        name or os.environ.get('UPI_MERCHANT_NAME', shop.shop_name),
+    )
@@ -0,0 +1,48 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import microcache
+from .catalog import bump_menu_version
+from .models import IceCream, Order, OrderTombstone, ShopSettings
+from .orders import TOMBSTONE_RETENTION, bulk_deleting
+from .rollups import COUNTED_STATUSES, apply_order
+from .shop import invalidate_shop_settings
+
+
+@receiver(post_save, sender=IceCream)
+@receiver(post_delete, sender=IceCream)
+def invalidate_menu(sender, **kwargs):
+    # Bump after commit so no worker caches the menu from before the change
+    transaction.on_commit(bump_menu_version)
+
+
+@receiver(pre_delete, sender=Order)
+def remove_order_from_rollups(sender, instance, **kwargs):
+    # Before deletion, while the order's items can still be read
+    if instance.status in COUNTED_STATUSES and not bulk_deleting():
+        apply_order(instance, -1)
+
+
+@receiver(post_delete, sender=Order)
+def record_order_tombstone(sender, instance, **kwargs):
+    # Lets incremental clients of get_orders_json drop deleted orders
+    if bulk_deleting():
+        return
+    OrderTombstone.objects.create(order_id=instance.pk)
+    OrderTombstone.objects.filter(deleted_at__lt=timezone.now() - TOMBSTONE_RETENTION).delete()
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_dashboard_figures(sender, **kwargs):
+    # Status changes show up on staff screens without waiting out the TTL
+    if bulk_deleting():
+        return
+    transaction.on_commit(microcache.invalidate)
+
+
+@receiver(post_save, sender=ShopSettings)
+def invalidate_cached_settings(sender, **kwargs):
+    transaction.on_commit(invalidate_shop_settings)
@@ -0,0 +1,51 @@
+"""
+Per-table and per-flavor sales figures for the admin management pages.
+
+Each function returns one annotated queryset: today's and all-time orders
+and revenue are conditional aggregates (``filter=Q(...)``) over the daily
+sales rollups, so a page of N tables or flavors costs one query instead
+of several per row.
+"""
+from decimal import Decimal
+
+from django.db.models import DecimalField, IntegerField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from . import dates
+from .models import IceCream, Table
+
+
+def _total(field, filter=None):
+    if field.endswith('revenue'):
+        zero = Value(Decimal('0'), output_field=DecimalField(max_digits=12, decimal_places=2))
+    else:
+        zero = Value(0, output_field=IntegerField())
+    return Coalesce(Sum(field, filter=filter), zero)
+
+
+def table_stats(queryset=None, today=None):
+    """Tables annotated with orders/revenue today and all time (paid orders)"""
+    if queryset is None:
+        queryset = Table.objects.all()
+    is_today = Q(daily_sales__day=today or dates.today())
+    return queryset.annotate(
+        orders_today=_total('daily_sales__order_count', filter=is_today),
+        revenue_today=_total('daily_sales__revenue', filter=is_today),
+        total_orders=_total('daily_sales__order_count'),
+        total_revenue=_total('daily_sales__revenue'),
+    )
+
+
+def ice_cream_stats(queryset=None, today=None):
+    """Ice creams annotated with orders/units/revenue today and all time (paid orders)"""
+    if queryset is None:
+        queryset = IceCream.objects.all()
+    is_today = Q(daily_sales__day=today or dates.today())
+    return queryset.annotate(
+        orders_today=_total('daily_sales__order_count', filter=is_today),
+        units_today=_total('daily_sales__units', filter=is_today),
+        revenue_today=_total('daily_sales__revenue', filter=is_today),
+        total_orders=_total('daily_sales__order_count'),
+        total_units=_total('daily_sales__units'),
+        total_revenue=_total('daily_sales__revenue'),
+    )
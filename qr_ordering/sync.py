@@ -0,0 +1,225 @@
+"""
+Transactional outbox for Firebase Realtime Database sync.
+
+Request handlers and model saves call ``enqueue`` inside their database
+transaction instead of talking to Firebase directly. Inside ``batch()``
+the writes of a whole request or job are buffered and stored as one
+event. The ``sync_worker`` management command drains the outbox with
+``drain``, coalescing pending events into one multi-path update per batch
+on the configured backend (see ``sync_backends``).
+"""
+import copy
+import sys
+import threading
+from contextlib import ContextDecorator
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import SyncEvent
+from .sync_backends import get_backend
+
+MAX_ATTEMPTS = 10
+MAX_BACKOFF_SECONDS = 300
+
+_local = threading.local()
+
+
+def _batches():
+    if not hasattr(_local, 'batches'):
+        _local.batches = []
+    return _local.batches
+
+
+def enqueue(path, payload=None, op='update'):
+    """Record a pending write; call inside the transaction that changed the data"""
+    event = SyncEvent(path=path.strip('/'), op=op, payload=payload)
+    batches = _batches()
+    if batches:
+        batches[-1][1].append(event)
+    else:
+        event.save()
+    return event
+
+
+class batch(ContextDecorator):
+    """
+    Buffer ``enqueue`` calls and store them as a single multi-path event.
+
+    Runs in a transaction like ``transaction.atomic`` so the combined event
+    commits with the data. Nested batches fold into the outermost one;
+    buffered writes are dropped if the block raises.
+    """
+
+    def __enter__(self):
+        # State lives in the thread, so one instance can decorate a view used concurrently
+        atomic = transaction.atomic()
+        atomic.__enter__()
+        _batches().append((atomic, []))
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        atomic, events = _batches().pop()
+        if exc_type is None and events:
+            try:
+                if _batches():
+                    _batches()[-1][1].extend(events)
+                else:
+                    updates = coalesce(events)
+                    if updates:
+                        SyncEvent.objects.create(path='', op='update', payload=updates)
+            except Exception:
+                atomic.__exit__(*sys.exc_info())
+                raise
+        return atomic.__exit__(exc_type, exc_value, traceback)
+
+
+def order_payload(order, items=None):
+    """Full Firebase node for an order"""
+    if items is None:
+        items = order.items.select_related('ice_cream')
+    return {
+        'id': order.id,
+        'table': order.table.number,
+        'customer_email': order.customer_email,
+        'customer_name': order.customer_name,
+        'status': order.get_status_display(),
+        'payment_status': order.get_payment_status_display(),
+        'created_at': order.created_at.isoformat(),
+        'paid_at': order.paid_at.isoformat() if order.paid_at else None,
+        'total_amount': float(order.total_amount),
+        'items': [
+            {'quantity': item.quantity, 'name': item.ice_cream.name, 'price': float(item.unit_price)}
+            for item in items
+        ]
+    }
+
+
+def media_url(field_file, prefix):
+    """Storage URL once ``migrate_to_firebase --media`` has uploaded the file, else the local media URL"""
+    from .media_migration import blob_name, migrated_url
+    return migrated_url(blob_name(prefix, field_file)) or field_file.url
+
+
+def product_payload(ice_cream):
+    """Firebase node for an ice cream, with its image URL"""
+    return {
+        'name': ice_cream.name,
+        'price': float(ice_cream.price),
+        'image_url': media_url(ice_cream.image, 'ice_cream_images/'),
+    }
+
+
+def table_payload(table):
+    """Firebase node for a table, with its QR code image URL"""
+    return {
+        'number': table.number,
+        'token': str(table.token),
+        'qr_code_url': media_url(table.qr_code, 'qr_codes/'),
+    }
+
+
+def _apply(updates, path, value):
+    """Merge a single path write into a multi-path update dict"""
+    for existing in list(updates):
+        if path == existing:
+            break
+        if path.startswith(existing + '/'):
+            # An ancestor is already being written: patch the value in place
+            node = updates[existing]
+            if not isinstance(node, dict):
+                node = updates[existing] = {}
+            parts = path[len(existing) + 1:].split('/')
+            for part in parts[:-1]:
+                child = node.get(part)
+                if not isinstance(child, dict):
+                    child = node[part] = {}
+                node = child
+            if value is None:
+                node.pop(parts[-1], None)
+            else:
+                node[parts[-1]] = value
+            return
+        if existing.startswith(path + '/'):
+            # Firebase rejects overlapping paths, the newer write wins
+            del updates[existing]
+    updates[path] = value
+
+
+def coalesce(events):
+    """Fold outbox events, oldest first, into one multi-path update"""
+    updates = {}
+    for event in events:
+        payload = copy.deepcopy(event.payload)
+        if event.op == 'delete':
+            _apply(updates, event.path, None)
+        elif event.op == 'set' or not isinstance(payload, dict):
+            _apply(updates, event.path, payload)
+        else:
+            for key, value in payload.items():
+                _apply(updates, f"{event.path}/{key}" if event.path else key, value)
+    return updates
+
+
+def drain(batch_size=100, backend=None):
+    """
+    Push one batch of due outbox events to Firebase.
+
+    Events are delivered strictly in order, so nothing newer is sent while
+    the oldest event is waiting out its backoff. After a failed batch the
+    oldest event is retried on its own with exponential backoff, and marked
+    failed after ``MAX_ATTEMPTS`` so a bad event cannot hold up the rest.
+    Returns the number of events delivered; errors are re-raised.
+    """
+    events = list(SyncEvent.objects.filter(status='pending').order_by('id')[:batch_size])
+    if not events:
+        return 0
+    head = events[0]
+    if head.next_attempt_at and head.next_attempt_at > timezone.now():
+        return 0
+    if head.attempts:
+        events = [head]
+
+    updates = coalesce(events)
+    try:
+        if updates:
+            (backend or get_backend()).update(updates)
+    except Exception as e:
+        # Only the oldest event is charged; if another one is at fault it
+        # becomes the oldest once this one goes through on its own
+        head.attempts += 1
+        head.last_error = str(e)[:1000]
+        if head.attempts >= MAX_ATTEMPTS:
+            head.status = 'failed'
+            print(f"Giving up on sync event {head.id} ({head}) after {head.attempts} attempts: {e}")
+        else:
+            head.next_attempt_at = timezone.now() + timedelta(seconds=min(2 ** head.attempts, MAX_BACKOFF_SECONDS))
+        head.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+        raise
+
+    SyncEvent.objects.filter(id__in=[event.id for event in events]).delete()
+    return len(events)
+
+
+def retry_failed():
+    """Queue failed events again, in their original order; returns how many"""
+    return SyncEvent.objects.filter(status='failed').update(
+        status='pending', attempts=0, next_attempt_at=None,
+    )
+
+
+def outbox_lag():
+    """Seconds since the oldest undelivered event was written (0 when empty)"""
+    oldest = SyncEvent.objects.filter(status='pending').order_by('created_at').values_list('created_at', flat=True).first()
+    if oldest is None:
+        return 0.0
+    return max((timezone.now() - oldest).total_seconds(), 0.0)
+
+
+def outbox_stats():
+    return {
+        'pending': SyncEvent.objects.filter(status='pending').count(),
+        'retrying': SyncEvent.objects.filter(status='pending', attempts__gt=0).count(),
+        'failed': SyncEvent.objects.filter(status='failed').count(),
+        'lag_seconds': round(outbox_lag(), 3),
+    }
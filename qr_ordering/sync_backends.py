@@ -0,0 +1,79 @@
+"""
+Destinations for the Firebase sync outbox.
+
+``sync.drain`` hands each coalesced batch to the configured backend as one
+multi-path ``update``, so a batch costs a single network call. ``SYNC_BACKEND``
+selects the class:
+
+- ``FirebaseBackend``: the Firebase Realtime Database (production)
+- ``MemoryBackend``: ``memory_db``, for running the worker offline, tests and benchmarks
+- ``NullBackend``: discards writes but counts them, for measuring the write path alone
+"""
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class SyncBackend:
+    """Interface: apply a ``{path: value}`` multi-path update atomically"""
+
+    def update(self, updates):
+        raise NotImplementedError
+
+    def get(self, path='/'):
+        raise NotImplementedError
+
+
+class DatabaseBackend(SyncBackend):
+    """Backend over a module exposing ``reference(path)`` like ``firebase_admin.db``"""
+
+    module = None
+
+    def __init__(self, database=None):
+        self.database = database or import_string(self.module)
+
+    def update(self, updates):
+        if updates:
+            self.database.reference('/').update(updates)
+
+    def get(self, path='/'):
+        return self.database.reference(path).get()
+
+
+class FirebaseBackend(DatabaseBackend):
+    module = 'firebase_admin.db'
+
+
+class MemoryBackend(DatabaseBackend):
+    module = 'qr_ordering.memory_db.db'
+
+    def reset(self):
+        self.database.reset()
+
+    @property
+    def write_count(self):
+        return self.database.write_count
+
+
+class NullBackend(SyncBackend):
+    def __init__(self):
+        self.write_count = 0
+        self.paths_written = 0
+
+    def update(self, updates):
+        if updates:
+            self.write_count += 1
+            self.paths_written += len(updates)
+
+    def get(self, path='/'):
+        return None
+
+
+_backend = {}
+
+
+def get_backend():
+    """Shared instance of the ``SYNC_BACKEND`` class"""
+    key = getattr(settings, 'SYNC_BACKEND', None) or 'qr_ordering.sync_backends.FirebaseBackend'
+    if key not in _backend:
+        _backend[key] = import_string(key)()
+    return _backend[key]
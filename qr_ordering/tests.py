@@ -1,3 +1,1384 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import zlib
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import assets, catalog, events, images, loadtest, media_migration, microcache, qr_jobs, query_budget, reports, rollups, shop, stats, sync
+from .models import (
+    DailyProductSales, DailySales, IceCream, MailJob, Order, OrderItem, OrderTombstone, QRRegenerationJob, Refund, ShopSettings,
+    SyncEvent, Table,
+)
+
+
+@override_settings(DASHBOARD_CACHE_TTL=0)
+class TablePerformanceReportTests(TestCase):
+    def setUp(self):
+        self.ice_cream = IceCream.objects.create(name='Vanilla', price=Decimal('50.00'), image='ice_creams/vanilla.png')
+        self.today = timezone.localdate()
+
+    def add_tables(self, count):
+        start = Table.objects.count() + 1
+        tables = Table.objects.bulk_create([
+            Table(number=number, qr_code=f'qr_codes/table_{number}.png')
+            for number in range(start, start + count)
+        ])
+        for table in tables:
+            order = Order.objects.create(table=table, status='paid')
+            OrderItem.objects.create(order=order, ice_cream=self.ice_cream, quantity=table.number)
+        rollups.rebuild()
+
+    def count_queries(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        return len(queries)
+
+    def test_table_performance_figures(self):
+        self.add_tables(3)
+        rows = reports.table_performance(self.today, self.today)
+
+        self.assertEqual([row['number'] for row in rows], [3, 2, 1])
+        self.assertEqual(rows[0]['orders_count'], 1)
+        self.assertEqual(rows[0]['revenue'], Decimal('150.00'))
+        self.assertEqual(rows[0]['percentage'], 50.0)
+        self.assertEqual(sum(row['revenue'] for row in rows), Decimal('300.00'))
+
+    def test_tables_without_sales_in_range_are_zero(self):
+        self.add_tables(2)
+        yesterday = self.today - timedelta(days=1)
+        rows = reports.table_performance(yesterday, yesterday)
+
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(all(row['orders_count'] == 0 and row['revenue'] == 0 for row in rows))
+
+    def test_hourly_and_weekday_breakdowns(self):
+        self.add_tables(2)
+        hourly = reports.hourly_breakdown(self.today, self.today)
+        weekdays = reports.weekday_breakdown(self.today, self.today)
+
+        self.assertEqual(len(hourly), 24)
+        self.assertEqual(sum(row['orders_count'] for row in hourly), 2)
+        self.assertEqual(len(weekdays), 7)
+        self.assertEqual(weekdays[self.today.weekday()]['orders_count'], 2)
+        self.assertEqual(weekdays[self.today.weekday()]['revenue'], Decimal('150.00'))
+
+    def test_query_count_does_not_grow_with_tables(self):
+        self.add_tables(3)
+        few = self.count_queries(lambda: reports.table_performance(self.today, self.today))
+        self.add_tables(60)
+        many = self.count_queries(lambda: reports.table_performance(self.today, self.today))
+
+        self.assertEqual(few, 1)
+        self.assertEqual(many, 1)
+
+    def test_analytics_page_query_count_does_not_grow_with_tables(self):
+        self.client.force_login(User.objects.create_user('staff', password='password'))
+        url = reverse('admin_analytics')
+
+        self.add_tables(3)
+        few = self.count_queries(lambda: self.client.get(url))
+        self.add_tables(60)
+        many = self.count_queries(lambda: self.client.get(url))
+
+        self.assertEqual(few, many)
+
+
+@override_settings(DASHBOARD_CACHE_TTL=0)
+class ManagementStatsTests(TestCase):
+    ROW_COUNTS = (10, 100, 1000)
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('staff', password='password'))
+        self.today = timezone.localdate()
+        self.yesterday = self.today - timedelta(days=1)
+        # Loaded once per process for the shop's time zone; keep it out of the counts
+        shop.get_shop_settings()
+
+    def count_queries(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        return len(queries)
+
+    def grow_tables(self, total):
+        start = Table.objects.count() + 1
+        tables = Table.objects.bulk_create([
+            Table(number=number, qr_code=f'qr_codes/table_{number}.png')
+            for number in range(start, total + 1)
+        ])
+        DailySales.objects.bulk_create(
+            [DailySales(day=self.today, table=table, order_count=1, revenue=Decimal('40.00')) for table in tables]
+            + [DailySales(day=self.yesterday, table=table, order_count=2, revenue=Decimal('60.00')) for table in tables]
+        )
+
+    def grow_ice_creams(self, total):
+        table = Table.objects.first() or Table.objects.bulk_create([Table(number=1, qr_code='qr_codes/table_1.png')])[0]
+        start = IceCream.objects.count()
+        ice_creams = IceCream.objects.bulk_create([
+            IceCream(name=f'Flavor {number}', price=Decimal('50.00'), image='ice_creams/flavor.png')
+            for number in range(start, total)
+        ])
+        DailyProductSales.objects.bulk_create([
+            DailyProductSales(day=self.today, ice_cream=ice_cream, table=table,
+                              order_count=1, units=2, revenue=Decimal('100.00'))
+            for ice_cream in ice_creams
+        ])
+
+    def test_table_stats_figures(self):
+        self.grow_tables(2)
+        table = stats.table_stats().get(number=1)
+
+        self.assertEqual(table.orders_today, 1)
+        self.assertEqual(table.revenue_today, Decimal('40.00'))
+        self.assertEqual(table.total_orders, 3)
+        self.assertEqual(table.total_revenue, Decimal('100.00'))
+
+    def test_tables_without_sales_are_zero(self):
+        Table.objects.bulk_create([Table(number=1, qr_code='qr_codes/table_1.png')])
+        table = stats.table_stats().get()
+
+        self.assertEqual((table.orders_today, table.total_orders), (0, 0))
+        self.assertEqual(table.total_revenue, 0)
+
+    def test_ice_cream_stats_figures(self):
+        self.grow_ice_creams(1)
+        ice_cream = stats.ice_cream_stats().get()
+
+        self.assertEqual((ice_cream.total_orders, ice_cream.total_units), (1, 2))
+        self.assertEqual(ice_cream.revenue_today, Decimal('100.00'))
+
+    def test_manage_tables_query_count_is_constant(self):
+        url = reverse('manage_tables')
+        counts = []
+        for total in self.ROW_COUNTS:
+            self.grow_tables(total)
+            with self.subTest(tables=total):
+                self.assertEqual(self.count_queries(lambda: list(stats.table_stats())), 1)
+            counts.append(self.count_queries(lambda: self.client.get(url)))
+        self.assertEqual(len(set(counts)), 1, counts)
+
+    def test_edit_table_query_count_is_constant(self):
+        counts = []
+        for total in self.ROW_COUNTS:
+            self.grow_tables(total)
+            url = reverse('edit_table', args=[Table.objects.get(number=total).pk])
+            counts.append(self.count_queries(lambda: self.client.get(url)))
+        self.assertEqual(len(set(counts)), 1, counts)
+
+    def test_manage_ice_creams_query_count_is_constant(self):
+        url = reverse('manage_ice_creams')
+        counts = []
+        for total in self.ROW_COUNTS:
+            self.grow_ice_creams(total)
+            with self.subTest(ice_creams=total):
+                self.assertEqual(self.count_queries(lambda: list(stats.ice_cream_stats())), 1)
+            counts.append(self.count_queries(lambda: self.client.get(url)))
+        self.assertEqual(len(set(counts)), 1, counts)
+
+
+@override_settings(DASHBOARD_CACHE_TTL=0)
+class RollupTests(TestCase):
+    def setUp(self):
+        self.vanilla = IceCream.objects.create(name='Vanilla', price=Decimal('50.00'), image='ice_creams/vanilla.png')
+        self.mango = IceCream.objects.create(name='Mango', price=Decimal('70.00'), image='ice_creams/mango.png')
+        self.tables = Table.objects.bulk_create([
+            Table(number=number, qr_code=f'qr_codes/table_{number}.png') for number in (1, 2)
+        ])
+
+    def order(self, table, status='draft', lines=()):
+        order = Order.objects.create(table=table, status=status)
+        for ice_cream, quantity in lines:
+            OrderItem.objects.create(order=order, ice_cream=ice_cream, quantity=quantity)
+        return order
+
+    def snapshot(self):
+        return (
+            sorted(DailySales.objects.values_list('day', 'table_id', 'order_count', 'revenue')),
+            sorted(DailyProductSales.objects.values_list('day', 'ice_cream_id', 'table_id', 'order_count', 'units', 'revenue')),
+        )
+
+    def test_status_changes_update_rollups(self):
+        order = self.order(self.tables[0], lines=[(self.vanilla, 2)])
+        self.assertFalse(DailySales.objects.exists())
+
+        order.status = 'paid'
+        order.save()
+        self.assertEqual(rollups.sales_summary()['total_revenue'], Decimal('100.00'))
+        order.status = 'in_progress'
+        order.save()
+        self.assertEqual(rollups.sales_summary()['total_orders'], 1)
+
+        order.status = 'cancelled'
+        order.save()
+        self.assertFalse(DailySales.objects.exists())
+        self.assertFalse(DailyProductSales.objects.exists())
+
+    def test_clear_all_empties_rollups_in_constant_queries(self):
+        from .orders import clear_all
+
+        def clear(count):
+            for _ in range(count):
+                self.order(self.tables[0], status='paid', lines=[(self.vanilla, 1), (self.mango, 2)])
+            with CaptureQueriesContext(connection) as queries:
+                clear_all()
+            return len(queries)
+
+        self.assertEqual(clear(2), clear(10))
+        self.assertEqual(self.snapshot(), ([], []))
+        # Later orders are counted again from zero
+        self.order(self.tables[1], status='paid', lines=[(self.vanilla, 1)])
+        self.assertEqual(rollups.sales_summary()['total_orders'], 1)
+
+    def test_item_changes_on_counted_order(self):
+        order = self.order(self.tables[0], status='paid', lines=[(self.vanilla, 1)])
+        item = OrderItem.objects.create(order=order, ice_cream=self.mango, quantity=1)
+        item.quantity = 3
+        item.save()
+
+        self.assertEqual(rollups.sales_summary()['total_revenue'], Decimal('260.00'))
+        item.delete()
+        self.assertEqual(rollups.sales_summary(), {
+            'total_revenue': Decimal('50.00'), 'total_orders': 1, 'avg_order_value': Decimal('50.00'),
+        })
+
+    def test_payment_query_count_does_not_grow_with_products(self):
+        flavors = [self.vanilla, self.mango] + [
+            IceCream.objects.create(name=f'Flavor {number}', price=Decimal('10.00'), image=f'ice_creams/{number}.png')
+            for number in range(4)
+        ]
+
+        def pay(lines):
+            order = self.order(self.tables[0], lines=lines)
+            order.status = 'paid'
+            with CaptureQueriesContext(connection) as queries:
+                order.save()
+            return len(queries)
+
+        # The first order of the day creates the rows, the second updates them
+        self.assertEqual(pay([(self.vanilla, 1)]), pay([(flavor, 1) for flavor in flavors]))
+        self.assertEqual(pay([(self.vanilla, 1)]), pay([(flavor, 2) for flavor in flavors]))
+        live = self.snapshot()
+        rollups.rebuild()
+        self.assertEqual(self.snapshot(), live)
+
+    def test_product_revenue_adds_up_after_price_change(self):
+        self.order(self.tables[0], status='paid', lines=[(self.vanilla, 2), (self.mango, 1)])
+        IceCream.objects.filter(pk=self.vanilla.pk).update(price=Decimal('80.00'))
+        self.order(self.tables[1], status='paid', lines=[(IceCream.objects.get(pk=self.vanilla.pk), 1)])
+
+        live = self.snapshot()
+        products = sum(row['revenue'] for row in rollups.product_sales())
+        self.assertEqual(products, Decimal('250.00'))
+        self.assertEqual(rollups.sales_summary()['total_revenue'], products)
+
+        rollups.rebuild()
+        self.assertEqual(self.snapshot(), live)
+
+    def test_rebuild_matches_live_rollups(self):
+        first = self.order(self.tables[0], status='paid', lines=[(self.vanilla, 1), (self.mango, 2)])
+        self.order(self.tables[0], status='completed', lines=[(self.vanilla, 3)])
+        self.order(self.tables[1], status='pending_payment', lines=[(self.mango, 1)])
+        cancelled = self.order(self.tables[1], status='paid', lines=[(self.mango, 4)])
+        cancelled.status = 'cancelled'
+        cancelled.save()
+        first.delete()
+
+        live = self.snapshot()
+        self.assertEqual(rollups.rebuild(), (1, 1))
+        self.assertEqual(self.snapshot(), live)
+
+    def test_dashboard_today_uses_shop_time_zone(self):
+        self.order(self.tables[0], status='paid', lines=[(self.vanilla, 1)])
+        self.client.force_login(User.objects.create_user('staff', password='password'))
+
+        # A shop time zone whose date differs from TIME_ZONE's right now
+        shop_tz = next(tz for tz in (ZoneInfo('Etc/GMT+12'), ZoneInfo('Etc/GMT-14'))
+                       if timezone.localdate(timezone=tz) != timezone.localdate())
+        with mock.patch('qr_ordering.dates.shop_timezone', return_value=shop_tz), \
+                mock.patch('qr_ordering.rollups.shop_timezone', return_value=shop_tz):
+            rollups.rebuild()
+            figures = self.client.get(reverse('admin_dashboard')).context['stats']
+        self.assertEqual(figures['total_orders_today'], 1)
+        self.assertEqual(figures['total_revenue_today'], Decimal('50.00'))
+
+
+@override_settings(
+    DASHBOARD_CACHE_TTL=60,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'microcache-tests'}},
+)
+class MicroCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return {'value': self.calls}
+
+    def test_caches_until_invalidated(self):
+        self.assertEqual(microcache.get_or_compute('figures', self.compute), {'value': 1})
+        self.assertEqual(microcache.get_or_compute('figures', self.compute), {'value': 1})
+        microcache.invalidate()
+        self.assertEqual(microcache.get_or_compute('figures', self.compute), {'value': 2})
+
+        counters = microcache.counters()
+        self.assertEqual((counters['hits'], counters['misses']), (1, 2))
+
+    def test_concurrent_misses_compute_once(self):
+        import threading
+        import time
+
+        def slow_compute():
+            time.sleep(0.2)
+            return self.compute()
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(microcache.get_or_compute('figures', slow_compute)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [{'value': 1}] * 5)
+        self.assertEqual(microcache.counters()['coalesced'], 4)
+
+    def test_locks_do_not_grow_with_names(self):
+        for day in range(500):
+            microcache.get_or_compute(f'analytics:{day}', self.compute)
+
+        self.assertEqual(len(microcache._local_locks), microcache.LOCK_STRIPES)
+        self.assertIs(microcache._local_lock('analytics:1'), microcache._local_lock('analytics:1'))
+
+    def test_dashboard_is_served_from_cache(self):
+        self.client.force_login(User.objects.create_user('staff', password='password'))
+        url = reverse('admin_dashboard')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as cached:
+            self.client.get(url)
+        microcache.invalidate()
+        with CaptureQueriesContext(connection) as fresh:
+            self.client.get(url)
+
+        self.assertLess(len(cached), len(fresh))
+
+
+class MenuCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.vanilla = IceCream.objects.create(name='Vanilla', price=Decimal('50.00'), image='ice_creams/vanilla.png')
+        self.table = Table.objects.bulk_create([Table(number=1, qr_code='qr_codes/table_1.png')])[0]
+
+    def names(self):
+        return [(item['name'], item['price']) for item in catalog.get_menu()['items']]
+
+    def test_save_and_delete_bump_version_after_commit(self):
+        self.assertEqual(self.names(), [('Vanilla', '50.00')])
+        version = catalog.get_menu_version()
+
+        # The photo variant build is not under test here
+        with mock.patch('qr_ordering.images.schedule'), self.captureOnCommitCallbacks(execute=True):
+            self.vanilla.price = Decimal('55.00')
+            self.vanilla.save()
+            mango = IceCream.objects.create(name='Mango', price=Decimal('70.00'), image='ice_creams/mango.png')
+            self.assertEqual(catalog.get_menu_version(), version)
+        self.assertGreater(catalog.get_menu_version(), version)
+        self.assertEqual(self.names(), [('Vanilla', '55.00'), ('Mango', '70.00')])
+
+        version = catalog.get_menu_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            mango.delete()
+        self.assertGreater(catalog.get_menu_version(), version)
+        self.assertEqual(self.names(), [('Vanilla', '55.00')])
+        self.assertNotIn('Mango', catalog.get_menu()['html'])
+
+    def test_warm_menu_is_not_rebuilt(self):
+        catalog.get_menu()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names(), [('Vanilla', '50.00')])
+
+    def test_warm_order_page_only_looks_up_the_table(self):
+        url = reverse('order_page', args=[self.table.token])
+        self.client.get(url)
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertContains(response, 'Vanilla')
+
+
+class ShopSettingsTests(TestCase):
+    def setUp(self):
+        shop.invalidate_shop_settings()
+
+    def test_placeholder_upi_id_falls_back_to_environment(self):
+        with mock.patch.dict(os.environ, {'UPI_MERCHANT_ID': 'env@bank', 'UPI_MERCHANT_NAME': 'Env Shop'}):
+            self.assertEqual(shop.upi_merchant(), ('env@bank', 'Env Shop'))
+
+            settings = ShopSettings.get_settings()
+            settings.upi_id = 'real@bank'
+            settings.upi_merchant_name = 'Real Shop'
+            with self.captureOnCommitCallbacks(execute=True):
+                settings.save()
+            self.assertEqual(shop.upi_merchant(), ('real@bank', 'Real Shop'))
+
+    def test_process_copy_is_reloaded_from_the_database_after_a_version_bump(self):
+        self.assertEqual(shop.get_shop_settings().upi_id, shop.UPI_ID_PLACEHOLDER)
+        ShopSettings.objects.filter(pk=1).update(upi_id='direct@bank')
+        self.assertEqual(shop.get_shop_settings().upi_id, shop.UPI_ID_PLACEHOLDER)
+
+        shop.invalidate_shop_settings()
+        self.assertEqual(shop.get_shop_settings().upi_id, 'direct@bank')
+
+
+class TemporaryMediaMixin:
+    """Generated files (table QR codes) go to a temporary MEDIA_ROOT"""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+class MediaMigrationTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        from .local_bucket import LocalBucket
+
+        super().setUp()
+        self.bucket_root = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'checkpoint.json')
+        for path in (self.bucket_root, os.path.dirname(self.checkpoint)):
+            self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+
+        self.bucket = LocalBucket(self.bucket_root)
+        self.tables = [Table.objects.create(number=number) for number in range(1, 6)]
+
+    def migrate(self, bucket=None, **kwargs):
+        return media_migration.migrate(bucket=bucket or self.bucket, workers=3, checkpoint_path=self.checkpoint, **kwargs)
+
+    def test_uploads_once_and_queues_urls(self):
+        summary = self.migrate()
+
+        self.assertEqual((summary['uploaded'], summary['skipped'], summary['failed']), (5, 0, 0))
+        self.assertEqual(self.bucket.upload_count, 5)
+        for table in self.tables:
+            self.assertTrue(self.bucket.blob(f'qr_codes/{os.path.basename(table.qr_code.name)}').exists())
+        event = SyncEvent.objects.latest('id')
+        self.assertEqual(
+            event.payload[f'tables/{self.tables[0].id}/qr_code_url'],
+            f'https://storage.googleapis.com/local-bucket/qr_codes/{os.path.basename(self.tables[0].qr_code.name)}',
+        )
+
+        summary = self.migrate()
+        self.assertEqual((summary['uploaded'], summary['skipped']), (0, 5))
+        self.assertEqual(self.bucket.upload_count, 5)
+
+    def test_reconcile_after_migration_finds_no_drift(self):
+        from .reconcile import reconcile
+        from .sync_backends import MemoryBackend
+
+        backend = MemoryBackend()
+        backend.reset()
+        with override_settings(MEDIA_CHECKPOINT=self.checkpoint):
+            reconcile(backend=backend)
+            SyncEvent.objects.all().delete()
+            self.migrate()
+            while sync.drain(backend=backend):
+                pass
+            self.assertTrue(backend.get(f'tables/{self.tables[0].id}/qr_code_url').startswith('https://storage.googleapis.com/'))
+
+            report = reconcile(backend=backend, dry_run=True)
+        self.assertEqual(report['paths'], 0)
+        self.assertEqual(report['roots']['tables']['local'], 5)
+
+    def test_skips_remote_objects_with_matching_hash(self):
+        self.migrate(update_database=False)
+        os.remove(self.checkpoint)
+
+        summary = self.migrate(update_database=False)
+        self.assertEqual((summary['uploaded'], summary['skipped']), (0, 5))
+        self.assertEqual(self.bucket.upload_count, 5)
+
+    def test_rerun_resumes_after_failures(self):
+        from .local_bucket import LocalBlob, LocalBucket
+
+        failing_name = f'qr_codes/{os.path.basename(self.tables[2].qr_code.name)}'
+
+        class FlakyBlob(LocalBlob):
+            def upload_from_filename(self, filename, **kwargs):
+                if self.name == failing_name:
+                    raise ConnectionError('connection reset')
+                super().upload_from_filename(filename, **kwargs)
+
+        class FlakyBucket(LocalBucket):
+            def blob(self, name):
+                return FlakyBlob(self, name)
+
+        flaky = FlakyBucket(self.bucket_root)
+        summary = self.migrate(bucket=flaky)
+        self.assertEqual((summary['uploaded'], summary['failed']), (4, 1))
+        self.assertIn(failing_name, summary['errors'][0])
+
+        summary = self.migrate()
+        self.assertEqual((summary['uploaded'], summary['skipped'], summary['failed']), (1, 4, 0))
+        self.assertEqual(self.bucket.upload_count, 1)
+
+
+class SyncBatchTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        from .sync_backends import MemoryBackend
+
+        super().setUp()
+        self.backend = MemoryBackend()
+        self.backend.reset()
+        self.table = Table.objects.create(number=1)
+        SyncEvent.objects.all().delete()
+
+    def test_batch_stores_one_event_and_drains_in_one_write(self):
+        with sync.batch():
+            sync.enqueue(f'tables/{self.table.id}', {'number': 1, 'token': 'a'}, op='set')
+            sync.enqueue(f'tables/{self.table.id}', {'number': 2})
+            with sync.batch():
+                sync.enqueue('orders/7', {'status': 'Paid'})
+            sync.enqueue('orders/8', op='delete')
+
+        self.assertEqual(SyncEvent.objects.count(), 1)
+        self.assertEqual(sync.drain(backend=self.backend), 1)
+        self.assertEqual(self.backend.write_count, 1)
+        self.assertEqual(self.backend.get(f'tables/{self.table.id}'), {'number': 2, 'token': 'a'})
+        self.assertEqual(self.backend.get('orders/7/status'), 'Paid')
+
+    def test_failed_batch_writes_nothing(self):
+        with self.assertRaises(ValueError):
+            with sync.batch():
+                Table.objects.create(number=2)
+                raise ValueError('abort')
+
+        self.assertFalse(Table.objects.filter(number=2).exists())
+        self.assertEqual(SyncEvent.objects.count(), 0)
+
+    def test_null_backend_counts_writes(self):
+        from .sync_backends import NullBackend
+        backend = NullBackend()
+        sync.enqueue('orders/1', {'status': 'Paid'})
+        sync.enqueue('orders/2', {'status': 'Paid'})
+
+        self.assertEqual(sync.drain(backend=backend), 2)
+        self.assertEqual((backend.write_count, backend.paths_written), (1, 2))
+
+
+class ChangeTrackingTests(TestCase):
+    def test_in_place_json_change_is_saved(self):
+        IceCream.objects.bulk_create([IceCream(name='Vanilla', price=Decimal('50.00'), image='ice_creams/vanilla.png',
+                                               image_variants={'variants': []})])
+        ice_cream = IceCream.objects.get()
+        self.assertFalse(ice_cream.has_changed())
+
+        ice_cream.image_variants['variants'].append({'label': 'thumb'})
+        self.assertEqual(ice_cream.changed_fields(), {'image_variants'})
+        ice_cream.save()
+
+        self.assertEqual(IceCream.objects.get().image_variants, {'variants': [{'label': 'thumb'}]})
+        self.assertFalse(ice_cream.has_changed())
+
+
+class TableQRCodeTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.table = Table.objects.create(number=1)
+        self.storage = self.table.qr_code.storage
+        self.old_name = self.table.qr_code.name
+
+    def test_old_image_is_deleted_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.table.qr_base_url = 'https://shop.example.com'
+            self.table.save()
+        self.assertNotEqual(self.table.qr_code.name, self.old_name)
+        self.assertTrue(self.storage.exists(self.old_name))
+
+        for callback in callbacks:
+            callback()
+        self.assertFalse(self.storage.exists(self.old_name))
+        self.assertTrue(self.storage.exists(self.table.qr_code.name))
+
+    def test_served_by_the_media_route(self):
+        from django.urls import resolve
+        match = resolve(self.table.qr_code.url)
+        self.assertIs(match.func, assets.serve)
+        self.assertEqual(match.kwargs['path'], self.old_name)
+
+    def test_old_image_survives_rollback(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError):
+                with transaction.atomic():
+                    self.table.qr_base_url = 'https://shop.example.com'
+                    self.table.save()
+                    raise ValueError('abort')
+
+        self.assertEqual(Table.objects.get().qr_code.name, self.old_name)
+        self.assertTrue(self.storage.exists(self.old_name))
+
+    def test_image_pointed_at_again_is_kept(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.table.qr_base_url = 'https://shop.example.com'
+            self.table.save()
+            self.table.qr_base_url = ''
+            self.table.save()
+
+        self.assertEqual(self.table.qr_code.name, self.old_name)
+        self.assertTrue(self.storage.exists(self.old_name))
+
+
+class QRRegenerationTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.tables = [Table.objects.create(number=number) for number in (1, 2, 3)]
+        self.storage = self.tables[0].qr_code.storage
+        SyncEvent.objects.all().delete()
+
+    def test_regenerate_all_moves_tables_to_new_images(self):
+        old_names = [table.qr_code.name for table in self.tables]
+        with self.captureOnCommitCallbacks(execute=True):
+            job = qr_jobs.regenerate_all(base_url='https://shop.example.com', workers=1, batch_size=2)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.total, job.done), ('completed', 3, 3))
+        for table, old_name in zip(Table.objects.order_by('number'), old_names):
+            self.assertEqual(table.qr_base_url, 'https://shop.example.com')
+            self.assertNotEqual(table.qr_code.name, old_name)
+            self.assertTrue(self.storage.exists(table.qr_code.name))
+            self.assertFalse(self.storage.exists(old_name))
+        # One write for all tables
+        event = SyncEvent.objects.get()
+        self.assertEqual(event.path, 'tables')
+        self.assertEqual(set(event.payload), {str(table.id) for table in self.tables})
+
+    def test_start_returns_running_job(self):
+        running = QRRegenerationJob.objects.create(status='running')
+        job, started = qr_jobs.start()
+        self.assertFalse(started)
+        self.assertEqual(job, running)
+
+
+class QRSheetTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for number in range(1, 8):
+            Table.objects.create(number=number, description=f'Window ({number})')
+        self.client.force_login(User.objects.create_user('staff', password='password'))
+
+    def test_six_tables_per_page(self):
+        response = self.client.get(reverse('qr_sheet'))
+        self.assertFalse(response.is_async)
+        pdf = b''.join(response.streaming_content)
+        self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+        self.assertIn(b'/Count 2', pdf)
+
+        # Page content streams are the only streams without a /Type
+        pages = [
+            zlib.decompress(pdf[match.end():match.end() + int(match.group(1))]).decode('latin-1')
+            for match in re.finditer(rb'<< /Filter /FlateDecode /Length (\d+) >>\nstream\n', pdf)
+        ]
+        labels = [re.findall(r'\(Table (\d+)\) Tj', page) for page in pages]
+        self.assertEqual(labels, [['1', '2', '3', '4', '5', '6'], ['7']])
+        self.assertIn(r'(Window \(7\)) Tj', pages[1])
+
+    async def test_streamed_asynchronously_under_asgi(self):
+        await self.async_client.aforce_login(await User.objects.aget(username='staff'))
+        response = await self.async_client.get(reverse('qr_sheet'))
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        # A chunk per page, not one buffered document
+        self.assertGreater(len(chunks), 3)
+        self.assertTrue(chunks[-1].endswith(b'%%EOF\n'))
+
+    def test_xref_offsets_point_at_objects(self):
+        Table.objects.get(number=3).qr_code.delete(save=False)
+        pdf = b''.join(self.client.get(reverse('qr_sheet')).streaming_content)
+
+        startxref = int(re.search(rb'startxref\n(\d+)\n%%EOF\n$', pdf).group(1))
+        self.assertEqual(pdf[startxref:startxref + 5], b'xref\n')
+        entries = re.findall(rb'(\d{10}) 00000 n ', pdf[startxref:])
+        objects = {int(match.group(1)): match.start() for match in re.finditer(rb'(?m)^(\d+) 0 obj$', pdf)}
+        self.assertEqual(len(entries), len(objects))
+        for object_id, offset in enumerate(entries, start=1):
+            self.assertEqual(int(offset), objects[object_id])
+        # The table whose image file is gone is rendered again, so every cell has an image
+        self.assertEqual(pdf.count(b'/Subtype /Image'), 7)
+
+
+class ImageVariantTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+        self.ice_cream = IceCream.objects.create(name='Vanilla', price=Decimal('3.50'), image=self.photo('vanilla.jpg'))
+        self.storage = self.ice_cream.image.storage
+
+    def photo(self, name, size=(1600, 1200)):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+        buffer = BytesIO()
+        Image.new('RGB', size, (200, 120, 80)).save(buffer, 'JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def test_build_stores_variants_and_menu_uses_srcset(self):
+        version = catalog.get_menu_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            recorded = images.build(self.ice_cream)
+            # Not before commit: a concurrent request would cache the old row under the new version
+            self.assertEqual(catalog.get_menu_version(), version)
+
+        self.assertEqual([(entry['label'], entry['width'], entry['height']) for entry in recorded['variants']],
+                         [('thumb', 200, 150), ('card', 640, 480), ('full', 1280, 960)])
+        for entry in recorded['variants']:
+            self.assertTrue(self.storage.exists(entry['webp']))
+            self.assertTrue(self.storage.exists(entry['jpeg']))
+
+        html = catalog.get_menu()['html']
+        self.assertIn('<source type="image/webp" srcset="', html)
+        self.assertIn(f"{self.storage.url(recorded['variants'][1]['webp'])} 640w", html)
+        self.assertIn(f"{self.storage.url(recorded['variants'][2]['jpeg'])} 1280w", html)
+        self.assertIn('width="640" height="480"', html)
+
+    def test_new_image_replaces_variants_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            old = images.build(self.ice_cream)
+        # Captured, not run: the background build is done by hand below
+        with self.captureOnCommitCallbacks():
+            self.ice_cream.image = self.photo('vanilla-new.jpg', size=(300, 200))
+            self.ice_cream.save()
+        # Until the variants of the new image are built the menu falls back to the original
+        html = catalog.get_menu()['html']
+        self.assertIn(f'src="{self.ice_cream.image.url}"', html)
+        self.assertNotIn('srcset="', html)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            new = images.build(self.ice_cream)
+        self.assertEqual([entry['width'] for entry in new['variants']], [200, 300])
+        for entry in old['variants']:
+            self.assertFalse(self.storage.exists(entry['jpeg']))
+
+
+class AssetServingTests(TestCase):
+    def setUp(self):
+        from django.test import RequestFactory
+        self.factory = RequestFactory()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.data = b'function add(a, b) { return a + b; }\n' * 40
+        for name in ('app.0123456789ab.js', 'app.js'):
+            with open(os.path.join(self.root, name), 'wb') as f:
+                f.write(self.data)
+            assets.compress_file(os.path.join(self.root, name))
+
+    def serve(self, path, **headers):
+        return assets.serve(self.factory.get('/', headers=headers), path, self.root)
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_gzip_copy_for_clients_that_accept_it(self):
+        response = self.serve('app.0123456789ab.js', accept_encoding='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(self.body(response)), self.data)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['Content-Type'], 'text/javascript')
+
+        response = self.serve('app.0123456789ab.js', accept_encoding='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(self.body(response), self.data)
+
+    def test_brotli_preferred_when_present(self):
+        # Written by hand: the brotli package is optional
+        with open(os.path.join(self.root, 'app.js.br'), 'wb') as f:
+            f.write(b'brotli')
+        response = self.serve('app.js', accept_encoding='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(self.body(response), b'brotli')
+        self.assertEqual(self.serve('app.js', accept_encoding='gzip')['Content-Encoding'], 'gzip')
+
+    def test_only_hashed_names_are_immutable(self):
+        self.assertEqual(self.serve('app.0123456789ab.js')['Cache-Control'], assets.IMMUTABLE)
+        self.assertTrue(assets.is_immutable('qr_codes/qr-0123456789abcdef0123.png'))
+        self.assertTrue(assets.is_immutable('ice_cream_images/variants/vanilla-card-640.0123456789ab.webp'))
+        self.assertFalse(assets.is_immutable('ice_cream_images/vanilla.jpg'))
+        response = self.serve('app.js')
+        self.assertEqual(response['Cache-Control'], assets.REVALIDATE)
+        self.assertEqual(self.serve('app.js', if_none_match=response['ETag']).status_code, 304)
+
+    def test_paths_outside_root_are_not_served(self):
+        from django.http import Http404
+        with self.assertRaises(Http404):
+            self.serve('../etc/passwd')
+
+
+class SyncOutboxTests(TestCase):
+    def setUp(self):
+        from .sync_backends import MemoryBackend
+        self.backend = MemoryBackend()
+        self.backend.reset()
+
+    def event(self, path, payload=None, op='update'):
+        return SyncEvent(path=path, payload=payload, op=op)
+
+    def drain_due(self):
+        """Drain as if every backoff had run out"""
+        SyncEvent.objects.update(next_attempt_at=None)
+        return sync.drain(backend=self.backend)
+
+    def test_coalesce_merges_overlapping_paths(self):
+        updates = sync.coalesce([
+            self.event('orders/1/status', 'Paid', op='set'),
+            self.event('orders/1', {'status': 'Pending', 'table': 1}, op='set'),
+            self.event('orders/1/items', [{'name': 'Vanilla'}], op='set'),
+            self.event('orders/2', {'status': 'Paid'}),
+            self.event('orders/2/status', 'Completed', op='set'),
+        ])
+
+        self.assertEqual(updates, {
+            'orders/1': {'status': 'Pending', 'table': 1, 'items': [{'name': 'Vanilla'}]},
+            'orders/2/status': 'Completed',
+        })
+
+    def test_coalesce_delete_over_ancestor(self):
+        updates = sync.coalesce([
+            self.event('orders/1/status', 'Paid', op='set'),
+            self.event('orders/1/table', 3, op='set'),
+            self.event('orders/1', op='delete'),
+            self.event('tables/1', {'number': 1, 'token': 'a'}, op='set'),
+            self.event('tables/1/token', op='delete'),
+        ])
+
+        self.assertEqual(updates, {'orders/1': None, 'tables/1': {'number': 1}})
+
+    def test_failed_batch_backs_off_and_retries_oldest_alone(self):
+        first = sync.enqueue('orders/1', {'status': 'Paid'})
+        sync.enqueue('orders/2', {'status': 'Paid'})
+
+        with mock.patch.object(self.backend, 'update', side_effect=ConnectionError('offline')):
+            with self.assertRaises(ConnectionError):
+                sync.drain(backend=self.backend)
+        first.refresh_from_db()
+        self.assertEqual((first.attempts, first.last_error), (1, 'offline'))
+        self.assertGreater(first.next_attempt_at, timezone.now())
+        self.assertEqual(SyncEvent.objects.filter(attempts=0).count(), 1)
+        # Still backing off
+        self.assertEqual(sync.drain(backend=self.backend), 0)
+
+        self.assertEqual(self.drain_due(), 1)
+        self.assertEqual(self.backend.get('orders/1/status'), 'Paid')
+        self.assertEqual(sync.drain(backend=self.backend), 1)
+        self.assertEqual(SyncEvent.objects.count(), 0)
+
+    def test_rejected_event_is_set_aside(self):
+        sync.enqueue('orders/1', {'status': 'Paid'})
+        sync.enqueue('orders/2', {'bad.key': 1})
+        sync.enqueue('orders/3', {'status': 'Paid'})
+
+        delivered = 0
+        for _ in range(sync.MAX_ATTEMPTS + 3):
+            try:
+                delivered += self.drain_due()
+            except ValueError:
+                pass
+
+        self.assertEqual(delivered, 2)
+        self.assertEqual(self.backend.get('orders/3/status'), 'Paid')
+        failed = SyncEvent.objects.get()
+        self.assertEqual((failed.path, failed.status, failed.attempts), ('orders/2', 'failed', sync.MAX_ATTEMPTS))
+        self.assertEqual((sync.outbox_stats()['pending'], sync.outbox_stats()['failed']), (0, 1))
+
+        self.assertEqual(sync.retry_failed(), 1)
+        self.assertEqual(SyncEvent.objects.get().attempts, 0)
+
+
+class CreateOrderTests(TestCase):
+    def setUp(self):
+        self.table = Table.objects.bulk_create([Table(number=1, qr_code='qr_codes/table_1.png')])[0]
+        self.vanilla = IceCream.objects.create(name='Vanilla', price=Decimal('50.00'), image='ice_creams/vanilla.png')
+        self.mango = IceCream.objects.create(name='Mango', price=Decimal('70.00'), image='ice_creams/mango.png')
+
+    def create(self, items):
+        from .orders import create_order
+        return create_order(self.table, 'a@example.com', 'A', items)
+
+    def test_stores_totals_and_merges_duplicate_ids(self):
+        order, order_data = self.create([
+            {'id': self.vanilla.id, 'quantity': 1},
+            {'id': str(self.mango.id), 'quantity': '2'},
+            {'id': self.vanilla.id, 'quantity': 2},
+        ])
+
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.total_amount, order.item_count), ('draft', Decimal('290.00'), 5))
+        self.assertEqual(
+            sorted(order.items.values_list('ice_cream_id', 'quantity', 'unit_price')),
+            sorted([(self.vanilla.id, 3, Decimal('50.00')), (self.mango.id, 2, Decimal('70.00'))]),
+        )
+        self.assertEqual(order_data['total_amount'], 290.0)
+        self.assertEqual(SyncEvent.objects.get(path=f'orders/{order.id}').op, 'set')
+
+    def test_missing_ice_cream_is_404_and_writes_nothing(self):
+        from django.http import Http404
+        with self.assertRaisesMessage(Http404, 'Ice cream(s) not found: 999'):
+            self.create([{'id': self.vanilla.id, 'quantity': 1}, {'id': 999, 'quantity': 1}])
+
+        self.assertFalse(Order.objects.exists())
+        session = self.client.session
+        session.update({'customer_email': 'a@example.com', 'email_verified': True})
+        session.save()
+        response = self.client.post(reverse('submit_order'), {'table_id': self.table.id, 'items': [{'id': 999, 'quantity': 1}]},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_item_writes_keep_totals_in_sync(self):
+        order, _ = self.create([{'id': self.vanilla.id, 'quantity': 1}])
+        item = OrderItem.objects.create(order=order, ice_cream=self.mango, quantity=2)
+        order.refresh_from_db()
+        self.assertEqual((order.total_amount, order.item_count), (Decimal('190.00'), 3))
+
+        item.quantity = 1
+        item.save()
+        order.refresh_from_db()
+        self.assertEqual((order.total_amount, order.item_count), (Decimal('120.00'), 2))
+
+        item.delete()
+        order.refresh_from_db()
+        self.assertEqual((order.total_amount, order.item_count), (Decimal('50.00'), 1))
+
+    def test_backfill_repairs_stale_totals(self):
+        from django.core.management import call_command
+        order, _ = self.create([{'id': self.vanilla.id, 'quantity': 2}])
+        Order.objects.filter(pk=order.pk).update(total_amount=0, item_count=0)
+
+        call_command('backfill_order_totals', stdout=StringIO())
+        order.refresh_from_db()
+        self.assertEqual((order.total_amount, order.item_count), (Decimal('100.00'), 2))
+
+
+class OrderChangesTests(TestCase):
+    def setUp(self):
+        self.table = Table.objects.bulk_create([Table(number=1, qr_code='qr_codes/table_1.png')])[0]
+        self.stamp = timezone.now() - timedelta(minutes=10)
+
+    def add_orders(self, count, updated_at=None):
+        orders = [Order.objects.create(table=self.table) for _ in range(count)]
+        Order.objects.filter(id__in=[order.id for order in orders]).update(updated_at=updated_at or self.stamp)
+        return [order.id for order in orders]
+
+    def changes(self, since, limit=20):
+        from .orders import order_changes
+        return order_changes(since=since, limit=limit)
+
+    def test_reset_without_cursor_or_with_expired_cursor(self):
+        from .orders import TOMBSTONE_RETENTION
+        ids = self.add_orders(2)
+
+        first = self.changes(None)
+        self.assertTrue(first['reset'])
+        self.assertEqual(sorted(order.id for order in first['orders']), ids)
+
+        expired = (timezone.now() - TOMBSTONE_RETENTION - timedelta(minutes=1), 0)
+        self.assertTrue(self.changes(expired)['reset'])
+
+    def clear_all_orders(self):
+        self.client.force_login(User.objects.get_or_create(username='staff')[0])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('clear_all_orders'))
+        self.assertEqual(response.json()['status'], 'success')
+        return len(queries)
+
+    def test_clear_all_sends_a_snapshot_instead_of_tombstones(self):
+        from .orders import ALL_ORDERS
+        self.add_orders(2)
+        cursor = self.changes(None)['cursor']
+        few = self.clear_all_orders()
+        self.add_orders(20)
+        many = self.clear_all_orders()
+
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(many, few)
+        self.assertEqual(list(OrderTombstone.objects.values_list('order_id', flat=True)), [ALL_ORDERS])
+        kept = self.add_orders(1, updated_at=timezone.now())
+        changes = self.changes(cursor)
+        self.assertTrue(changes['reset'])
+        self.assertEqual([order.id for order in changes['orders']], kept)
+
+    def test_delta_returns_changed_orders_and_tombstones(self):
+        first, second = self.add_orders(2)
+        cursor = self.changes(None)['cursor']
+        self.assertEqual(self.changes(cursor)['orders'], [])
+
+        Order.objects.get(id=first).delete()
+        Order.objects.filter(id=second).update(status='paid', updated_at=timezone.now())
+        changes = self.changes(cursor)
+
+        self.assertFalse(changes['reset'])
+        self.assertEqual([order.id for order in changes['orders']], [second])
+        self.assertEqual(changes['deleted'], [first])
+
+    def test_late_commit_behind_cursor_is_delivered(self):
+        cursor = self.changes(None)['cursor']
+        # Stamped before the poll above, but only visible after it
+        late = self.add_orders(1, updated_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual([order.id for order in self.changes(cursor)['orders']], late)
+
+    def test_paging_through_equal_timestamps_skips_nothing(self):
+        ids = self.add_orders(5)
+        cursor = (self.stamp - timedelta(seconds=1), 0)
+        seen = []
+        for _ in range(5):
+            changes = self.changes(cursor, limit=2)
+            seen += [order.id for order in changes['orders']]
+            cursor = changes['cursor']
+            if not changes['has_more']:
+                break
+
+        self.assertEqual(seen, ids)
+        self.assertEqual(self.changes(cursor)['orders'], [])
+
+    def test_view_round_trips_cursor(self):
+        from .orders import format_cursor
+        self.client.force_login(User.objects.create_user('staff', password='password'))
+        ids = self.add_orders(3)
+        since = format_cursor((self.stamp - timedelta(seconds=1), 0))
+
+        data = self.client.get(reverse('get_orders_json'), {'since': since}).json()
+        self.assertEqual([order['id'] for order in data['orders']], ids)
+        data = self.client.get(reverse('get_orders_json'), {'since': data['cursor']}).json()
+        self.assertEqual(data['orders'], [])
+        self.assertEqual(self.client.get(reverse('get_orders_json'), {'since': 'yesterday'}).status_code, 400)
+
+
+class PaymentStatusStreamTests(TestCase):
+    def setUp(self):
+        table = Table.objects.bulk_create([Table(number=1, qr_code='qr_codes/table_1.png')])[0]
+        self.order = Order.objects.create(table=table, status='completed', payment_status='completed')
+        self.url = reverse('payment_status_stream', args=[self.order.id])
+
+    async def test_stream_sends_status_over_asgi(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = [chunk async for chunk in response.streaming_content]
+
+        # A final status ends the stream after the snapshot
+        self.assertEqual(chunks[0], b'retry: 3000\n')
+        self.assertTrue(chunks[1].startswith(b'event: status\ndata: '))
+        payload = json.loads(chunks[1].split(b'data: ', 1)[1])
+        self.assertEqual((payload['order_id'], payload['payment_status']), (self.order.id, 'completed'))
+
+    async def test_missing_order(self):
+        response = await self.async_client.get(reverse('payment_status_stream', args=[self.order.id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_wsgi_is_told_to_poll(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(response.streaming)
+
+
+class DashboardStreamTests(TestCase):
+    def setUp(self):
+        self.table = Table.objects.bulk_create([Table(number=1, qr_code='qr_codes/table_1.png')])[0]
+
+    def collect(self, **kwargs):
+        async def run():
+            return [chunk async for chunk in events.sse_stream(['tests'], 'order', **kwargs)]
+        return asyncio.run(run())
+
+    def test_replay_sends_changes_since_cursor(self):
+        from .orders import format_cursor
+        from .views import _dashboard_replay
+        kept, deleted = (Order.objects.create(table=self.table, status='paid') for _ in range(2))
+        since = format_cursor((timezone.now() - timedelta(minutes=1), 0))
+        deleted_id = deleted.id
+        deleted.delete()
+
+        messages = _dashboard_replay(since)
+        self.assertEqual(messages[0], {'event': 'order.deleted', 'order_id': deleted_id})
+        self.assertEqual([(m['event'], m['order_id'], m['status']) for m in messages[1:]], [('order.updated', kept.id, 'paid')])
+        self.assertIn(f'data-order-id="{kept.id}"', messages[1]['html'])
+
+    def test_replay_asks_for_reload_when_too_far_behind(self):
+        from .orders import TOMBSTONE_RETENTION, format_cursor
+        from .views import _dashboard_replay
+        expired = format_cursor((timezone.now() - TOMBSTONE_RETENTION - timedelta(minutes=1), 0))
+
+        self.assertEqual(_dashboard_replay(expired), [{'event': 'orders.reset'}])
+        self.assertEqual(_dashboard_replay('garbage'), [{'event': 'orders.reset'}])
+
+    def test_stream_events_and_keepalives_carry_ids(self):
+        async def replay():
+            return [{'event': 'order.deleted', 'order_id': 1}]
+
+        chunks = self.collect(replay=replay, event_id=lambda: 'cursor', keepalive=0.01, max_seconds=0.03)
+        self.assertEqual(chunks[1], 'id: cursor\nevent: order\ndata: {"event": "order.deleted", "order_id": 1}\n\n')
+        self.assertTrue(chunks[2].startswith('id: cursor\n: keepalive'))
+
+    def test_wsgi_dashboard_falls_back_to_refresh(self):
+        self.client.force_login(User.objects.create_user('staff', password='password'))
+        self.assertEqual(self.client.get(reverse('dashboard_stream')).status_code, 204)
+        self.assertContains(self.client.get(reverse('admin_dashboard')), 'setInterval(refreshIfNotLive, 30000)')
+
+    async def test_asgi_dashboard_streams(self):
+        user = await User.objects.acreate(username='staff')
+        await self.async_client.aforce_login(user)
+        response = await self.async_client.get(reverse('dashboard_stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n')
+        await stream.aclose()
+
+    def test_dashboard_page_passes_its_cursor_to_the_stream(self):
+        from .orders import parse_cursor
+        self.client.force_login(User.objects.create_user('staff', password='password'))
+        response = self.client.get(reverse('admin_dashboard'))
+
+        parse_cursor(response.context['stream_cursor'])
+        self.assertContains(response, reverse('dashboard_stream') + '?since=')
+
+
+class MailWorkerTests(TestCase):
+    def setUp(self):
+        from . import mail as mail_queue
+        table = Table.objects.bulk_create([Table(number=1, qr_code='qr_codes/table_1.png')])[0]
+        self.order = Order.objects.create(table=table, status='paid', customer_email='a@example.com')
+        mail_queue.queue_verification_email('a@example.com', 'A', '123456')
+        mail_queue.queue_verification_email('b@example.com', 'B', '654321')
+        mail_queue.queue_payment_confirmation_email(self.order)
+
+    def test_worker_sends_queued_jobs_over_one_connection(self):
+        from django.core import mail
+        from django.core.mail.backends.locmem import EmailBackend
+        from django.core.management import call_command
+        with mock.patch.object(EmailBackend, 'send_messages', autospec=True,
+                               side_effect=EmailBackend.send_messages) as send_messages:
+            call_command('mail_worker', '--once', stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(len({id(call.args[0]) for call in send_messages.call_args_list}), 1)
+        self.assertEqual(mail.outbox[2].subject, f'Payment Confirmed - Order #{self.order.id}')
+        self.assertFalse(MailJob.objects.exclude(status='sent').exists())
+
+    def test_failing_job_backs_off_then_fails(self):
+        from django.core import mail
+        from . import mail as mail_queue
+        broken = MailJob.objects.create(kind='refund', recipient='c@example.com', context={'refund_id': 999})
+
+        self.assertEqual(mail_queue.send_pending(), (3, 1))
+        broken.refresh_from_db()
+        self.assertEqual((broken.status, broken.attempts), ('pending', 1))
+        self.assertEqual(mail_queue.send_pending(), (0, 0))
+
+        for _ in range(mail_queue.MAX_ATTEMPTS):
+            MailJob.objects.filter(pk=broken.pk).update(next_attempt_at=None)
+            mail_queue.send_pending()
+        broken.refresh_from_db()
+        self.assertEqual((broken.status, broken.attempts), ('failed', mail_queue.MAX_ATTEMPTS))
+        self.assertEqual(len(mail.outbox), 3)
+
+
+class ExplainOrderQueriesTests(TestCase):
+    def index_names(self):
+        with connection.cursor() as cursor:
+            return set(connection.introspection.get_constraints(cursor, 'qr_ordering_order'))
+
+    def test_plans_use_the_indexes_and_keep_them(self):
+        from django.core.management import call_command
+        from .management.commands.explain_order_queries import QUERY_INDEXES
+        table = Table.objects.bulk_create([Table(number=1, qr_code='qr_codes/table_1.png')])[0]
+        Order.objects.create(table=table, status='paid')
+        out = StringIO()
+
+        call_command('explain_order_queries', '--repeat', '1', stdout=out)
+        before, after = out.getvalue().split('AFTER')
+        self.assertNotIn('order_table_created_idx', before)
+        self.assertIn('order_table_created_idx', after)
+        self.assertIn('order_status_created_idx', after)
+        # The indexes were only dropped inside a rolled back transaction
+        self.assertTrue({name for name in QUERY_INDEXES if name.startswith('order_')} <= self.index_names())
+
+
+class ReconcileTests(TestCase):
+    def setUp(self):
+        from .sync_backends import MemoryBackend
+        self.backend = MemoryBackend()
+        self.backend.reset()
+        ice_cream = IceCream.objects.create(name='Vanilla', price=Decimal('50.00'), image='ice_creams/vanilla.png')
+        self.tables = Table.objects.bulk_create([
+            Table(number=number, qr_code=f'qr_codes/table_{number}.png') for number in (1, 2)
+        ])
+        self.order = Order.objects.create(table=self.tables[0], status='paid', total_amount=Decimal('100.00'))
+        OrderItem.objects.create(order=self.order, ice_cream=ice_cream, quantity=2)
+        SyncEvent.objects.all().delete()
+
+    def reconcile(self, **kwargs):
+        from .reconcile import reconcile
+        return reconcile(backend=self.backend, **kwargs)
+
+    def test_pushes_only_differing_nodes(self):
+        first = self.reconcile(batch_size=2)
+        self.assertEqual(first['paths'], 4)
+        self.assertEqual(first['writes'], 2)
+        self.assertEqual(self.reconcile()['paths'], 0)
+
+        table_id = self.tables[1].id
+        self.backend.update({
+            f'orders/{self.order.id}/status': 'Cancelled',
+            f'tables/{table_id}': None,
+            'products/999': {'name': 'Stale'},
+        })
+        writes = self.backend.write_count
+
+        report = self.reconcile()
+        self.assertEqual(report['roots']['orders']['changed'], 1)
+        self.assertEqual(report['roots']['tables']['added'], 1)
+        self.assertEqual(report['roots']['products']['deleted'], 1)
+        self.assertEqual((report['paths'], report['writes']), (3, 1))
+        self.assertEqual(self.backend.write_count, writes + 1)
+        self.assertEqual(self.backend.get(f'orders/{self.order.id}/status'), 'Paid')
+        self.assertIsNone(self.backend.get('products/999'))
+        self.assertEqual(self.reconcile()['paths'], 0)
+
+    def test_dry_run_writes_nothing(self):
+        report = self.reconcile(dry_run=True)
+
+        self.assertEqual(report['paths'], 4)
+        self.assertGreater(report['bytes'], 0)
+        self.assertEqual(self.backend.write_count, 0)
+        self.assertIsNone(self.backend.get('orders'))
+
+
+@override_settings(QUERY_BUDGET_MODE='raise', DASHBOARD_CACHE_TTL=0)
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        query_budget.reset()
+        self.staff = User.objects.create_user('staff', is_staff=True)
+        flavors = IceCream.objects.bulk_create([
+            IceCream(name=f'Flavor {number}', price=Decimal('50.00'), image=f'ice_creams/{number}.png')
+            for number in range(3)
+        ])
+        tables = Table.objects.bulk_create([
+            Table(number=number, qr_code=f'qr_codes/table_{number}.png') for number in range(1, 4)
+        ])
+        for number in range(12):
+            order = Order.objects.create(table=tables[number % 3], status='paid', customer_email='a@example.com')
+            for flavor in flavors:
+                OrderItem.objects.create(order=order, ice_cream=flavor, quantity=1)
+            Refund.objects.create(order=order, customer_name='A', customer_email='a@example.com',
+                                  refund_amount=Decimal('10.00'), refund_reason='Melted')
+        self.order = order
+
+    def test_shape_collapses_literals_and_in_lists(self):
+        self.assertEqual(
+            query_budget.shape("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            query_budget.shape('SELECT *  FROM t WHERE id IN (%s) AND name = %s LIMIT 1'),
+        )
+
+    def test_list_views_stay_within_budget(self):
+        # Raises QueryBudgetExceeded on an N+1 over the rows
+        self.client.post(reverse('customer_orders'), {'email': 'a@example.com'})
+        self.client.get(reverse('order_status', args=[self.order.id]))
+        self.client.force_login(self.staff)
+        for name in ('admin_dashboard', 'admin_dashboard_simple', 'refund_list', 'get_orders_json'):
+            self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+        self.assertEqual(self.client.get(reverse('order_details', args=[self.order.id])).status_code, 200)
+
+    def test_exceeding_budget_raises_or_warns(self):
+        url = reverse('check_payment_status', args=[self.order.id])
+        with override_settings(QUERY_BUDGETS={'check_payment_status': 0}):
+            with self.assertRaises(query_budget.QueryBudgetExceeded):
+                self.client.get(url)
+            with override_settings(QUERY_BUDGET_MODE='warn'):
+                with self.assertWarns(query_budget.QueryBudgetWarning):
+                    self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_stats_page_is_staff_only(self):
+        self.client.get(reverse('check_payment_status', args=[self.order.id]))
+        self.assertEqual(query_budget.summary()[0]['endpoint'], 'check_payment_status')
+
+        self.client.force_login(User.objects.create_user('customer'))
+        self.assertEqual(self.client.get(reverse('query_stats')).status_code, 302)
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('query_stats'))
+        self.assertContains(response, 'check_payment_status')
+
+
+class LoadTestTests(TestCase):
+    def test_percentiles_and_summary(self):
+        self.assertEqual(loadtest.percentile(list(range(1, 101)), 0.95), 95)
+        self.assertIsNone(loadtest.percentile([], 0.5))
+        self.assertEqual(loadtest.summarize([], 1), {'requests': 0})
+        summary = loadtest.summarize([(0.010, 3, 0.002, 200), (0.030, 5, 0.004, 500)], 2)
+        self.assertEqual((summary['requests'], summary['errors'], summary['throughput_rps']), (2, 1, 1.0))
+        self.assertEqual((summary['p50_ms'], summary['p99_ms'], summary['queries_mean'], summary['queries_max']), (10.0, 30.0, 4.0, 5))
+
+    def test_small_rush(self):
+        # The rush creates and drops its own file database, so it runs in another process
+        from django.conf import settings
+        from . import views
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        output = os.path.join(directory, 'results.json')
+        command = [
+            sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'load_test', '--tables', '2', '--flavors', '3',
+            '--customers', '6', '--concurrency', '2', '--staff', '1', '--seed', '1', '--output', output,
+        ]
+        # Over-budget requests fail, and count as errors
+        process = subprocess.run(command, cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=300,
+                                 env={**os.environ, 'QUERY_BUDGET_MODE': 'raise'})
+        self.assertEqual(process.returncode, 0, process.stderr[-2000:])
+        self.assertIn('verify_payment', process.stdout)
+
+        results = loadtest.load(output)
+        self.assertEqual(set(results), {'commit', 'created_at', 'config', 'seconds', 'total', 'endpoints'})
+        self.assertEqual(results['config']['customers'], 6)
+        self.assertEqual(set(results['endpoints']), set(loadtest.ENDPOINTS))
+        requests = {name: row['requests'] for name, row in results['endpoints'].items()}
+        self.assertEqual({name: count for name, count in requests.items() if name != 'admin_dashboard'}, {
+            'order_page': 6, 'submit_order': 6, 'check_payment_status': 12, 'verify_payment': 6,
+            'update_order_status': 12,
+        })
+        self.assertGreater(requests['admin_dashboard'], 0)
+        self.assertEqual(results['total']['requests'], sum(requests.values()))
+        for name, row in results['endpoints'].items():
+            self.assertEqual(row['errors'], 0, name)
+            self.assertLessEqual(row['p50_ms'], row['p95_ms'])
+            self.assertLessEqual(row['p95_ms'], row['p99_ms'])
+            self.assertLessEqual(row['p99_ms'], row['max_ms'])
+            self.assertGreater(row['queries_mean'], 0)
+            self.assertLessEqual(row['queries_max'], getattr(views, name).query_budget[0], name)
+
+        baseline = json.loads(json.dumps(results))
+        baseline['endpoints']['order_page']['p50_ms'] = results['endpoints']['order_page']['p50_ms'] * 2
+        baseline['endpoints']['verify_payment'] = {'requests': 0}
+        changes = loadtest.compare(baseline, results)
+        self.assertEqual(changes['order_page']['p50_ms'][2], -50.0)
+        self.assertEqual(changes['total']['queries_mean'], (results['total']['queries_mean'],) * 2 + (0.0,))
+        # Endpoints missing from either run are left out
+        self.assertNotIn('verify_payment', changes)
+        self.assertEqual(set(changes['submit_order']), set(loadtest.COMPARED))
@@ -12,6 +12,7 @@ urlpatterns = [
     path('order/success/', views.order_success, name='order_success'),
     path('payment/verify/', views.verify_payment, name='verify_payment'),
     path('payment/status/<int:order_id>/', views.check_payment_status, name='check_payment_status'),
+    path('payment/stream/<int:order_id>/', views.payment_status_stream, name='payment_status_stream'),
     path('debug/login/', views.debug_login, name='debug_login'),
     path('api/orders/', views.get_orders_json, name='get_orders_json'),
     path('panel/dashboard/simple/', views.admin_dashboard_simple, name='admin_dashboard_simple'),
@@ -24,11 +25,15 @@ urlpatterns = [
     path('panel/login/', views.admin_login, name='admin_login'),
     path('panel/logout/', views.admin_logout, name='admin_logout'),
     path('panel/dashboard/', views.admin_dashboard, name='admin_dashboard'),
+    path('panel/dashboard/stream/', views.dashboard_stream, name='dashboard_stream'),
     path('panel/analytics/', views.admin_analytics, name='admin_analytics'),
     path('panel/settings/', views.admin_settings, name='admin_settings'),
     path('panel/order/<int:order_id>/update/', views.update_order_status, name='update_order_status'),
     path('panel/order/<int:order_id>/details/', views.order_details, name='order_details'),
     path('panel/orders/clear/', views.clear_all_orders, name='clear_all_orders'),
+    path('panel/sync/status/', views.sync_status, name='sync_status'),
+    path('panel/cache/status/', views.cache_status, name='cache_status'),
+    path('panel/queries/', views.query_stats, name='query_stats'),
     path('panel/order/<int:order_id>/delete/', views.delete_order, name='delete_order'),
     
     # Ice Cream Management
@@ -41,6 +46,9 @@ urlpatterns = [
     path('panel/tables/', views.manage_tables, name='manage_tables'),
     path('panel/tables/add/', views.add_table, name='add_table'),
     path('panel/tables/edit/<int:pk>/', views.edit_table, name='edit_table'),
+    path('panel/tables/qr/regenerate-all/', views.regenerate_all_qr, name='regenerate_all_qr'),
+    path('panel/tables/qr/regenerate-all/<int:job_id>/', views.qr_regeneration_status, name='qr_regeneration_status'),
+    path('panel/tables/qr/sheet.pdf', views.qr_sheet, name='qr_sheet'),
     path('panel/tables/delete/<int:pk>/', views.delete_table, name='delete_table'),
     
     # Refund Management
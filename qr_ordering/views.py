@@ -4,56 +4,51 @@ from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth import authenticate, login, logout
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from .models import IceCream, Table, Order, OrderItem, Refund, EmailVerification
+from .models import IceCream, Table, Order, OrderItem, Refund, EmailVerification, QRRegenerationJob
 from .forms import IceCreamForm, TableForm, RefundForm
+from .mail import queue_verification_email, queue_payment_confirmation_email, queue_refund_email
+from .catalog import get_menu
+from .shop import upi_merchant
+from .events import DASHBOARD_CHANNEL, dashboard_payload, order_status_payload, publish_order_status, publish_dashboard_event, sse_response, sse_stream, sse_unavailable, streaming_supported
+from .orders import clear_all, create_order, current_cursor, format_cursor, order_changes, parse_cursor
+from . import dates, microcache, qr_jobs, reports, rollups, stats
+from .query_budget import query_budget
+from .sync import enqueue, outbox_stats
+from asgiref.sync import sync_to_async
 from django.http import JsonResponse
 import json
 from django.contrib.auth.decorators import login_required
-from firebase_admin import db
+from django.contrib.admin.views.decorators import staff_member_required
 from django.urls import reverse
 from django.utils import timezone
-from django.db.models import Count, Sum, F
-from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import Count, Sum
 from django.template.loader import render_to_string
-from django.utils.html import strip_tags
 from django.conf import settings
 import random
 import string
 from datetime import timedelta
 
 
+@query_budget(6)
 def order_page(request, token):
     from django.conf import settings
     
     table = get_object_or_404(Table, token=token)
     
-    # Get all ice creams and handle missing images gracefully
-    ice_creams = IceCream.objects.all()
-    
-    # Filter out ice creams with missing or invalid images
-    valid_ice_creams = []
-    for ice_cream in ice_creams:
-        try:
-            # Try to access the image URL to check if it exists
-            if ice_cream.image and ice_cream.image.url:
-                valid_ice_creams.append(ice_cream)
-            else:
-                # Ice cream without image - still include it, template will handle placeholder
-                valid_ice_creams.append(ice_cream)
-        except (ValueError, AttributeError):
-            # Image field exists but file is missing - still include it
-            valid_ice_creams.append(ice_cream)
+    # Menu (serialized items and rendered fragment) comes from the catalog cache
+    menu = get_menu()
     
     customer_name = request.session.get('customer_name')
     customer_picture = request.session.get('customer_picture')
     
-    # Get UPI settings from environment
-    upi_merchant_id = os.environ.get('UPI_MERCHANT_ID', 'your-upi-id@bank')
-    upi_merchant_name = os.environ.get('UPI_MERCHANT_NAME', 'Your Shop Name')
+    # UPI details from shop settings (cached, no query on a warm worker)
+    upi_merchant_id, upi_merchant_name = upi_merchant()
     
     return render(request, 'order_page.html', {
         'table': table,
-        'ice_creams': valid_ice_creams,
+        'ice_creams': menu['items'],
+        'menu_html': menu['html'],
         'customer_name': customer_name,
         'customer_picture': customer_picture,
         'customer_email': request.session.get('customer_email', ''),
@@ -61,6 +56,15 @@ def order_page(request, token):
         'razorpay_key': getattr(settings, 'RAZORPAY_KEY_ID', ''),
         'upi_merchant_id': upi_merchant_id,
         'upi_merchant_name': upi_merchant_name,
+        # Read by the cached static/qr_ordering/js/order_page.js
+        'order_page_config': {
+            'submitOrderUrl': reverse('submit_order'),
+            'tableId': str(table.id),
+            'tableNumber': table.number,
+            'razorpayKey': getattr(settings, 'RAZORPAY_KEY_ID', ''),
+            'upiMerchantId': upi_merchant_id,
+            'upiMerchantName': upi_merchant_name,
+        },
     })
 from django.views.decorators.csrf import csrf_exempt
 import requests
@@ -117,9 +121,9 @@ def customer_google_login(request):
         
         print(f"DEBUG: Created verification record - Email: {email}, Code: {verification_code}")
         
-        # Send verification email
+        # Queue verification email
         try:
-            send_verification_email(email, name, verification.verification_code)
+            queue_verification_email(email, name, verification.verification_code)
             
             # Store in session (but mark as unverified)
             request.session['customer_name'] = name
@@ -144,35 +148,6 @@ def generate_verification_code():
     """Generate a 6-digit verification code"""
     return ''.join(random.choices(string.digits, k=6))
 
-def send_verification_email(email, name, code):
-    """Send email verification code"""
-    subject = 'Verify Your Email - Ice Cream Shop'
-    
-    html_message = render_to_string('emails/email_verification.html', {
-        'name': name,
-        'code': code,
-    })
-    
-    plain_message = f"""
-    Hi {name},
-    
-    Your verification code is: {code}
-    
-    This code will expire in 10 minutes.
-    
-    Thank you,
-    Ice Cream Shop
-    """
-    
-    send_mail(
-        subject=subject,
-        message=plain_message,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=[email],
-        html_message=html_message,
-        fail_silently=False,
-    )
-
 @csrf_exempt
 def verify_email(request):
     if request.method == 'POST':
@@ -277,9 +252,9 @@ def resend_verification(request):
             verification.created_at = timezone.now()  # Update created_at for rate limiting
             verification.save()
             
-            # Send new verification email
+            # Queue new verification email
             name = request.session.get('customer_name', 'Customer')
-            send_verification_email(email, name, verification.verification_code)
+            queue_verification_email(email, name, verification.verification_code)
             
             return JsonResponse({'success': True, 'message': 'Verification code resent'})
             
@@ -290,6 +265,7 @@ def resend_verification(request):
     
     return JsonResponse({'success': False, 'error': 'Invalid request'}, status=400)
 
+@query_budget(10)
 def submit_order(request):
     if request.method == 'POST':
         data = json.loads(request.body)
@@ -309,47 +285,15 @@ def submit_order(request):
 
         table = get_object_or_404(Table, id=table_id)
         
-        # Create order with customer details (draft status until payment confirmed)
-        order = Order.objects.create(
-            table=table,
-            customer_email=customer_email,
-            customer_name=customer_name,
-            status='draft'  # Draft status until payment is confirmed
-        )
-        
-        for item in items:
-            ice_cream = get_object_or_404(IceCream, id=item['id'])
-            OrderItem.objects.create(
-                order=order,
-                ice_cream=ice_cream,
-                quantity=item['quantity']
-            )
-        
-        # Prepare order payload for Firebase and status URL
-        order_data = {
-            'id': order.id,
-            'table': order.table.number,
-            'customer_email': order.customer_email,
-            'customer_name': order.customer_name,
-            'status': order.get_status_display(),
-            'payment_status': order.get_payment_status_display(),
-            'created_at': order.created_at.isoformat(),
-            'total_amount': float(order.get_total_amount()),
-            'items': [{'quantity': item.quantity, 'name': item.ice_cream.name, 'price': float(item.ice_cream.price)} for item in order.items.all()]
-        }
+        # Create order and items in one transaction (draft status until payment confirmed)
+        order, order_data = create_order(table, customer_email, customer_name, items)
         status_url = reverse('order_status', kwargs={'order_id': order.id})
         
-        try:
-            db.reference(f'orders/{order.id}').set(order_data)
-            print(f"Order {order.id} synced to Firebase successfully")
-        except Exception as e:
-            print(f'Firebase error for order {order.id}: {e}')
-            # Continue without Firebase - order is still saved in Django database
-        
         return JsonResponse({'status': 'success', 'order_id': order.id, 'status_url': status_url})
     return JsonResponse({'status': 'error'}, status=400)
 
 @csrf_exempt
+@query_budget(14)
 def verify_payment(request):
     """Verify payment status - called by payment gateway webhook or polling"""
     if request.method == 'POST':
@@ -367,23 +311,17 @@ def verify_payment(request):
             order.payment_reference = payment_reference
             order.payment_method = payment_method
             order.paid_at = timezone.now()
-            order.save()
-            
-            # Send payment confirmation email
-            try:
-                send_payment_confirmation_email(order)
-            except Exception as e:
-                print(f"Failed to send payment confirmation email: {e}")
-            
-            # Update Firebase
-            try:
-                db.reference(f'orders/{order.id}').update({
+            with transaction.atomic():
+                order.save()
+                # Queue Firebase update in the same transaction
+                enqueue(f'orders/{order.id}', {
                     'status': order.get_status_display(),
                     'payment_status': order.get_payment_status_display(),
                     'paid_at': order.paid_at.isoformat() if order.paid_at else None
                 })
-            except Exception as e:
-                print(f'Firebase update error for order {order.id}: {e}')
+                # Queue payment confirmation email
+                queue_payment_confirmation_email(order)
+                publish_order_status(order)
             
             return JsonResponse({'status': 'success', 'message': 'Payment verified'})
             
@@ -394,6 +332,7 @@ def verify_payment(request):
     
     return JsonResponse({'status': 'error', 'error': 'Invalid request'}, status=400)
 
+@query_budget(6)
 def customer_orders(request):
     """Customer order lookup for refunds - only shows paid orders"""
     if request.method == 'POST':
@@ -403,7 +342,7 @@ def customer_orders(request):
             orders = Order.objects.filter(
                 customer_email=email,
                 status__in=['paid', 'in_progress', 'completed']  # Exclude draft orders
-            ).order_by('-created_at')
+            ).select_related('table').prefetch_related('items__ice_cream').order_by('-created_at')
             return render(request, 'customer_orders.html', {
                 'orders': orders,
                 'email': email
@@ -423,7 +362,7 @@ def customer_refund_request(request, order_id):
         # Create refund request
         refund = Refund.objects.create(
             order=order,
-            refund_amount=order.get_total_amount(),
+            refund_amount=order.total_amount,
             customer_email=order.customer_email,
             customer_name=order.customer_name,
             refund_reason=request.POST.get('reason', 'Customer requested refund'),
@@ -459,6 +398,7 @@ def debug_login(request):
     
     return JsonResponse({'success': False, 'error': 'Invalid request'}, status=400)
 
+@query_budget(2)
 def check_payment_status(request, order_id):
     """Check payment status for an order"""
     try:
@@ -472,53 +412,111 @@ def check_payment_status(request, order_id):
     except Order.DoesNotExist:
         return JsonResponse({'status': 'error', 'error': 'Order not found'}, status=404)
 
-def send_payment_confirmation_email(order):
-    """Send payment confirmation email to customer"""
-    subject = f'Payment Confirmed - Order #{order.id}'
-    
-    html_message = render_to_string('emails/payment_confirmation.html', {
-        'order': order,
-        'items': order.items.all(),
-        'total': order.get_total_amount(),
-    })
-    
-    plain_message = strip_tags(html_message)
-    
-    send_mail(
-        subject=subject,
-        message=plain_message,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=[order.customer_email],
-        html_message=html_message,
-        fail_silently=False,
-    )
+def _order_is_final(payload):
+    return payload['order_status'] in ('completed', 'cancelled')
+
+async def payment_status_stream(request, order_id):
+    """Stream payment/order status changes as Server-Sent Events (serve via ASGI)"""
+    if not streaming_supported(request):
+        return sse_unavailable()
+    if not await Order.objects.filter(id=order_id).aexists():
+        return JsonResponse({'status': 'error', 'error': 'Order not found'}, status=404)
+
+    async def snapshot():
+        order = await Order.objects.filter(id=order_id).afirst()
+        return order_status_payload(order) if order else None
+
+    return sse_response(sse_stream([f'order:{order_id}'], 'status', snapshot=snapshot, until=_order_is_final))
+
+# Orders replayed to a reconnecting dashboard before it is told to reload instead
+DASHBOARD_REPLAY_MAX = 200
 
+def _dashboard_replay(since):
+    """Dashboard events for the orders changed after the ``since`` cursor"""
+    try:
+        cursor = parse_cursor(since)
+    except ValueError:
+        cursor = None
+    messages = []
+    while len(messages) < DASHBOARD_REPLAY_MAX:
+        changes = order_changes(since=cursor, limit=50)
+        if changes['reset']:
+            break
+        messages += [{'event': 'order.deleted', 'order_id': order_id} for order_id in changes['deleted']]
+        messages += [dashboard_payload(order, 'order.updated') for order in changes['orders']]
+        cursor = changes['cursor']
+        if not changes['has_more']:
+            return messages
+    # Too far behind to patch the page
+    return [{'event': 'orders.reset'}]
+
+async def dashboard_stream(request):
+    """
+    Stream order created/updated/deleted events to staff dashboards.
+
+    Every event carries a get_orders_json cursor as its id. The page passes
+    the cursor it was rendered at as ``?since=``; on reconnect the browser's
+    ``Last-Event-ID`` takes over, and the orders changed in between are
+    replayed before the live events.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'status': 'error', 'error': 'Login required'}, status=403)
+    if not streaming_supported(request):
+        return sse_unavailable()
+    since = request.headers.get('Last-Event-ID') or request.GET.get('since')
+
+    async def replay():
+        return await sync_to_async(_dashboard_replay)(since)
+
+    return sse_response(sse_stream([DASHBOARD_CHANNEL], 'order', replay=replay if since else None, event_id=current_cursor))
+
+@query_budget(6)
 def order_status(request, order_id):
-    order = get_object_or_404(Order, id=order_id)
+    order = get_object_or_404(Order.objects.select_related('table').prefetch_related('items__ice_cream'), id=order_id)
     return render(request, 'order_status.html', {'order': order})
 
-@login_required
-def admin_dashboard(request):
-    today = timezone.now().date()
+def _dashboard_figures():
+    """Dashboard stats and counts; cached briefly via microcache"""
+    today = dates.today_range()
     
     # Get today's orders (exclude draft orders)
     orders_today = Order.objects.filter(
-        created_at__date=today,
-        status__in=['paid', 'in_progress', 'completed', 'cancelled']
+        status__in=['paid', 'in_progress', 'completed', 'cancelled'],
+        **dates.within('created_at', today)
     )
     
+    # Count active tables (tables with orders today)
+    active_tables_count = Table.objects.filter(
+        orders__status__in=['paid', 'in_progress', 'completed'],
+        **dates.within('orders__created_at', today)
+    ).distinct().count()
+    
     # Calculate stats
     stats = {
         'total_orders_today': orders_today.count(),
-        'total_revenue_today': OrderItem.objects.filter(order__in=orders_today).aggregate(
-            total=Sum(F('quantity') * F('ice_cream__price'))
-        )['total'] or 0,
+        'total_revenue_today': rollups.sales_summary(dates.today(), dates.today())['total_revenue'],
         'most_popular_ice_cream': 'Vanilla',  # You can calculate this from OrderItem
-        'active_tables': Table.objects.filter(
-            orders__created_at__date=today,
-            orders__status__in=['paid', 'in_progress', 'completed']
-        ).distinct().count(),
+        'active_tables': active_tables_count,
+    }
+    
+    # Count pending orders
+    pending_orders_count = Order.objects.filter(
+        status__in=['paid', 'in_progress']
+    ).count()
+    
+    return {
+        'stats': stats,
+        'pending_orders_count': pending_orders_count,
+        'active_tables_count': active_tables_count,
     }
+
+@login_required
+@query_budget(25)
+def admin_dashboard(request):
+    # Taken before the orders are read: the live stream replays anything changed after it
+    stream_cursor = current_cursor()
+    figures = microcache.get_or_compute('dashboard', _dashboard_figures)
     
     # Get all recent orders (without slicing first)
     base_orders = Order.objects.filter(
@@ -533,22 +531,12 @@ def admin_dashboard(request):
         'cancelled': base_orders.filter(status='cancelled')[:20],
     }
     
-    # Count pending orders
-    pending_orders_count = Order.objects.filter(
-        status__in=['paid', 'in_progress']
-    ).count()
-    
-    # Count active tables (tables with orders today)
-    active_tables_count = Table.objects.filter(
-        orders__created_at__date=today,
-        orders__status__in=['paid', 'in_progress', 'completed']
-    ).distinct().count()
-    
     context = {
-        'stats': stats,
+        'stats': figures['stats'],
         'orders_by_status': orders_by_status,
-        'pending_orders_count': pending_orders_count,
-        'active_tables_count': active_tables_count,
+        'pending_orders_count': figures['pending_orders_count'],
+        'active_tables_count': figures['active_tables_count'],
+        'stream_cursor': stream_cursor,
     }
     
     return render(request, 'admin_dashboard.html', context)
@@ -556,11 +544,10 @@ def admin_dashboard(request):
 @login_required
 def admin_analytics(request):
     """Advanced analytics page with day/month/year analysis"""
-    from django.db.models import Count, Sum, Avg
     from datetime import datetime, timedelta
     
     # Get date range from request or default to last 30 days
-    end_date = timezone.now().date()
+    end_date = dates.today()
     start_date = end_date - timedelta(days=30)
     
     if request.GET.get('from_date'):
@@ -568,65 +555,53 @@ def admin_analytics(request):
     if request.GET.get('to_date'):
         end_date = datetime.strptime(request.GET.get('to_date'), '%Y-%m-%d').date()
     
-    # Filter orders for the date range (only paid orders)
-    orders_in_range = Order.objects.filter(
-        created_at__date__range=[start_date, end_date],
-        status__in=['paid', 'in_progress', 'completed']
+    analytics = microcache.get_or_compute(
+        f'analytics:{start_date}:{end_date}',
+        lambda: _analytics_figures(start_date, end_date),
     )
     
-    # Calculate analytics
-    analytics = {
-        'total_revenue': OrderItem.objects.filter(order__in=orders_in_range).aggregate(
-            total=Sum(F('quantity') * F('ice_cream__price'))
-        )['total'] or 0,
-        'total_orders': orders_in_range.count(),
-        'avg_order_value': orders_in_range.aggregate(
-            avg=Avg('items__quantity')
-        )['avg'] or 0,
-        'active_tables': Table.objects.count(),
+    context = {
+        'analytics': analytics,
+        'start_date': start_date,
+        'end_date': end_date,
+        'hourly_chart': {
+            'labels': [f"{row['hour']:02d}:00" for row in analytics['hourly']],
+            'orders': [row['orders_count'] for row in analytics['hourly']],
+        },
+        'weekday_chart': {
+            'labels': [row['weekday'] for row in analytics['weekdays']],
+            'orders': [row['orders_count'] for row in analytics['weekdays']],
+            'revenue': [float(row['revenue']) for row in analytics['weekdays']],
+        },
     }
     
+    return render(request, 'admin_analytics.html', context)
+
+def _analytics_figures(start_date, end_date):
+    """Analytics for a date range; cached briefly via microcache"""
+    # Calculate analytics from the daily rollups
+    analytics = rollups.sales_summary(start_date, end_date)
+    
     # Top products
-    top_products = OrderItem.objects.filter(order__in=orders_in_range).values(
-        'ice_cream__name'
-    ).annotate(
-        orders_count=Count('id'),
-        revenue=Sum(F('quantity') * F('ice_cream__price'))
-    ).order_by('-revenue')[:5]
+    top_products = list(rollups.product_sales(start_date, end_date)[:5])
     
     # Add percentage for top products
     total_revenue = analytics['total_revenue']
     for product in top_products:
-        product['name'] = product['ice_cream__name']
         product['percentage'] = round((product['revenue'] / total_revenue * 100), 1) if total_revenue > 0 else 0
     
     analytics['top_products'] = top_products
     
-    # Table performance
-    table_performance = []
-    for table in Table.objects.all():
-        table_orders = orders_in_range.filter(table=table)
-        table_revenue = OrderItem.objects.filter(order__in=table_orders).aggregate(
-            total=Sum(F('quantity') * F('ice_cream__price'))
-        )['total'] or 0
-        
-        table_performance.append({
-            'number': table.number,
-            'orders_count': table_orders.count(),
-            'revenue': table_revenue,
-            'percentage': round((table_revenue / total_revenue * 100), 1) if total_revenue > 0 else 0
-        })
-    
-    table_performance.sort(key=lambda x: x['revenue'], reverse=True)
+    # Table performance (one grouped query for all tables)
+    table_performance = reports.table_performance(start_date, end_date)
+    analytics['active_tables'] = len(table_performance)
     analytics['table_performance'] = table_performance[:10]  # Top 10 tables
     
-    context = {
-        'analytics': analytics,
-        'start_date': start_date,
-        'end_date': end_date,
-    }
+    # Hour-of-day and day-of-week breakdowns
+    analytics['hourly'] = reports.hourly_breakdown(start_date, end_date)
+    analytics['weekdays'] = reports.weekday_breakdown(start_date, end_date)
     
-    return render(request, 'admin_analytics.html', context)
+    return analytics
 
 @login_required
 def admin_settings(request):
@@ -728,6 +703,7 @@ def admin_settings(request):
     return render(request, 'admin_settings.html', context)
 
 @login_required
+@query_budget(9)
 def update_order_status(request, order_id):
     print(f"DEBUG: Update order status called - Order ID: {order_id}, Method: {request.method}")
     
@@ -778,15 +754,11 @@ def update_order_status(request, order_id):
         
         # Update the status
         order.status = new_status
-        order.save()
-        
-        # Push to Firebase
-        try:
-            db.reference(f'orders/{order.id}/status').set(order.get_status_display())
-            print(f"Order {order.id} status updated in Firebase")
-        except Exception as e:
-            print(f'Firebase status update error for order {order.id}: {e}')
-            # Continue without Firebase
+        with transaction.atomic():
+            order.save()
+            # Queue Firebase status update in the same transaction
+            enqueue(f'orders/{order.id}', {'status': order.get_status_display()})
+            publish_order_status(order)
         
         # If order is being cancelled, check if refund is needed
         if new_status == 'cancelled' and old_status != 'cancelled':
@@ -794,7 +766,7 @@ def update_order_status(request, order_id):
                 'status': 'success', 
                 'show_refund_popup': True,
                 'order_id': order.id,
-                'order_total': float(order.get_total_amount())
+                'order_total': float(order.total_amount)
             })
         
         print(f"DEBUG: Order {order.id} status updated successfully from {old_status} to {new_status}")
@@ -807,19 +779,20 @@ def update_order_status(request, order_id):
     return JsonResponse({'status': 'error', 'error': 'Invalid request method'}, status=400)
 
 @login_required
+@query_budget(5)
 def order_details(request, order_id):
     """Get detailed information about an order including items"""
     try:
-        order = get_object_or_404(Order, id=order_id)
+        order = get_object_or_404(Order.objects.select_related('table'), id=order_id)
         
         # Get order items with ice cream details
         items = []
-        for item in order.items.all():
+        for item in order.items.select_related('ice_cream'):
             items.append({
                 'ice_cream_name': item.ice_cream.name,
                 'quantity': item.quantity,
-                'price': float(item.ice_cream.price),
-                'total': float(item.quantity * item.ice_cream.price)
+                'price': float(item.unit_price),
+                'total': float(item.line_total)
             })
         
         order_data = {
@@ -832,7 +805,7 @@ def order_details(request, order_id):
             'status_display': order.get_status_display(),
             'payment_method': order.payment_method,
             'payment_status': order.get_payment_status_display(),
-            'total_amount': float(order.get_total_amount()),
+            'total_amount': float(order.total_amount),
             'items': items
         }
         
@@ -899,31 +872,17 @@ def admin_logout(request):
     return redirect('admin_login')
 
 @login_required
+@query_budget(5)
 def manage_ice_creams(request):
-    from django.db.models import Count, Sum, Avg
-    
-    ice_creams = IceCream.objects.all()
-    
-    # Add statistics for each ice cream
-    for ice_cream in ice_creams:
-        ice_cream.total_orders = OrderItem.objects.filter(ice_cream=ice_cream).aggregate(
-            total=Count('id')
-        )['total'] or 0
-        
-        ice_cream.total_revenue = OrderItem.objects.filter(ice_cream=ice_cream).aggregate(
-            total=Sum(F('quantity') * F('ice_cream__price'))
-        )['total'] or 0
-    
-    # Calculate additional stats
-    most_popular = OrderItem.objects.values('ice_cream__name').annotate(
-        total=Count('id')
-    ).order_by('-total').first()
+    # Sales statistics for every ice cream in one query
+    ice_creams = list(stats.ice_cream_stats())
     
-    highest_revenue = OrderItem.objects.values('ice_cream__name').annotate(
-        revenue=Sum(F('quantity') * F('ice_cream__price'))
-    ).order_by('-revenue').first()
+    # Calculate additional stats from the same rows
+    sold = [ice_cream for ice_cream in ice_creams if ice_cream.total_orders]
+    most_popular = max(sold, key=lambda ice_cream: ice_cream.total_units) if sold else None
+    highest_revenue = max(sold, key=lambda ice_cream: ice_cream.total_revenue) if sold else None
     
-    average_price = IceCream.objects.aggregate(avg=Avg('price'))['avg']
+    average_price = sum(ice_cream.price for ice_cream in ice_creams) / len(ice_creams) if ice_creams else None
     
     context = {
         'ice_creams': ice_creams,
@@ -964,43 +923,17 @@ def delete_ice_cream(request, pk):
     return redirect('manage_ice_creams')
 
 @login_required
+@query_budget(5)
 def manage_tables(request):
-    from django.db.models import Count, Sum
-    
-    tables = Table.objects.all()
-    
-    # Add statistics for each table
-    for table in tables:
-        today_orders = Order.objects.filter(
-            table=table,
-            created_at__date=timezone.now().date(),
-            status__in=['paid', 'in_progress', 'completed']
-        )
-        table.orders_today = today_orders.count()
-        
-        table.revenue_today = OrderItem.objects.filter(
-            order__in=today_orders
-        ).aggregate(
-            total=Sum(F('quantity') * F('ice_cream__price'))
-        )['total'] or 0
+    # Today's and all-time statistics for every table in one query
+    tables = list(stats.table_stats())
     
     # Calculate additional stats
     most_active_table = None
     if tables:
-        table_orders = []
-        for table in tables:
-            orders_count = Order.objects.filter(
-                table=table,
-                status__in=['paid', 'in_progress', 'completed']
-            ).count()
-            table_orders.append((table.number, orders_count))
-        
-        if table_orders:
-            most_active_table = max(table_orders, key=lambda x: x[1])[0]
+        most_active_table = max(tables, key=lambda table: table.total_orders).number
     
-    avg_orders_per_table = Order.objects.filter(
-        status__in=['paid', 'in_progress', 'completed']
-    ).count() / tables.count() if tables.count() > 0 else 0
+    avg_orders_per_table = sum(table.total_orders for table in tables) / len(tables) if tables else 0
     
     total_capacity = sum(getattr(table, 'seats', 4) for table in tables)
     
@@ -1059,7 +992,8 @@ def add_table(request):
 
 @login_required
 def edit_table(request, pk):
-    table = get_object_or_404(Table, pk=pk)
+    # Load the table together with its sales statistics
+    table = get_object_or_404(stats.table_stats(), pk=pk)
     
     if request.method == 'POST':
         # Handle form data manually for better control
@@ -1086,31 +1020,38 @@ def edit_table(request, pk):
             messages.error(request, f'Error updating table: {str(e)}')
             return render(request, 'edit_table.html', {'table': table})
     
-    # Add statistics for the table
-    from django.db.models import Count, Sum
-    
-    table.total_orders = Order.objects.filter(
-        table=table,
-        status__in=['paid', 'in_progress', 'completed']
-    ).count()
-    
-    table.total_revenue = OrderItem.objects.filter(
-        order__table=table,
-        order__status__in=['paid', 'in_progress', 'completed']
-    ).aggregate(
-        total=Sum(F('quantity') * F('ice_cream__price'))
-    )['total'] or 0
-    
-    table.orders_today = Order.objects.filter(
-        table=table,
-        created_at__date=timezone.now().date(),
-        status__in=['paid', 'in_progress', 'completed']
-    ).count()
-    
     table.avg_order = table.total_revenue / table.total_orders if table.total_orders > 0 else 0
     
     return render(request, 'edit_table.html', {'table': table})
 
+@login_required
+def regenerate_all_qr(request):
+    """Start a background regeneration of every table's QR code"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'status': 'error', 'error': 'Invalid request method'}, status=405)
+    job, started = qr_jobs.start()
+    return JsonResponse({'success': True, 'status': 'success', 'started': started, 'job': qr_jobs.job_status(job)})
+
+@login_required
+def qr_regeneration_status(request, job_id):
+    """Progress of a QR regeneration job"""
+    job = get_object_or_404(QRRegenerationJob, pk=job_id)
+    return JsonResponse({'success': True, 'status': 'success', 'job': qr_jobs.job_status(job)})
+
+@login_required
+def qr_sheet(request):
+    """Stream a printable PDF of every table's QR code, built page by page"""
+    from django.http import StreamingHttpResponse
+    from .qr_sheet import aiter_pdf, iter_pdf
+
+    tables = Table.objects.order_by('number').only('number', 'description', 'token', 'qr_code', 'qr_base_url')
+    # An ASGI server would read a sync iterator into memory before sending it
+    pages = aiter_pdf if streaming_supported(request) else iter_pdf
+    response = StreamingHttpResponse(pages(tables.iterator(chunk_size=100)), content_type='application/pdf')
+    disposition = 'attachment' if request.GET.get('download') else 'inline'
+    response['Content-Disposition'] = f'{disposition}; filename="table-qr-codes.pdf"'
+    return response
+
 @login_required
 def delete_table(request, pk):
     table = get_object_or_404(Table, pk=pk)
@@ -1120,12 +1061,11 @@ def delete_table(request, pk):
 @login_required
 def clear_all_orders(request):
     if request.method == 'POST':
-        Order.objects.all().delete()
-        # Also clear Firebase orders
-        try:
-            db.reference('orders').delete()
-        except Exception as e:
-            print(f'Firebase clear_all_orders error: {e}')
+        with transaction.atomic():
+            clear_all()
+            # Also clear Firebase orders
+            enqueue('orders', op='delete')
+            publish_dashboard_event('orders.cleared')
         return JsonResponse({'status': 'success', 'message': 'All orders cleared successfully'})
     return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
 
@@ -1134,17 +1074,41 @@ def delete_order(request, order_id):
     if request.method == 'POST':
         try:
             order = Order.objects.get(id=order_id)
-            order.delete()
-            # Also delete from Firebase if exists
-            try:
-                db.reference(f'orders/{order_id}').delete()
-            except Exception as e:
-                print(f'Firebase delete_order error for {order_id}: {e}')
+            with transaction.atomic():
+                order.delete()
+                # Also delete from Firebase if exists
+                enqueue(f'orders/{order_id}', op='delete')
+                publish_dashboard_event('order.deleted', order_id)
             return JsonResponse({'status': 'success', 'message': 'Order deleted successfully'})
         except Order.DoesNotExist:
             return JsonResponse({'status': 'error', 'message': 'Order not found'})
     return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
 
+@login_required
+def sync_status(request):
+    """Firebase sync outbox metrics (pending events and lag)"""
+    return JsonResponse({'status': 'success', 'outbox': outbox_stats()})
+
+@login_required
+def cache_status(request):
+    """Dashboard micro-cache hit/miss counters; POST resets them"""
+    if request.method == 'POST':
+        microcache.reset_counters()
+    return JsonResponse({'status': 'success', 'microcache': microcache.counters()})
+
+@staff_member_required(login_url='admin_login')
+def query_stats(request):
+    """Endpoints with the most SQL queries per request over the recent window; POST resets it"""
+    from .query_budget import reset, summary
+    if request.method == 'POST':
+        reset()
+        return redirect('query_stats')
+    return render(request, 'query_stats.html', {
+        'endpoints': summary(),
+        'window': getattr(settings, 'QUERY_STATS_WINDOW', 300),
+        'repeat_threshold': getattr(settings, 'QUERY_REPEAT_THRESHOLD', 5),
+    })
+
 def order_success(request):
     from django.utils import timezone
     order_id = request.GET.get('order_id')
@@ -1159,7 +1123,7 @@ def order_success(request):
         try:
             order = Order.objects.get(id=order_id)
             items = order.items.select_related('ice_cream').all()
-            total = order.get_total_amount()
+            total = order.total_amount
         except Order.DoesNotExist:
             order = None
 
@@ -1193,36 +1157,31 @@ def process_refund(request, order_id):
         customer_name = order.customer_name
         
         # Create refund with actual customer data from order
-        refund = Refund.objects.create(
-            order=order,
-            customer_email=customer_email,
-            customer_name=customer_name,
-            refund_amount=order.get_total_amount(),
-            payment_method='bank_transfer',  # Default to bank transfer
-            payment_details='Refund will be processed to your original payment method',
-            refund_reason='Item not available',
-            status='pending'
-        )
+        with transaction.atomic():
+            refund = Refund.objects.create(
+                order=order,
+                customer_email=customer_email,
+                customer_name=customer_name,
+                refund_amount=order.total_amount,
+                payment_method='bank_transfer',  # Default to bank transfer
+                payment_details='Refund will be processed to your original payment method',
+                refund_reason='Item not available',
+                status='pending'
+            )
+            # Queue refund email to customer
+            queue_refund_email(refund)
         
-        # Send refund email to customer
-        try:
-            send_refund_email(refund)
-            return JsonResponse({
-                'status': 'success', 
-                'message': 'Refund processed and email sent to customer'
-            })
-        except Exception as e:
-            return JsonResponse({
-                'status': 'success', 
-                'message': f'Refund processed but email failed: {str(e)}'
-            })
+        return JsonResponse({
+            'status': 'success', 
+            'message': 'Refund processed and email queued for customer'
+        })
     
     # For GET request, return form data with actual customer details from order
     customer_email = order.customer_email
     customer_name = order.customer_name
     
     form = RefundForm(initial={
-        'refund_amount': order.get_total_amount(),
+        'refund_amount': order.total_amount,
         'customer_email': customer_email,
         'customer_name': customer_name,
     })
@@ -1237,34 +1196,14 @@ def process_refund(request, order_id):
         }, request=request)
     })
 
-def send_refund_email(refund):
-    """Send refund notification email to customer"""
-    subject = f'Refund Processed - Order #{refund.order.id}'
-    
-    # Render HTML email template
-    html_message = render_to_string('emails/refund_notification.html', {
-        'refund': refund,
-        'order': refund.order,
-    })
-    
-    # Create plain text version
-    plain_message = strip_tags(html_message)
-    
-    send_mail(
-        subject=subject,
-        message=plain_message,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=[refund.customer_email],
-        html_message=html_message,
-        fail_silently=False,
-    )
-
 @login_required
+@query_budget(8)
 def refund_list(request):
     """View to list all refunds"""
     from django.db.models import Count, Sum
     
-    refunds = Refund.objects.all().order_by('-created_at')
+    # The rows show each refund's order and table
+    refunds = Refund.objects.select_related('order__table').order_by('-created_at')
     
     # Apply filters if provided
     status_filter = request.GET.get('status')
@@ -1274,7 +1213,12 @@ def refund_list(request):
         refunds = refunds.filter(status=status_filter)
     
     if date_filter:
-        refunds = refunds.filter(created_at__date=date_filter)
+        from datetime import datetime
+        try:
+            day = datetime.strptime(date_filter, '%Y-%m-%d').date()
+            refunds = refunds.filter(**dates.within('created_at', dates.day_range(day)))
+        except ValueError:
+            pass
     
     # Calculate statistics
     pending_count = refunds.filter(status='pending').count()
@@ -1312,12 +1256,25 @@ def update_refund_status(request, refund_id):
     return JsonResponse({'status': 'error'}, status=400)
 
 @login_required
+@query_budget(9)
 def get_orders_json(request):
-    """Get orders as JSON for real-time updates"""
-    orders = Order.objects.all().order_by('-created_at')[:20]  # Latest 20 orders
+    """
+    Get orders as JSON for real-time updates.
+
+    Pass the returned ``cursor`` back as ``?since=`` to receive only orders
+    created or changed since then, plus ids of deleted orders.
+    """
+    since = request.GET.get('since')
+    if since:
+        try:
+            since = parse_cursor(since)
+        except ValueError:
+            return JsonResponse({'status': 'error', 'error': 'Invalid since cursor'}, status=400)
+    
+    changes = order_changes(since=since or None)
     
     orders_data = []
-    for order in orders:
+    for order in changes['orders']:
         orders_data.append({
             'id': order.id,
             'customer_name': order.customer_name,
@@ -1325,13 +1282,14 @@ def get_orders_json(request):
             'table_number': order.table.number,
             'status': order.status,
             'payment_status': order.payment_status,
-            'total_amount': float(order.get_total_amount()),
+            'total_amount': float(order.total_amount),
             'created_at': order.created_at.isoformat(),
+            'updated_at': order.updated_at.isoformat(),
             'items': [
                 {
                     'name': item.ice_cream.name,
                     'quantity': item.quantity,
-                    'price': float(item.ice_cream.price)
+                    'price': float(item.unit_price)
                 }
                 for item in order.items.all()
             ]
@@ -1340,20 +1298,22 @@ def get_orders_json(request):
     return JsonResponse({
         'status': 'success',
         'orders': orders_data,
+        'deleted': changes['deleted'],
+        'cursor': format_cursor(changes['cursor']),
+        'reset': changes['reset'],
+        'has_more': changes['has_more'],
         'count': len(orders_data)
     })
 
 @login_required
+@query_budget(25)
 def admin_dashboard_simple(request):
     """Simple dashboard for debugging"""
-    today = timezone.now().date()
-    orders_today = Order.objects.filter(created_at__date=today)
+    orders_today = Order.objects.filter(**dates.within('created_at', dates.today_range()))
     
     stats = {
         'total_orders_today': orders_today.count(),
-        'total_revenue_today': OrderItem.objects.filter(order__in=orders_today).aggregate(
-            total=Sum(F('quantity') * F('ice_cream__price'))
-        )['total'] or 0,
+        'total_revenue_today': orders_today.aggregate(total=Sum('total_amount'))['total'] or 0,
     }
 
     most_popular_item = OrderItem.objects.values('ice_cream__name').annotate(
@@ -1361,7 +1321,7 @@ def admin_dashboard_simple(request):
     ).order_by('-total').first()
     stats['most_popular_ice_cream'] = most_popular_item['ice_cream__name'] if most_popular_item else 'N/A'
     
-    all_orders = Order.objects.all().order_by('-created_at')
+    all_orders = Order.objects.select_related('table').prefetch_related('items__ice_cream').order_by('-created_at')
     orders_by_status = {
         'pending': all_orders.filter(status__in=['pending', 'pending_payment']),
         'in_progress': all_orders.filter(status__in=['in_progress', 'paid']),